@@ -1,14 +1,51 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
-from calculator import PotionCalculator
-from get_prices import get_prices
+from flask import Flask, render_template, request, jsonify, send_from_directory, make_response, g, Response, stream_with_context
+from calculator import PotionCalculator, default_return_rate
+from scenarios import parse_scenario, parse_flag
+from opportunities import OpportunityMatrix, RANK_KEYS
+from sourcing import get_sourcing
+from planner import ProductionPlanner
+from sweep import sweep_parameters, sweep_to_json, grid_axis, bool_options
+from history import get_history
+from volumes import get_volumes
+from export import (settings_grid, count_settings, iter_export_rows, parse_number_list,
+                    EXPORT_FORMATS, MAX_EXPORT_SETTINGS)
+from get_prices import get_prices, get_snapshot, CACHE_MAX_AGE_HOURS
+from cities import CITIES, normalize_city
+from images import get_manifest
 from potion import POTION_IDS
 from materials import MATERIALS_IDS
-from datetime import datetime, timedelta
+import metrics
 import os
 import json
+import gzip
+import sqlite3
+import hashlib
+import time
+from datetime import datetime, timezone
 
 app = Flask(__name__)
 
+# Маніфест зображень будується один раз при старті
+get_manifest()
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request_metrics(response):
+    """Тривалість і статус кожного запиту за маршрутом"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.endpoint or 'unknown'
+        metrics.histogram(
+            "albion_http_request_seconds", "Тривалість обробки HTTP-запиту", endpoint=endpoint
+        ).observe(time.perf_counter() - started)
+        metrics.counter(
+            "albion_http_requests_total", "HTTP-запити за маршрутом і статусом", endpoint=endpoint, status=response.status_code
+        ).inc()
+    return response
+
 # Додаємо фільтр для форматування чисел з пробілами
 @app.template_filter('format_number')
 def format_number(value):
@@ -23,54 +60,49 @@ def format_number(value):
     except (ValueError, TypeError):
         return str(value)
 
-# Список міст
-CITIES = [
-    "Caerleon",
-    "Bridgewatch",
-    "Lymhurst",
-    "Martlock",
-    "FortSterling",
-    "Thetford",
-    "Brecilien"
-]
-
 def get_image_path(item_id, image_type='potion'):
     """
-    Перевіряє наявність зображення для предмета
+    Шукає зображення для предмета в маніфесті (images.py)
     Повертає шлях до зображення або None
     """
-    # Можливі формати файлів
-    extensions = ['.png', '.jpg', '.jpeg', '.webp']
-    
-    # Шляхи для пошуку (підтримуємо різні варіанти назв папок)
-    if image_type == 'potion':
-        search_paths = [
-            f'static/images/potions/{item_id}',      # potions/ (множина)
-            f'static/images/potion/{item_id}',       # potion/ (однина)
-            f'static/images/{item_id}',              # Без підпапки
-            f'albion_icons/{item_id}',               # Стара папка
-        ]
-    else:  # ingredient/material
-        search_paths = [
-            f'static/images/materials/{item_id}',     # materials/ (як у вас)
-            f'static/images/ingredients/{item_id}',  # ingredients/ (альтернатива)
-            f'static/images/ingredient/{item_id}',    # ingredient/ (однина)
-            f'static/images/{item_id}',               # Без підпапки
-            f'albion_icons/{item_id}',                # Стара папка
-        ]
-    
-    for path in search_paths:
-        for ext in extensions:
-            full_path = f'{path}{ext}'
-            if os.path.exists(full_path):
-                # Повертаємо шлях без 'static/' для url_for
-                return full_path.replace('static/', '')
+    return get_manifest().get(item_id, image_type)
+
+THEME_PATH = 'static/theme.json'
+CONFIG_PATH = 'config.json'
+
+# Кеш JSON-файлів налаштувань: {шлях: (mtime, значення)}
+_json_file_cache = {}
+
+def _file_mtime(path):
+    """mtime файлу в наносекундах (None - файлу немає)"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _load_json_with_defaults(path, defaults):
+    """
+    Завантажує JSON-файл поверх значень за замовчуванням
+    Результат кешується, поки не зміниться mtime файлу
+    """
+    mtime = _file_mtime(path)
+    cached = _json_file_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return dict(cached[1])
     
-    return None
+    value = defaults
+    if mtime is not None:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                # Об'єднуємо з дефолтними значеннями
+                value = {**defaults, **json.load(f)}
+        except:
+            pass
+    _json_file_cache[path] = (mtime, value)
+    return dict(value)
 
 def load_theme():
     """Завантажує тему з theme.json"""
-    theme_path = 'static/theme.json'
     default_theme = {
         'primary_color': '#4a90e2',
         'secondary_color': '#50c878',
@@ -82,38 +114,20 @@ def load_theme():
         'text_color': '#2c3e50',
         'border_color': '#e1e8ed'
     }
-    
-    if os.path.exists(theme_path):
-        try:
-            with open(theme_path, 'r', encoding='utf-8') as f:
-                user_theme = json.load(f)
-                # Об'єднуємо з дефолтними значеннями
-                return {**default_theme, **user_theme}
-        except:
-            pass
-    
-    return default_theme
+    return _load_json_with_defaults(THEME_PATH, default_theme)
 
 def load_config():
     """Завантажує конфігурацію з config.json"""
-    config_path = 'config.json'
     default_config = {
         'default_return_rate': 15.2  # Базовий відсоток повернення ресурсів (звичайні міста)
     }
-    
-    if os.path.exists(config_path):
-        try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                user_config = json.load(f)
-                return {**default_config, **user_config}
-        except:
-            pass
-    
-    return default_config
+    return _load_json_with_defaults(CONFIG_PATH, default_config)
 
-@app.route('/')
-def index():
-    """Головна сторінка з формою"""
+# Відрендерена головна сторінка: {'key', 'body', 'gzip', 'etag', 'last_modified'}
+_index_page = {}
+
+def _render_index():
+    """Рендерить головну сторінку"""
     potions = POTION_IDS
     cities = CITIES
     cache_status = get_cache_status()
@@ -135,13 +149,57 @@ def index():
                          theme=theme,
                          default_return_rate=config['default_return_rate'])
 
+@app.route('/')
+def index():
+    """
+    Головна сторінка з формою
+    
+    Сторінка рендериться лише коли змінюються ціни, тема, конфігурація,
+    зображення або статус кешу (свіжий/застарілий); інакше віддається збережена
+    копія (з ETag/Last-Modified і gzip, повторні відвідувачі отримують 304).
+    Вік цін у сторінці не записаний - його рахує браузер з часу оновлення.
+    """
+    global _index_page
+    snapshot = get_snapshot()
+    cache_status = get_cache_status()
+    theme_mtime = _file_mtime(THEME_PATH)
+    config_mtime = _file_mtime(CONFIG_PATH)
+    # Час оновлення цін (а не номер версії) однаковий у всіх воркерах, тож ETag теж
+    snapshot_time = snapshot.timestamp.timestamp() if snapshot is not None else 0.0
+    key = (snapshot_time, cache_status['status'], theme_mtime, config_mtime, get_manifest().current_version())
+    
+    page = _index_page
+    if page.get('key') != key:
+        body = _render_index().encode('utf-8')
+        modified = max([snapshot_time] + [m / 1e9 for m in (theme_mtime, config_mtime) if m is not None])
+        page = {
+            'key': key,
+            'body': body,
+            'gzip': gzip.compress(body, compresslevel=6),
+            'etag': hashlib.sha1(body).hexdigest(),
+            'last_modified': datetime.fromtimestamp(int(modified), timezone.utc),
+        }
+        _index_page = page
+    
+    use_gzip = 'gzip' in request.accept_encodings
+    response = make_response(page['gzip'] if use_gzip else page['body'])
+    response.content_type = 'text/html; charset=utf-8'
+    if use_gzip:
+        response.content_encoding = 'gzip'
+    response.vary.add('Accept-Encoding')
+    response.set_etag(page['etag'] + ('-gz' if use_gzip else ''))
+    response.last_modified = page['last_modified']
+    # Браузер кешує сторінку, але перевіряє її актуальність при кожному відвідуванні
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 @app.route('/calculate', methods=['POST'])
 def calculate():
     """Обробка розрахунку"""
     try:
         potion_id = request.form.get('potion_id')
-        craft_city = request.form.get('craft_city')
-        sell_city = request.form.get('sell_city')
+        craft_city = normalize_city(request.form.get('craft_city'))
+        sell_city = normalize_city(request.form.get('sell_city'))
         quantity = int(request.form.get('quantity', 1))
         machine_cost = float(request.form.get('machine_cost', 0))
         focus_bonus = request.form.get('focus_bonus') == 'on'
@@ -150,6 +208,9 @@ def calculate():
         if not extra_bonus_enabled:
             extra_bonus_pct = 0.0
         premium = request.form.get('premium') == 'on'
+        craft_intermediates = request.form.get('craft_intermediates') == 'on'
+        source_anywhere = request.form.get('source_anywhere') == 'on'
+        transport_cost = float(request.form.get('transport_cost', 0) or 0)
         
         # Обробка відсотка повернення ресурсів
         use_custom_return_rate = request.form.get('use_custom_return_rate') == 'on'
@@ -160,7 +221,7 @@ def calculate():
             return_rate = float(request.form.get('return_rate', 0)) / 100.0
         else:
             # Використовуємо базовий відсоток станку за містом
-            return_rate = 0.248 if craft_city == "Brecilien" else 0.152
+            return_rate = default_return_rate(craft_city)
         
         if not potion_id or not craft_city or not sell_city:
             return render_template('error.html', error="Будь ласка, заповніть всі обов'язкові поля")
@@ -185,7 +246,10 @@ def calculate():
             focus_bonus=focus_bonus,
             extra_bonus_pct=extra_bonus_pct,
             return_rate=return_rate,
-            premium=premium
+            premium=premium,
+            craft_intermediates=craft_intermediates,
+            source_anywhere=source_anywhere,
+            transport_cost=transport_cost
         )
         
         if 'error' in result:
@@ -216,6 +280,292 @@ def calculate():
     except Exception as e:
         return render_template('error.html', error=f"Помилка: {str(e)}")
 
+# Максимальна кількість сценаріїв в одному запиті /api/calculate/batch
+MAX_BATCH_SCENARIOS = 1000
+
+def _pinned_prices():
+    """
+    Ціни, закріплені на весь запит, і час їх оновлення
+    
+    Returns:
+        Кортеж (таблиця цін, час оновлення в ISO або None)
+    """
+    prices = get_prices()
+    snapshot = get_snapshot()
+    updated = snapshot.timestamp.isoformat() if snapshot is not None and snapshot.prices is prices else None
+    return prices, updated
+
+def _run_scenario(prices, scenario, calculators, volumes):
+    """Розраховує один сценарій; калькулятори перевикористовуються для однакових пар міст"""
+    cities = (scenario.pop('craft_city'), scenario.pop('sell_city'))
+    calculator = calculators.get(cities)
+    if calculator is None:
+        calculator = calculators[cities] = PotionCalculator(prices=prices, craft_city=cities[0], sell_city=cities[1],
+                                                            volumes=volumes)
+    return calculator.calculate_craft_cost(**scenario)
+
+@app.route('/api/calculate', methods=['GET', 'POST'])
+def api_calculate():
+    """Розрахунок одного сценарію (JSON замість HTML)"""
+    data = request.get_json(silent=True) or request.values
+    try:
+        scenario = parse_scenario(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': f'Невірний параметр: {e}'}), 400
+    
+    prices, updated = _pinned_prices()
+    if not prices:
+        return jsonify({'success': False, 'message': 'Не вдалося завантажити ціни'}), 503
+    
+    result = _run_scenario(prices, scenario, {}, get_volumes())
+    if 'error' in result:
+        return jsonify({'success': False, 'message': result['error'], 'prices_updated': updated}), 404
+    return jsonify({'success': True, 'prices_updated': updated, 'result': result})
+
+@app.route('/api/calculate/batch', methods=['POST'])
+def api_calculate_batch():
+    """
+    Розрахунок багатьох сценаріїв за одним знімком цін
+    
+    Тіло запиту: {"scenarios": [{...}, ...]} або просто список сценаріїв.
+    Помилка в одному сценарії не зупиняє решту - він отримує 'error'.
+    """
+    data = request.get_json(silent=True)
+    scenarios = data.get('scenarios') if isinstance(data, dict) else data
+    if not isinstance(scenarios, list):
+        return jsonify({'success': False, 'message': 'Очікується список сценаріїв'}), 400
+    if len(scenarios) > MAX_BATCH_SCENARIOS:
+        return jsonify({'success': False, 'message': f'Не більше {MAX_BATCH_SCENARIOS} сценаріїв за запит'}), 413
+    
+    prices, updated = _pinned_prices()
+    if not prices:
+        return jsonify({'success': False, 'message': 'Не вдалося завантажити ціни'}), 503
+    
+    # Калькулятори пар міст і таблиця обсягів - одні на весь запит
+    calculators = {}
+    volumes = get_volumes()
+    results = []
+    for scenario in scenarios:
+        try:
+            if not isinstance(scenario, dict):
+                raise ValueError("сценарій має бути об'єктом")
+            result = _run_scenario(prices, parse_scenario(scenario), calculators, volumes)
+        except (TypeError, ValueError) as e:
+            result = {'error': f'Невірний параметр: {e}'}
+        results.append(result)
+    
+    return jsonify({'success': True, 'prices_updated': updated, 'count': len(results), 'results': results})
+
+@app.route('/api/sweep', methods=['GET', 'POST'])
+def api_sweep():
+    """
+    Поверхня прибутку/ROI зілля на сітці налаштувань станку (JSON)
+    
+    Осі задаються як <вісь>_min, <вісь>_max, <вісь>_steps для return_rate (%),
+    machine_cost і extra_bonus_pct; focus_bonus і premium - true/false/both.
+    """
+    data = request.get_json(silent=True) or request.values
+    try:
+        potion_id = data.get('potion_id')
+        if not potion_id:
+            raise ValueError("не вказано potion_id")
+        craft_city = normalize_city(data.get('craft_city') or 'Caerleon')
+        sell_city = normalize_city(data.get('sell_city') or craft_city)
+        
+        def axis(name, start, stop, steps):
+            return grid_axis(data.get(f'{name}_min', start), data.get(f'{name}_max', stop),
+                             data.get(f'{name}_steps', steps))
+        
+        return_rates = axis('return_rate', 0, 50, 51) / 100.0
+        machine_costs = axis('machine_cost', 0, 1000, 21)
+        extra_bonus_pcts = axis('extra_bonus_pct', 0, 0, 1)
+        focus_options = bool_options(data.get('focus_bonus'))
+        premium_options = bool_options(data.get('premium'))
+        use_buy_price = parse_flag(data.get('use_buy_price', False))
+        craft_intermediates = parse_flag(data.get('craft_intermediates', False))
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': f'Невірний параметр: {e}'}), 400
+    
+    prices, updated = _pinned_prices()
+    if not prices:
+        return jsonify({'success': False, 'message': 'Не вдалося завантажити ціни'}), 503
+    
+    calculator = PotionCalculator(prices=prices, craft_city=craft_city, sell_city=sell_city)
+    try:
+        result = sweep_parameters(calculator, potion_id, return_rates, machine_costs, extra_bonus_pcts,
+                                  focus_options, premium_options, use_buy_price, craft_intermediates)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 413
+    if result is None:
+        return jsonify({'success': False, 'message': f'Зілля з ID {potion_id} не знайдено!'}), 404
+    return jsonify({'success': True, 'prices_updated': updated, 'sweep': sweep_to_json(result)})
+
+# Матриця рецептів будується один раз на процес
+opportunity_matrix = OpportunityMatrix(cities=CITIES)
+production_planner = ProductionPlanner(opportunity_matrix)
+
+@app.route('/opportunities')
+def opportunities():
+    """Рейтинг усіх комбінацій зілля × місто крафту × місто продажу (JSON)"""
+    try:
+        machine_cost = float(request.args.get('machine_cost', 0) or 0)
+        focus_bonus = request.args.get('focus_bonus') in ('1', 'true', 'on')
+        extra_bonus_pct = float(request.args.get('extra_bonus_pct', 0) or 0)
+        premium = request.args.get('premium') in ('1', 'true', 'on')
+        return_rate_pct = request.args.get('return_rate')
+        return_rate = float(return_rate_pct) / 100.0 if return_rate_pct else None
+        sort_by = request.args.get('sort', 'profit')
+        if sort_by not in RANK_KEYS:
+            raise ValueError(f"sort має бути одним з: {', '.join(RANK_KEYS)}")
+        limit = int(request.args.get('limit', 50))
+        if limit < 1:
+            raise ValueError("limit має бути не менше 1")
+        min_profit = request.args.get('min_profit')
+        min_profit = float(min_profit) if min_profit else None
+        # З transport_cost матеріали купуються в найдешевшому місті з урахуванням перевезення
+        transport_cost = request.args.get('transport_cost')
+        transport_cost = float(transport_cost) if transport_cost else None
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Невірний параметр: {e}'}), 400
+    
+    prices = get_prices()
+    if not prices:
+        return jsonify({'success': False, 'message': 'Не вдалося завантажити ціни'}), 503
+    
+    result = opportunity_matrix.compute(
+        prices,
+        machine_cost_per_100=machine_cost,
+        focus_bonus=focus_bonus,
+        extra_bonus_pct=extra_bonus_pct,
+        return_rate=return_rate,
+        premium=premium,
+        transport_cost=transport_cost
+    )
+    rows = opportunity_matrix.ranked(result, sort_by=sort_by, limit=limit, min_profit=min_profit)
+    return jsonify({'success': True, 'count': len(rows), 'opportunities': rows})
+
+def _export(export_format):
+    """
+    Потокова віддача таблиці прибутковості з усіма комбінаціями налаштувань
+    
+    Списки через кому: machine_cost, return_rate (%, без нього - базовий міста крафту),
+    extra_bonus_pct; focus_bonus і premium - true/false/both (за замовчуванням both).
+    """
+    data = request.values
+    try:
+        focus_options = bool_options(data.get('focus_bonus'))
+        premium_options = bool_options(data.get('premium'))
+        machine_costs = parse_number_list(data.get('machine_cost'), (0.0,))
+        return_rates = [rate / 100.0 for rate in parse_number_list(data.get('return_rate'), ())] or [None]
+        extra_bonus_pcts = parse_number_list(data.get('extra_bonus_pct'), (0.0,))
+        use_buy_price = parse_flag(data.get('use_buy_price', False))
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': f'Невірний параметр: {e}'}), 400
+    if count_settings(focus_options, premium_options, machine_costs, return_rates, extra_bonus_pcts) > MAX_EXPORT_SETTINGS:
+        return jsonify({'success': False, 'message': f'Не більше {MAX_EXPORT_SETTINGS} комбінацій налаштувань за запит'}), 413
+    
+    prices, updated = _pinned_prices()
+    if not prices:
+        return jsonify({'success': False, 'message': 'Не вдалося завантажити ціни'}), 503
+    
+    settings = settings_grid(focus_options, premium_options, machine_costs, return_rates,
+                             extra_bonus_pcts, use_buy_price)
+    serialize, mimetype = EXPORT_FORMATS[export_format]
+    # Рядки генеруються під час відправки відповіді (chunked), ціни закріплені вище
+    response = Response(stream_with_context(serialize(iter_export_rows(opportunity_matrix, prices, settings))),
+                        content_type=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=opportunities.{export_format}'
+    if updated:
+        response.headers['X-Prices-Updated'] = updated
+    return response
+
+@app.route('/export.csv')
+def export_csv():
+    """Таблиця прибутковості зілля × місто крафту × місто продажу × налаштування (CSV)"""
+    return _export('csv')
+
+@app.route('/export.ndjson')
+def export_ndjson():
+    """Таблиця прибутковості зілля × місто крафту × місто продажу × налаштування (NDJSON)"""
+    return _export('ndjson')
+
+def _city_list(value):
+    """Список міст з JSON-списку або рядка через кому (None - усі міста)"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    return [normalize_city(city.strip()) for city in value if city.strip()]
+
+def _number_map(value):
+    """Словник {id: число} з JSON (None - порожній)"""
+    if not value:
+        return None
+    if not isinstance(value, dict):
+        raise ValueError("очікується об'єкт {id: число}")
+    return {key: float(number) for key, number in value.items()}
+
+@app.route('/api/plan', methods=['GET', 'POST'])
+def api_plan():
+    """
+    План виробництва під бюджет срібла, фокус і місткість ринку (JSON)
+    
+    Розв'язок жадібний: план добрий, але не обов'язково оптимальний. budget - срібло
+    на покупку інгредієнтів і станок до повернення ресурсів (див. ProductionPlanner).
+    market_caps, ingredient_caps і focus_per_craft передаються як об'єкти в JSON-тілі;
+    volume_days - обмежити ринок обсягом продажів за стільки днів.
+    """
+    data = request.get_json(silent=True) or request.values
+    try:
+        budget = float(data.get('budget', 0) or 0)
+        if budget <= 0:
+            raise ValueError("бюджет повинен бути більше 0")
+        market_cap = data.get('market_cap')
+        return_rate_pct = data.get('return_rate')
+        volume_days = data.get('volume_days')
+        options = {
+            'focus_points': float(data.get('focus', 0) or 0),
+            'default_market_cap': float(market_cap) if market_cap not in (None, '') else None,
+            'market_caps': _number_map(data.get('market_caps')),
+            'ingredient_caps': _number_map(data.get('ingredient_caps')),
+            'focus_per_craft': _number_map(data.get('focus_per_craft')),
+            'machine_cost_per_100': float(data.get('machine_cost', 0) or 0),
+            'extra_bonus_pct': float(data.get('extra_bonus_pct', 0) or 0),
+            'return_rate': float(return_rate_pct) / 100.0 if return_rate_pct not in (None, '') else None,
+            'use_buy_price': parse_flag(data.get('use_buy_price', False)),
+            'premium': parse_flag(data.get('premium', False)),
+            'craft_cities': _city_list(data.get('craft_cities')),
+            'sell_cities': _city_list(data.get('sell_cities')),
+            'volume_days': float(volume_days) if volume_days not in (None, '') else None,
+        }
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': f'Невірний параметр: {e}'}), 400
+    
+    prices, updated = _pinned_prices()
+    if not prices:
+        return jsonify({'success': False, 'message': 'Не вдалося завантажити ціни'}), 503
+    
+    result = production_planner.plan(prices, budget, **options)
+    return jsonify({'success': True, 'prices_updated': updated, **result})
+
+@app.route('/history/<item_id>')
+def price_history(item_id):
+    """Історія цін предмета в місті (JSON), за замовчуванням за 30 днів"""
+    city = normalize_city(request.args.get('city', 'Caerleon'))
+    try:
+        days = float(request.args.get('days', 30))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Невірний параметр days'}), 400
+    
+    try:
+        rows = get_history().query_days(item_id, city, days)
+    except sqlite3.Error as e:
+        # Напр. база зайнята довше за HISTORY_READ_TIMEOUT_SECONDS
+        return jsonify({'success': False, 'message': f'Історія цін недоступна: {e}'}), 503
+    for row in rows:
+        row['timestamp'] = row['timestamp'].isoformat()
+    return jsonify({'success': True, 'item_id': item_id, 'city': city, 'history': rows})
+
 @app.route('/refresh_prices', methods=['POST'])
 def refresh_prices():
     """Примусове оновлення цін"""
@@ -233,30 +583,90 @@ def images(filename):
     """Сервірування зображень"""
     return send_from_directory('static/images', filename)
 
+@app.route('/api/sourcing')
+def api_sourcing():
+    """
+    Де купувати матеріали для міста крафту: найдешевше місто з урахуванням перевезення
+
+    Параметри: craft_city, transport_cost (за одиницю), use_buy_price.
+    """
+    craft_city = normalize_city(request.args.get('craft_city') or 'Caerleon')
+    if craft_city not in CITIES:
+        return jsonify({'success': False, 'message': f'Невідоме місто: {craft_city}'}), 400
+    try:
+        transport_cost = float(request.args.get('transport_cost', 0) or 0)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Невірний параметр: {e}'}), 400
+    use_buy_price = parse_flag(request.args.get('use_buy_price', False))
+
+    prices = get_prices()
+    if not prices:
+        return jsonify({'success': False, 'message': 'Не вдалося завантажити ціни'}), 503
+
+    materials = get_sourcing(prices, use_buy_price, transport_cost).catalog(craft_city)
+    return jsonify({
+        'success': True,
+        'craft_city': craft_city,
+        'transport_cost': transport_cost,
+        'materials': materials,
+    })
+
+@app.route('/api/data_quality')
+def api_data_quality():
+    """
+    Звіт про якість даних поточного знімка цін
+
+    Пропущені предмети, клітинки із запасним містом і нульові ціни рахуються
+    один раз на знімок; ?details=0 - без списку окремих клітинок fallbacks.
+    """
+    snapshot = get_snapshot()
+    if snapshot is None or not snapshot.prices:
+        return jsonify({'success': False, 'message': 'Ціни ще не завантажено'}), 503
+    report = snapshot.quality_report
+    if not parse_flag(request.args.get('details', True)):
+        report = {key: value for key, value in report.items() if key != 'fallbacks'}
+    return jsonify({
+        'success': True,
+        'prices_updated': snapshot.timestamp.isoformat(),
+        'report': report,
+    })
+
+@app.route('/metrics')
+def metrics_page():
+    """Метрики всіх воркерів у текстовому форматі Prometheus"""
+    snapshot = get_snapshot()
+    gauges = []
+    if snapshot is not None:
+        gauges.append(("albion_price_snapshot_age_seconds", "Вік знімка цін", {}, snapshot.age.total_seconds()))
+        gauges.append(("albion_price_snapshot_items", "Рядків (предмет × якість) у знімку цін", {}, len(snapshot.prices)))
+    response = make_response(metrics.REGISTRY.render(gauges))
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
 def get_cache_status():
-    """Отримує інформацію про статус кешу"""
-    if not os.path.exists('last_update.txt'):
+    """
+    Отримує інформацію про статус кешу
+    
+    Повідомлення залежить лише від знімка і статусу, а не від поточного часу,
+    тож головна сторінка кешується; вік цін сторінка рахує з updated_epoch.
+    """
+    snapshot = get_snapshot()
+    if snapshot is None:
         return {'status': 'no_cache', 'message': 'Кеш відсутній'}
     
     try:
-        with open('last_update.txt', 'r') as f:
-            last_update_str = f.read().strip()
-            last_update_time = datetime.fromisoformat(last_update_str)
-            time_since_update = datetime.now() - last_update_time
+        last_update_time = snapshot.timestamp
+        updated_text = last_update_time.strftime('%d.%m.%Y %H:%M')
+        status = {
+            'last_update': last_update_time,
+            'updated_epoch': last_update_time.timestamp(),
+            'max_age_hours': CACHE_MAX_AGE_HOURS,
+        }
         
-        if time_since_update >= timedelta(hours=6):
-            return {
-                'status': 'expired',
-                'message': f'Кеш застарів ({int(time_since_update.total_seconds() / 3600)} год тому)',
-                'last_update': last_update_time
-            }
+        if snapshot.is_expired():
+            return {'status': 'expired', 'message': f'Кеш застарів (оновлено {updated_text})', **status}
         else:
-            hours_left = 6 - (time_since_update.total_seconds() / 3600)
-            return {
-                'status': 'fresh',
-                'message': f'Оновлено {int(time_since_update.total_seconds() / 3600)} год тому (залишилось ~{int(hours_left)} год)',
-                'last_update': last_update_time
-            }
+            return {'status': 'fresh', 'message': f'Оновлено {updated_text}', **status}
     except Exception:
         return {'status': 'unknown', 'message': 'Невідомий статус кешу'}
 
@@ -0,0 +1,295 @@
+import csv
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from calculator import PotionCalculator
+from get_prices import get_snapshot, CACHE_FILE
+from recipes import RECIPES
+from scenarios import parse_scenario
+from volumes import get_volumes
+
+# Пакетний розрахунок сценаріїв без діалогу (main.py batch).
+#
+# Батьківський процес один раз завантажує знімок цін, а сценарії рахуються
+# пулом процесів шматками по BATCH_CHUNK_SIZE. Між процесами передаються лише
+# сценарії та короткі рядки результатів: ціни воркер успадковує від батька (fork)
+# або відображає той самий файл знімка (spawn) - таблиця не серіалізується.
+
+# Сценаріїв в одному завданні для воркера (менше - більше накладних витрат на IPC)
+BATCH_CHUNK_SIZE = 256
+# Обмеження кількості сценаріїв сітки
+MAX_GRID_SCENARIOS = 5_000_000
+
+# Стовпці рядка результату (порядок - як у CSV)
+RESULT_COLUMNS = (
+    'index', 'potion_id', 'potion_name', 'craft_city', 'sell_city', 'quantity', 'quality',
+    'focus_bonus', 'premium', 'return_rate', 'machine_cost', 'extra_bonus_pct',
+    'use_buy_price', 'craft_intermediates', 'source_anywhere', 'transport_cost',
+    'cost_per_potion', 'sell_price', 'sell_price_city', 'sell_price_after_tax',
+    'profit_per_potion', 'total_profit', 'roi_percent', 'sellable_per_day', 'volume_capped_profit', 'error',
+)
+# Ключі сортування таблиці результатів
+SORT_KEYS = ('profit_per_potion', 'total_profit', 'volume_capped_profit', 'roi_percent')
+
+def load_scenarios(path: str) -> List[Dict]:
+    """
+    Читає сценарії з файлу CSV (заголовок - назви параметрів) або JSON
+
+    JSON: список сценаріїв або {"scenarios": [...]}, як у /api/calculate/batch.
+    Параметри ті самі, що й у /api/calculate (return_rate у відсотках).
+
+    Raises:
+        ValueError: якщо файл не містить списку сценаріїв
+    """
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith(".csv"):
+            return [{key.strip(): value.strip() for key, value in row.items() if key and value is not None}
+                    for row in csv.DictReader(f)]
+        data = json.load(f)
+    scenarios = data.get('scenarios') if isinstance(data, dict) else data
+    if not isinstance(scenarios, list):
+        raise ValueError(f"{path}: очікується список сценаріїв")
+    return scenarios
+
+def grid_scenarios(
+    potion_ids: Optional[Sequence[str]] = None,
+    craft_cities: Sequence[str] = ("Caerleon",),
+    sell_cities: Optional[Sequence[str]] = None,
+    quantities: Sequence[int] = (1,),
+    qualities: Sequence[int] = (1,),
+    focus_options: Sequence[bool] = (False,),
+    premium_options: Sequence[bool] = (False,),
+    return_rates: Sequence[Optional[float]] = (None,),
+    machine_costs: Sequence[float] = (0.0,),
+    extra_bonus_pcts: Sequence[float] = (0.0,),
+    use_buy_price: bool = False,
+    craft_intermediates: bool = False,
+    source_anywhere: bool = False,
+    transport_cost: float = 0.0
+) -> Iterator[Dict]:
+    """
+    Сценарії на сітці параметрів (лінива ітерація)
+
+    Args:
+        potion_ids: Зілля (None - усі рецепти)
+        sell_cities: Міста продажу (None - місто крафту)
+        return_rates: Відсотки повернення у %, як у файлах сценаріїв (None - базовий міста крафту)
+        source_anywhere: Купувати інгредієнти в найдешевшому місті (з перевезенням transport_cost за одиницю)
+    """
+    potion_ids = list(potion_ids) if potion_ids else list(RECIPES)
+    for potion_id, craft_city, sell_city, quantity, quality, focus, premium, return_rate, machine_cost, extra_bonus_pct \
+            in itertools.product(potion_ids, craft_cities, sell_cities or (None,), quantities, qualities,
+                                 focus_options, premium_options, return_rates, machine_costs, extra_bonus_pcts):
+        yield {
+            'potion_id': potion_id,
+            'craft_city': craft_city,
+            'sell_city': sell_city or craft_city,
+            'quantity': quantity,
+            'quality': quality,
+            'focus_bonus': focus,
+            'premium': premium,
+            'return_rate': return_rate,
+            'machine_cost': machine_cost,
+            'extra_bonus_pct': extra_bonus_pct,
+            'use_buy_price': use_buy_price,
+            'craft_intermediates': craft_intermediates,
+            'source_anywhere': source_anywhere,
+            'transport_cost': transport_cost,
+        }
+
+def grid_size(*axes: Sequence) -> int:
+    """Кількість сценаріїв сітки для списків значень осей"""
+    size = 1
+    for values in axes:
+        size *= len(values)
+    return size
+
+def summarize(index: int, scenario: Dict, result: Dict) -> Dict:
+    """Короткий рядок результату сценарію (без деталей інгредієнтів)"""
+    row = {
+        'index': index,
+        'potion_id': scenario['potion_id'],
+        'potion_name': result.get('potion_name', ''),
+        'craft_city': scenario['craft_city'],
+        'sell_city': scenario['sell_city'],
+        'quantity': scenario['quantity'],
+        'quality': scenario['quality'],
+        'focus_bonus': scenario['focus_bonus'],
+        'premium': scenario['premium'],
+        'return_rate': scenario['return_rate'],
+        'machine_cost': scenario['machine_cost_per_100'],
+        'extra_bonus_pct': scenario['extra_bonus_pct'],
+        'use_buy_price': scenario['use_buy_price'],
+        'craft_intermediates': scenario['craft_intermediates'],
+        'source_anywhere': scenario['source_anywhere'],
+        'transport_cost': scenario['transport_cost'],
+        'error': result.get('error', ''),
+    }
+    for key in ('cost_per_potion', 'sell_price', 'sell_price_city', 'sell_price_after_tax',
+                'profit_per_potion', 'total_profit', 'roi_percent', 'sellable_per_day', 'volume_capped_profit'):
+        row[key] = result.get(key)
+    return row
+
+def _error_row(index: int, data, message: str) -> Dict:
+    """Рядок результату для сценарію з невірними параметрами"""
+    row = dict.fromkeys(RESULT_COLUMNS, None)
+    row.update(index=index, error=message)
+    if isinstance(data, dict):
+        row['potion_id'] = data.get('potion_id')
+    return row
+
+# Стан процесу-воркера: ціни, обсяги торгів і калькулятори для пар міст
+_worker_prices = None
+_worker_volumes = None
+_worker_calculators: Dict[Tuple[str, str], PotionCalculator] = {}
+
+def _init_worker(prices, cache_file: str):
+    """
+    Ініціалізація воркера пулу
+
+    При fork ціни батька вже в пам'яті воркера (prices - той самий об'єкт);
+    при spawn воркер відображає файл знімка, з якого їх завантажив батько.
+    """
+    global _worker_prices, _worker_volumes
+    if prices is None:
+        snapshot = get_snapshot(cache_file)
+        prices = snapshot.prices if snapshot is not None else {}
+    _worker_prices = prices
+    _worker_volumes = get_volumes()
+    _worker_calculators.clear()
+
+def _evaluate(index: int, data) -> Dict:
+    """Розраховує один сценарій у поточному процесі"""
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("сценарій має бути об'єктом")
+        scenario = parse_scenario(data)
+    except (TypeError, ValueError) as e:
+        return _error_row(index, data, f"Невірний параметр: {e}")
+
+    cities = (scenario.pop('craft_city'), scenario.pop('sell_city'))
+    calculator = _worker_calculators.get(cities)
+    if calculator is None:
+        calculator = _worker_calculators[cities] = PotionCalculator(
+            prices=_worker_prices, craft_city=cities[0], sell_city=cities[1], volumes=_worker_volumes
+        )
+    try:
+        result = calculator.calculate_craft_cost(**scenario)
+    except Exception as e:
+        # Збій одного сценарію не зупиняє весь пакет (виняток у воркері перервав би Pool.imap)
+        return _error_row(index, data, f"Помилка розрахунку: {e}")
+    scenario['craft_city'], scenario['sell_city'] = cities
+    return summarize(index, scenario, result)
+
+def _evaluate_chunk(chunk: List[Tuple[int, Dict]]) -> List[Dict]:
+    return [_evaluate(index, data) for index, data in chunk]
+
+def _chunks(scenarios: Iterable[Dict], size: int) -> Iterator[List[Tuple[int, Dict]]]:
+    """Нумеровані шматки сценаріїв (сітка не розгортається в пам'яті повністю)"""
+    numbered = enumerate(scenarios)
+    while True:
+        chunk = list(itertools.islice(numbered, size))
+        if not chunk:
+            return
+        yield chunk
+
+def run_batch(scenarios: Iterable[Dict], prices, processes: Optional[int] = None,
+              chunk_size: int = BATCH_CHUNK_SIZE, cache_file: str = CACHE_FILE) -> Iterator[Dict]:
+    """
+    Розраховує сценарії пулом процесів за одним знімком цін
+
+    Args:
+        scenarios: Сценарії у форматі /api/calculate
+        prices: Завантажена таблиця цін (знімок, закріплений на весь пакет)
+        processes: Кількість процесів (None - кількість ядер, 1 - без пулу)
+        chunk_size: Сценаріїв в одному завданні для воркера
+        cache_file: Файл знімка, який відображає воркер, якщо процеси не успадковують пам'ять батька
+
+    Returns:
+        Рядки результатів у порядку сценаріїв
+    """
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        _init_worker(prices, cache_file)
+        for chunk in _chunks(scenarios, chunk_size):
+            yield from _evaluate_chunk(chunk)
+        return
+
+    inherit = multiprocessing.get_start_method() == "fork"
+    with multiprocessing.Pool(processes, initializer=_init_worker,
+                              initargs=(prices if inherit else None, cache_file)) as pool:
+        for rows in pool.imap(_evaluate_chunk, _chunks(scenarios, chunk_size)):
+            yield from rows
+
+def sort_results(rows: Iterable[Dict], sort_by: str = 'profit_per_potion',
+                 limit: Optional[int] = None) -> List[Dict]:
+    """
+    Результати за спаданням ключа; сценарії з помилкою - в кінці у вхідному порядку
+
+    Без limit усі рядки тримаються в пам'яті (для сітки в мільйони сценаріїв -
+    гігабайти); з limit - лише купа з limit найкращих і не більше limit рядків з помилкою.
+    """
+    if not limit:
+        rows = list(rows)
+        valid = sorted((row for row in rows if not row['error']), key=lambda row: row[sort_by], reverse=True)
+        return valid + [row for row in rows if row['error']]
+
+    errors = []
+    def valid_rows():
+        for row in rows:
+            if not row['error']:
+                yield row
+            elif len(errors) < limit:
+                errors.append(row)
+    best = heapq.nlargest(limit, valid_rows(), key=lambda row: row[sort_by])
+    return (best + errors)[:limit]
+
+def _results_format(path: str, output_format: Optional[str]) -> str:
+    output_format = output_format or os.path.splitext(path)[1].lstrip(".").lower() or "csv"
+    if output_format not in ("csv", "ndjson", "json"):
+        raise ValueError(f"невідомий формат результатів: {output_format}")
+    return output_format
+
+def stream_results(rows: Iterable[Dict], path: str, output_format: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Записує результати у файл по мірі надходження і передає їх далі (у порядку сценаріїв)
+
+    Формат: csv, json або ndjson (за замовчуванням - за розширенням). Файл
+    дописується рядок за рядком, тож пакет не тримається в пам'яті повністю.
+
+    Raises:
+        ValueError: якщо формат невідомий (одразу, до створення файлу)
+    """
+    return _stream_results(rows, path, _results_format(path, output_format))
+
+def _stream_results(rows: Iterable[Dict], path: str, output_format: str) -> Iterator[Dict]:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if output_format == "csv":
+            writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                yield row
+        elif output_format == "ndjson":
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                yield row
+        else:
+            f.write("[")
+            for n, row in enumerate(rows):
+                f.write((", " if n else "") + json.dumps(row, ensure_ascii=False))
+                yield row
+            f.write("]")
+
+def write_results(rows: Iterable[Dict], path: str, output_format: Optional[str] = None):
+    """
+    Записує результати у файл: csv, json або ndjson (за замовчуванням - за розширенням)
+
+    Raises:
+        ValueError: якщо формат невідомий
+    """
+    for _ in stream_results(rows, path, output_format):
+        pass
@@ -0,0 +1,297 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import get_prices as prices_module
+from cities import CITIES
+from price_table import PRICE_TYPES, DATE_SUFFIX
+
+# Набір бенчмарків працює повністю офлайн: ціни генеруються детерміновано
+# (random.Random(SEED)), а кеш і історія пишуться в тимчасову теку.
+#
+# Базові значення залежать від машини, тому не зберігаються в репозиторії:
+#   python benchmark.py --save-baseline   # один раз на чистому дереві -> bench_baseline.json
+#   python benchmark.py                   # після змін: порівняння з базовими, код 1 при регресії
+SEED = 20240601
+SMALL_EXTRA_ITEMS = 0          # Малий кеш - тільки каталог (potion.py + materials.py)
+LARGE_EXTRA_ITEMS = 10_000     # Синтетичний великий кеш
+BASELINE_FILE = "bench_baseline.json"
+OUTPUT_FILE = "bench_output.txt"
+# Бенчмарк вважається регресією, якщо він повільніший за базовий більш ніж у стільки разів
+DEFAULT_TOLERANCE = 1.5
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Предмети для шляхів get_item_price і зілля для калькулятора
+HIT_ITEM = "T6_POTION_HEAL"            # Ціна є в запитаному місті
+FALLBACK_ITEM = "BENCH_FALLBACK_ITEM"  # Ціна є тільки в Caerleon
+MISS_ITEM = "BENCH_UNKNOWN_ITEM"       # Предмета немає в таблиці
+LOOKUP_CITY = "Lymhurst"
+INTERMEDIATES_POTION = "T8_POTION_GATHER"  # Масло й самогон у рецепті (craft_intermediates)
+
+def synthetic_prices(extra_items: int = 0, seed: int = SEED) -> Dict:
+    """
+    Генерує словник цін у форматі API для всього каталогу і extra_items синтетичних предметів
+
+    Кожен предмет має ціну в кожному місті, крім FALLBACK_ITEM (тільки Caerleon).
+    """
+    rng = random.Random(seed)
+    observed = datetime.now().replace(microsecond=0).isoformat()
+    item_ids = prices_module.get_all_items_from_modules()
+    item_ids += [f"BENCH_ITEM_{n:05d}" for n in range(extra_items)]
+
+    def city_prices(base: int) -> Dict:
+        row = {}
+        for price_type in PRICE_TYPES:
+            row[price_type] = int(base * rng.uniform(0.8, 1.2))
+            row[price_type + DATE_SUFFIX] = observed
+        return row
+
+    prices = {}
+    for item_id in item_ids:
+        base = rng.randint(50, 50_000)
+        prices[item_id] = {city: city_prices(base) for city in CITIES}
+    prices[FALLBACK_ITEM] = {"Caerleon": city_prices(1_000)}
+    return prices
+
+def measure(func: Callable[[], object], number: int, repeat: int = 5) -> Dict:
+    """
+    Час одного виклику func: repeat серій по number викликів після прогріву
+
+    Returns:
+        Словник з best і median (секунди на виклик), number і repeat
+    """
+    func()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started) / number)
+    return {
+        'best': min(timings),
+        'median': statistics.median(timings),
+        'number': number,
+        'repeat': repeat,
+    }
+
+@contextlib.contextmanager
+def isolated_workdir():
+    """
+    Тимчасова робоча тека: кеш цін, блокування та історія не чіпають справжні файли
+
+    static/ і config.json підключаються посиланнями, щоб маршрути читали ті самі налаштування.
+    """
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="albion-bench-") as workdir:
+        for name in ("static", "config.json"):
+            source = os.path.join(BASE_DIR, name)
+            if os.path.exists(source):
+                os.symlink(source, os.path.join(workdir, name))
+        os.chdir(workdir)
+        try:
+            yield workdir
+        finally:
+            os.chdir(previous_dir)
+
+def run_benchmarks(quick: bool = False) -> Dict[str, Dict]:
+    """
+    Запускає всі бенчмарки
+
+    Args:
+        quick: Менше повторів (для швидкої перевірки, не для базових значень)
+
+    Returns:
+        {назва бенчмарку: результат measure}
+    """
+    scale = 0.1 if quick else 1.0
+
+    def count(number: int) -> int:
+        return max(1, int(number * scale))
+
+    from calculator import PotionCalculator
+    results = {}
+    with isolated_workdir():
+        # Великий кеш - окремий файл; малий - стандартний CACHE_FILE, з ним працює застосунок
+        large_prices = synthetic_prices(LARGE_EXTRA_ITEMS)
+        prices_module.save_prices_to_cache(large_prices, "large_cache.bin")
+        del large_prices
+        snapshot = prices_module.save_prices_to_cache(synthetic_prices(SMALL_EXTRA_ITEMS))
+        if snapshot.needs_refresh():
+            raise RuntimeError("синтетичний кеш не покриває каталог - бенчмарк звернувся б до API")
+
+        def load_reread(cache_file: str, cold: bool) -> Callable[[], object]:
+            """
+            load_cached_prices з перечитуванням файлу (mtime змінюється на кожен виклик)
+
+            cold - як новий воркер: знімка процесу немає, тож ID предметів декодуються
+            і індекс будується заново; інакше індекс перевикористовується з попереднього
+            знімка (відбиток item_ids збігається) - так знімок підхоплює вже робочий воркер.
+            """
+            stamp = [0]
+
+            def run():
+                stamp[0] += 1
+                os.utime(cache_file, ns=(stamp[0], stamp[0]))
+                if cold:
+                    prices_module._snapshot = None
+                return prices_module.load_cached_prices(cache_file, max_age_hours=24 * 365 * 100)
+            return run
+
+        results['load_cached_prices.small.cold'] = measure(load_reread(prices_module.CACHE_FILE, True), count(200))
+        results['load_cached_prices.large.cold'] = measure(load_reread("large_cache.bin", True), count(20))
+        results['load_cached_prices.large.reuse'] = measure(load_reread("large_cache.bin", False), count(20))
+        results['load_cached_prices.large.warm'] = measure(
+            lambda: prices_module.load_cached_prices("large_cache.bin"), count(20_000))
+        # Повертаємо знімок малого кешу в процес для решти бенчмарків
+        os.utime(prices_module.CACHE_FILE)
+        table = prices_module.get_snapshot().prices
+
+        results['get_item_price.hit'] = measure(
+            lambda: prices_module.get_item_price(HIT_ITEM, table, LOOKUP_CITY), count(50_000))
+        results['get_item_price.fallback'] = measure(
+            lambda: prices_module.get_item_price(FALLBACK_ITEM, table, LOOKUP_CITY), count(20_000))
+        results['get_item_price.miss'] = measure(
+            lambda: prices_module.get_item_price(MISS_ITEM, table, LOOKUP_CITY), count(20_000))
+
+        calculator = PotionCalculator(prices=table, craft_city="Lymhurst", sell_city="Caerleon")
+        results['calculate_craft_cost'] = measure(
+            lambda: calculator.calculate_craft_cost(HIT_ITEM, quantity=100, machine_cost_per_100=300,
+                                                    focus_bonus=True, return_rate=0.248), count(5_000))
+        results['calculate_craft_cost.craft_intermediates'] = measure(
+            lambda: calculator.calculate_craft_cost(INTERMEDIATES_POTION, quantity=100, return_rate=0.248,
+                                                    craft_intermediates=True), count(5_000))
+
+        # Маршрути через тестовий клієнт Flask (знімок уже свіжий - фонового оновлення немає)
+        from app import app
+        client = app.test_client()
+        form = {
+            'potion_id': HIT_ITEM,
+            'craft_city': 'Lymhurst',
+            'sell_city': 'Caerleon',
+            'quantity': '100',
+            'machine_cost': '300',
+            'focus_bonus': 'on',
+        }
+
+        def get_index():
+            response = client.get('/')
+            assert response.status_code == 200, response.status_code
+
+        def post_calculate():
+            response = client.post('/calculate', data=form)
+            assert response.status_code == 200, response.status_code
+
+        results['route.index'] = measure(get_index, count(2_000))
+        results['route.calculate'] = measure(post_calculate, count(500))
+    return results
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """
+    Порівнює результати з базовими (за найкращим часом)
+
+    Returns:
+        Список рядків з регресіями (порожній - регресій немає)
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or base['best'] <= 0:
+            continue
+        ratio = result['best'] / base['best']
+        if ratio > tolerance:
+            regressions.append(f"{name}: {format_time(result['best'])} проти {format_time(base['best'])} (x{ratio:.2f})")
+    return regressions
+
+def format_time(seconds: float) -> str:
+    """Час у зручних одиницях"""
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.2f} мкс"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} мс"
+    return f"{seconds:.2f} с"
+
+def format_report(results: Dict[str, Dict], baseline: Optional[Dict[str, Dict]] = None) -> str:
+    """Таблиця результатів (з базовими значеннями, якщо вони є)"""
+    lines = [f"Python {platform.python_version()} / {platform.platform()}", ""]
+    header = f"{'Бенчмарк':<44}{'найкращий':>14}{'медіана':>14}"
+    if baseline:
+        header += f"{'базовий':>14}{'зміна':>10}"
+    lines.append(header)
+    lines.append("-" * len(header))
+    for name, result in results.items():
+        line = f"{name:<44}{format_time(result['best']):>14}{format_time(result['median']):>14}"
+        base = (baseline or {}).get(name)
+        if base:
+            line += f"{format_time(base['best']):>14}{result['best'] / base['best']:>9.2f}x"
+        lines.append(line)
+    return "\n".join(lines)
+
+def load_baseline(path: str) -> Optional[Dict[str, Dict]]:
+    """Читає файл базових значень; None, якщо його немає"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['results']
+
+def save_baseline(path: str, results: Dict[str, Dict]):
+    """Записує результати як нові базові значення"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+        }, f, ensure_ascii=False, indent=2)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Офлайн бенчмарки калькулятора, завантаження цін і маршрутів Flask",
+        epilog=f"Базові значення спершу записуються з --save-baseline (файл {BASELINE_FILE} не входить у репозиторій); "
+               "наступні запуски порівнюються з ними.")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help=f"файл базових значень (за замовчуванням {BASELINE_FILE})")
+    parser.add_argument('--save-baseline', action='store_true', help="записати результати як нові базові значення")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f"допустиме сповільнення відносно базового (за замовчуванням x{DEFAULT_TOLERANCE})")
+    parser.add_argument('--quick', action='store_true', help="менше повторів (не для базових значень)")
+    parser.add_argument('--output', default=OUTPUT_FILE, help=f"файл звіту (за замовчуванням {OUTPUT_FILE})")
+    args = parser.parse_args(argv)
+
+    baseline_path = os.path.abspath(args.baseline)
+    output_path = os.path.abspath(args.output)
+    results = run_benchmarks(quick=args.quick)
+    baseline = None if args.save_baseline else load_baseline(baseline_path)
+
+    report = format_report(results, baseline)
+    print(report)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(report + "\n")
+
+    if args.save_baseline:
+        save_baseline(baseline_path, results)
+        print(f"\nБазові значення записано в {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"\nБазових значень немає ({args.baseline}); запустіть з --save-baseline")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\nРегресії (повільніше більш ніж у x{args.tolerance}):")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nРегресій немає.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,34 +2,54 @@ from typing import Dict, Optional, Tuple
 from recipes import RECIPES
 from potion import POTION_IDS, POTION_ITEM_VALUES
 from materials import MATERIALS_IDS
-from get_prices import get_prices, get_item_price
+from get_prices import get_prices, find_item_price
+from price_table import PriceTable
+from cities import normalize_city
+from volumes import MarketVolumes, get_volumes
+from sourcing import IngredientSourcing, get_sourcing
+import metrics
 
 # Nutrition per ItemValue. Adjusted to match in-game station fee (e.g. T6 heal in Brecilien).
 NUTRITION_RATIO = 0.07125
 SALES_TAX_RATE = 0.08     # 8% market sales tax
 LISTING_FEE_RATE = 0.025  # 2.5% listing fee when creating sell order
+BRECILIEN_CRAFT_BONUS = 0.15  # +15% potion yield in Brecilien
+STATION_RETURN_RATE = 0.152    # Base resource return rate in royal cities
+BRECILIEN_RETURN_RATE = 0.248  # Base resource return rate in Brecilien
+
+_CALCULATIONS_OK = metrics.counter("albion_calculations_total", "Розрахунки вартості крафту за результатом", result="ok")
+_CALCULATIONS_ERROR = metrics.counter("albion_calculations_total", result="error")
+
+def default_return_rate(craft_city: str) -> float:
+    """Базовий відсоток повернення ресурсів станку для міста крафту (0.0 - 1.0)"""
+    return BRECILIEN_RETURN_RATE if craft_city == "Brecilien" else STATION_RETURN_RATE
 
 class PotionCalculator:
     """Калькулятор вартості крафту зілля"""
     
-    def __init__(self, prices: Optional[Dict] = None, craft_city: str = "Caerleon", sell_city: str = "Caerleon"):
+    def __init__(self, prices: Optional[Dict] = None, craft_city: str = "Caerleon", sell_city: str = "Caerleon",
+                 volumes: Optional[MarketVolumes] = None):
         """
         Ініціалізація калькулятора
         
         Args:
-            prices: Словник з цінами (якщо None, завантажить автоматично)
+            prices: Таблиця або словник з цінами (якщо None, завантажить автоматично)
             craft_city: Місто для крафту
             sell_city: Місто для продажу
+            volumes: Обсяги торгів (якщо None, з кешу обсягів без запиту до API при першому розрахунку).
+                Код, що створює калькулятори в циклі, передає одну таблицю на всі
         """
-        self.prices = prices if prices is not None else get_prices()
-        self.craft_city = craft_city
-        self.sell_city = sell_city
+        # Словник цін перетворюється в щільну таблицю один раз на калькулятор
+        self.prices = PriceTable.from_prices(prices if prices is not None else get_prices())
+        self._volumes = volumes
+        self.craft_city = normalize_city(craft_city)
+        self.sell_city = normalize_city(sell_city)
         # Податок і комісія за розміщення ордера на ринку
         self.sales_tax = SALES_TAX_RATE
         self.listing_fee = LISTING_FEE_RATE
         
         # Бонус міста Бресіліон на крафт зілля (+15%)
-        self.brecilien_craft_bonus = 0.15 if craft_city == "Brecilien" else 0.0
+        self.brecilien_craft_bonus = BRECILIEN_CRAFT_BONUS if self.craft_city == "Brecilien" else 0.0
 
     def _get_item_value(self, potion_id: str) -> float:
         """
@@ -37,13 +57,19 @@ class PotionCalculator:
         """
         return float(POTION_ITEM_VALUES.get(potion_id, 0.0))
     
-    def calculate_ingredient_cost(self, potion_id: str, use_buy_price: bool = False) -> Tuple[float, Dict]:
+    def calculate_ingredient_cost(self, potion_id: str, use_buy_price: bool = False,
+                                  craft_intermediates: bool = False,
+                                  sourcing: Optional[IngredientSourcing] = None) -> Tuple[float, Dict]:
         """
         Розраховує вартість інгредієнтів для зілля
         
         Args:
             potion_id: ID зілля
             use_buy_price: Якщо True, використовує ціну покупки, інакше - продажу
+            craft_intermediates: Якщо True, проміжні інгредієнти (масло, самогон) крафтяться,
+                коли це дешевше за ринок (див. crafting.py)
+            sourcing: Закупівля в найдешевшому місті з перевезенням (див. sourcing.py);
+                None - інгредієнти купуються в місті крафту
         
         Returns:
             Кортеж (загальна вартість, деталізація по інгредієнтах)
@@ -56,20 +82,45 @@ class PotionCalculator:
         details = {}
         
         price_type = "buy_price_max" if use_buy_price else "sell_price_min"
+        resolver = None
+        if craft_intermediates:
+            from crafting import get_resolver
+            resolver = get_resolver(self.prices, use_buy_price)
         
         for ingredient_id, quantity in recipe['ingredients'].items():
-            price = get_item_price(ingredient_id, self.prices, self.craft_city, price_type)
+            transport_cost = 0.0
+            if resolver is not None:
+                price, price_city, source = resolver.unit_price(ingredient_id, self.craft_city)
+            else:
+                # Місто-джерело ціни визначене наперед у таблиці цін
+                price, price_city = find_item_price(ingredient_id, self.prices, self.craft_city, price_type)
+                source = 'buy'
+            if sourcing is not None and source == 'buy':
+                # Купівля там, де ціна з перевезенням найменша
+                landed_price, buy_city, transport = sourcing.unit_price(ingredient_id, self.craft_city)
+                if buy_city is not None:
+                    price, price_city, transport_cost = landed_price, buy_city, transport
             ingredient_cost = price * quantity
             total_cost += ingredient_cost
             
             details[ingredient_id] = {
                 'quantity': quantity,
                 'unit_price': price,
+                'price_city': price_city,
+                'source': source,
+                'transport_cost': transport_cost,
                 'total_cost': ingredient_cost
             }
         
         return total_cost, details
     
+    @property
+    def volumes(self) -> MarketVolumes:
+        """Обсяги торгів міста продажу (кеш обсягів читається один раз на калькулятор)"""
+        if self._volumes is None:
+            self._volumes = get_volumes()
+        return self._volumes
+    
     def calculate_craft_cost(
         self,
         potion_id: str,
@@ -77,9 +128,13 @@ class PotionCalculator:
         machine_cost_per_100: float = 0.0,
         focus_bonus: bool = False,
         extra_bonus_pct: float = 0.0,
-        return_rate: float = 0.0,
+        return_rate: Optional[float] = None,
         use_buy_price: bool = False,
-        premium: bool = False
+        premium: bool = False,
+        craft_intermediates: bool = False,
+        quality: int = 1,
+        source_anywhere: bool = False,
+        transport_cost: float = 0.0
     ) -> Dict:
         """
         Розраховує повну вартість крафту зілля
@@ -90,18 +145,27 @@ class PotionCalculator:
             machine_cost_per_100: Вартість користування станком за 100 їжі
             focus_bonus: Чи використовується фокус (зменшує витрати на 20%)
             extra_bonus: Чи є додатковий бонус (зменшує витрати на 10%)
-            return_rate: Фінальний відсоток повернення ресурсів (0.0 - 1.0), який користувач бачить на станку
+            return_rate: Фінальний відсоток повернення ресурсів (0.0 - 1.0), який користувач бачить на станку;
+                None - базовий відсоток міста крафту (default_return_rate), як і в OpportunityMatrix.compute
             use_buy_price: Використовувати ціну покупки матеріалів
+            craft_intermediates: Крафтити проміжні інгредієнти, якщо це дешевше за ринок
+            quality: Якість, за ціною якої продається зілля (1-5)
+            source_anywhere: Купувати кожен інгредієнт у найдешевшому місті з урахуванням перевезення
+            transport_cost: Вартість перевезення одиниці інгредієнта з іншого міста (для source_anywhere)
         
         Returns:
             Словник з детальною інформацією про вартість
         """
         if potion_id not in RECIPES:
+            _CALCULATIONS_ERROR.inc()
             return {
                 'error': f'Зілля з ID {potion_id} не знайдено!',
                 'total_cost': 0.0
             }
         
+        if return_rate is None:
+            return_rate = default_return_rate(self.craft_city)
+        
         recipe = RECIPES[potion_id]
         potion_yield = recipe.get('yield', 1)  # Кількість зілля з одного крафту (за замовчуванням 1)
         
@@ -110,7 +174,10 @@ class PotionCalculator:
         actual_quantity = crafts_needed * potion_yield  # Фактична кількість зілля (може бути більше запитаної)
         
         # Вартість інгредієнтів для одного крафту (БЕЗ урахування повернення)
-        ingredient_cost_per_craft_base, ingredient_details_base = self.calculate_ingredient_cost(potion_id, use_buy_price)
+        sourcing = get_sourcing(self.prices, use_buy_price, transport_cost) if source_anywhere else None
+        ingredient_cost_per_craft_base, ingredient_details_base = self.calculate_ingredient_cost(
+            potion_id, use_buy_price, craft_intermediates, sourcing
+        )
         
         # Застосовуємо повернення ресурсів
         # return_rate - це фінальний відсоток, який користувач бачить на станку
@@ -128,6 +195,9 @@ class PotionCalculator:
                 'net_quantity': net_quantity,            # фактична витрата на 1 крафт після повернення
                 'required_total_quantity': required_total_quantity,
                 'unit_price': details['unit_price'],
+                'price_city': details['price_city'],
+                'source': details['source'],
+                'transport_cost': details['transport_cost'],
                 'total_cost': details['unit_price'] * net_quantity,
                 'required_total_cost': details['unit_price'] * required_total_quantity
             }
@@ -135,6 +205,7 @@ class PotionCalculator:
         # Обчислюємо реальну витрату срібла за станок з урахуванням ItemValue
         item_value = self._get_item_value(potion_id)
         if item_value <= 0:
+            _CALCULATIONS_ERROR.inc()
             return {
                 'error': f'ItemValue для {potion_id} не знайдено. Додайте його до POTION_ITEM_VALUES.',
                 'total_cost': 0.0
@@ -166,7 +237,7 @@ class PotionCalculator:
         cost_per_potion = total_cost / effective_quantity if effective_quantity > 0 else 0.0
         
         # Отримуємо ціну продажу зілля
-        sell_price = get_item_price(potion_id, self.prices, self.sell_city, "sell_price_min")
+        sell_price, sell_price_city = find_item_price(potion_id, self.prices, self.sell_city, "sell_price_min", quality)
         # Розрахунок ринкових зборів: 2.5% за розміщення + 8% податок (4% з преміум)
         effective_sales_tax = self.sales_tax * (0.5 if premium else 1.0)
         listing_fee_per_potion = sell_price * self.listing_fee
@@ -177,7 +248,13 @@ class PotionCalculator:
         profit_per_potion = sell_price_after_tax - cost_per_potion
         total_profit = profit_per_potion * quantity  # Прибуток тільки з запитаної кількості
         
-        return {
+        # Скільки зілля ринок міста продажу приймає за день (None - обсяги невідомі)
+        sellable_per_day = self.volumes.daily_volume_for(potion_id, self.sell_city, quality)
+        sellable_quantity = quantity if sellable_per_day is None else min(quantity, int(sellable_per_day))
+        volume_capped_profit = profit_per_potion * sellable_quantity
+        
+        _CALCULATIONS_OK.inc()
+        result = {
             'potion_id': potion_id,
             'potion_name': recipe['name'],
             'quantity': quantity,  # Запитана кількість
@@ -192,11 +269,15 @@ class PotionCalculator:
             'total_cost': total_cost,
             'cost_per_potion': cost_per_potion,
             'sell_price': sell_price,
+            'sell_price_city': sell_price_city,  # Місто, з якого фактично взято ціну продажу
             'sell_price_after_tax': sell_price_after_tax,
             'sales_tax_per_potion': sales_tax_per_potion,
             'listing_fee_per_potion': listing_fee_per_potion,
             'profit_per_potion': profit_per_potion,
             'total_profit': total_profit,
+            'sellable_per_day': sellable_per_day,  # Середній денний обсяг продажів у місті продажу
+            'sellable_quantity': sellable_quantity,  # Скільки із запитаної кількості ринок прийме за день
+            'volume_capped_profit': volume_capped_profit,  # Прибуток з цієї кількості
             'roi_percent': (profit_per_potion / cost_per_potion * 100) if cost_per_potion > 0 else 0.0,
             'ingredient_details': ingredient_details,
             'settings': {
@@ -207,10 +288,21 @@ class PotionCalculator:
                 'market_tax': effective_sales_tax,
                 'listing_fee': self.listing_fee,
                 'premium': premium,
+                'craft_intermediates': craft_intermediates,
+                'quality': quality,
                 'craft_city': self.craft_city,
-                'sell_city': self.sell_city
+                'sell_city': self.sell_city,
+                'source_anywhere': source_anywhere,
+                'transport_cost': transport_cost
             }
         }
+        if sourcing is not None:
+            # Що і де купити на всі крафти (проміжні, які крафтяться самим, не купуються)
+            result['shopping_list'] = sourcing.shopping_list({
+                ing_id: details['required_total_quantity']
+                for ing_id, details in ingredient_details.items() if details['source'] == 'buy'
+            }, self.craft_city)
+        return result
     
     def print_calculation_report(self, result: Dict):
         """Виводить звіт про розрахунок"""
@@ -242,6 +334,13 @@ class PotionCalculator:
             else:
                 print(f"  {ing_name}: {details['quantity']} x {details['unit_price']:.2f} = {details['total_cost']:.2f} срібла")
         
+        if result.get('shopping_list'):
+            print(f"\n--- Де купувати (перевезення {result['settings']['transport_cost']:.0f} срібла за одиницю) ---")
+            for buy_city, items in result['shopping_list'].items():
+                print(f"  {buy_city}:")
+                for item in items:
+                    print(f"    {item['name']}: {item['quantity']} x ({item['unit_price']:.2f} + {item['transport_cost']:.2f}) = {item['total_cost']:.2f} срібла")
+        
         print(f"\n--- Продаж ---")
         print(f"Ціна продажу: {result['sell_price']:.2f} срібла")
         print(f"Після всіх зборів: {result['sell_price_after_tax']:.2f} срібла")
@@ -250,6 +349,11 @@ class PotionCalculator:
         profit_color = "✓" if result['profit_per_potion'] > 0 else "✗"
         print(f"Прибуток з одного зілля: {profit_color} {result['profit_per_potion']:.2f} срібла")
         print(f"Загальний прибуток: {profit_color} {result['total_profit']:.2f} срібла")
+        if result.get('sellable_per_day') is not None:
+            print(f"Продається за день у місті продажу: ~{result['sellable_per_day']:.1f} зілля")
+            if result['sellable_quantity'] < result['quantity']:
+                print(f"Прибуток з обсягу одного дня ({result['sellable_quantity']:.0f} зілля): "
+                      f"{result['volume_capped_profit']:.2f} срібла")
         print(f"ROI: {result['roi_percent']:.2f}%")
         
         print(f"\n--- Налаштування ---")
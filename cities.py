@@ -0,0 +1,36 @@
+from typing import Dict
+
+# Канонічні назви міст - так, як їх повертає Albion Data API
+CITIES = [
+    "Caerleon",
+    "Bridgewatch",
+    "Lymhurst",
+    "Martlock",
+    "Fort Sterling",
+    "Thetford",
+    "Brecilien"
+]
+
+# Пріоритет міст для пошуку ціни, якщо в обраному місті її немає
+PRIORITY_CITIES = ["Caerleon", "Thetford", "Bridgewatch", "Lymhurst", "Martlock", "Fort Sterling", "Brecilien"]
+
+def _city_key(name: str) -> str:
+    """Ключ для порівняння назв міст без урахування регістру, пробілів і підкреслень"""
+    return "".join(ch for ch in name.lower() if ch.isalnum())
+
+# Усі відомі варіанти написання -> канонічна назва ("FortSterling", "fort_sterling" -> "Fort Sterling")
+CITY_ALIASES: Dict[str, str] = {_city_key(city): city for city in CITIES}
+
+def normalize_city(name: str) -> str:
+    """
+    Приводить назву міста до канонічної
+
+    Args:
+        name: Назва міста в будь-якому написанні
+
+    Returns:
+        Канонічна назва або сама назва (без пробілів по краях), якщо місто невідоме
+    """
+    if name is None:
+        return name
+    return CITY_ALIASES.get(_city_key(name), name.strip())
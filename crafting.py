@@ -0,0 +1,126 @@
+import threading
+from typing import Dict, Optional
+from recipes import INTERMEDIATE_RECIPES
+from get_prices import find_item_price
+from calculator import default_return_rate
+from cities import normalize_city
+
+class CraftResolver:
+    """
+    Вирішує для кожного інгредієнта: купити на ринку чи скрафтити самому.
+
+    Рецепти проміжних інгредієнтів утворюють граф залежностей. Вартість
+    вузла - мінімум з ринкової ціни і вартості крафту (інгредієнти вузла з
+    урахуванням повернення ресурсів, поділені на вихід). Результат кожного
+    вузла запам'ятовується для пари (предмет, місто), тому розрахунок усього
+    каталогу лінійний за розміром графа. Резолвер прив'язаний до однієї
+    таблиці цін - для нового знімка створюється новий (див. get_resolver).
+    """
+
+    def __init__(self, prices: Dict, recipes: Dict = INTERMEDIATE_RECIPES, use_buy_price: bool = False,
+                 return_rate: Optional[float] = None):
+        """
+        Args:
+            prices: Таблиця або словник з цінами
+            recipes: Рецепти проміжних інгредієнтів
+            use_buy_price: Використовувати ціну покупки матеріалів
+            return_rate: Відсоток повернення при крафті проміжних (None - базовий для міста)
+        """
+        self.prices = prices
+        self.recipes = recipes
+        self.price_type = "buy_price_max" if use_buy_price else "sell_price_min"
+        self.return_rate = return_rate
+        self._memo: Dict = {}
+        self._in_progress = set()
+        # Рекурсивний, бо resolve викликає себе для інгредієнтів
+        self._lock = threading.RLock()
+
+    def resolve(self, item_id: str, city: str) -> Dict:
+        """
+        Найдешевший спосіб отримати одиницю предмета в місті
+
+        Returns:
+            Словник: unit_price (0.0 - ціни немає), source ('buy' або 'craft'),
+            market_price, price_city, craft_cost (None - крафт неможливий)
+            і components - рішення для інгредієнтів крафту
+        """
+        city = normalize_city(city)
+        key = (item_id, city)
+        cached = self._memo.get(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            return self._resolve(item_id, city, key)
+
+    def _resolve(self, item_id: str, city: str, key) -> Dict:
+        cached = self._memo.get(key)
+        if cached is not None:
+            return cached
+        if key in self._in_progress:
+            raise ValueError(f"Циклічна залежність у рецептах: {item_id}")
+
+        self._in_progress.add(key)
+        try:
+            market_price, price_city = find_item_price(item_id, self.prices, city, self.price_type)
+            craft_cost, components = self._craft_cost(item_id, city)
+        finally:
+            self._in_progress.discard(key)
+
+        if craft_cost is not None and (market_price <= 0 or craft_cost < market_price):
+            decision = {'unit_price': craft_cost, 'source': 'craft'}
+        else:
+            decision = {'unit_price': market_price, 'source': 'buy'}
+        decision.update({
+            'market_price': market_price,
+            'price_city': price_city,
+            'craft_cost': craft_cost,
+            'components': components,
+        })
+        self._memo[key] = decision
+        return decision
+
+    def _craft_cost(self, item_id: str, city: str):
+        """Вартість крафту одиниці предмета (None, якщо рецепта немає або інгредієнт без ціни)"""
+        recipe = self.recipes.get(item_id)
+        if recipe is None:
+            return None, {}
+
+        return_rate = self.return_rate if self.return_rate is not None else default_return_rate(city)
+        total = 0.0
+        components = {}
+        for ingredient_id, quantity in recipe['ingredients'].items():
+            component = self.resolve(ingredient_id, city)
+            if component['unit_price'] <= 0:
+                return None, {}
+            components[ingredient_id] = component
+            total += component['unit_price'] * quantity
+
+        return total * (1 - return_rate) / recipe.get('yield', 1), components
+
+    def unit_price(self, item_id: str, city: str):
+        """
+        Returns:
+            Кортеж (ціна одиниці, місто ринкової ціни, 'buy' або 'craft')
+        """
+        decision = self.resolve(item_id, city)
+        return decision['unit_price'], decision['price_city'], decision['source']
+
+# Резолвери останньої таблиці цін: (таблиця, {use_buy_price: CraftResolver})
+_resolvers = (None, {})
+
+def get_resolver(prices: Dict, use_buy_price: bool = False) -> CraftResolver:
+    """
+    Спільний резолвер для таблиці цін
+
+    Поки передається той самий знімок цін, результати крафту/купівлі
+    перевикористовуються між запитами; новий знімок скидає пам'ять.
+    """
+    global _resolvers
+    cached_prices, resolvers = _resolvers
+    if prices is not cached_prices:
+        resolvers = {}
+        _resolvers = (prices, resolvers)
+    resolver = resolvers.get(use_buy_price)
+    if resolver is None:
+        resolver = resolvers[use_buy_price] = CraftResolver(prices, use_buy_price=use_buy_price)
+    return resolver
@@ -0,0 +1,103 @@
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+from price_table import PriceTable
+from cities import CITIES
+from recipes import RECIPES
+from variants import split_enchantment
+
+# Типи цін, якими користується калькулятор (продаж зілля і покупка/замовлення матеріалів)
+REPORT_PRICE_TYPES = ("sell_price_min", "buy_price_max")
+
+def report_items(item_ids: Sequence[str], recipes: Dict = RECIPES) -> List[str]:
+    """
+    Предмети каталогу, ціни яких потрібні калькулятору
+
+    Каталог завантажує зачаровані варіанти @n усіх зілль, але рецепти є лише
+    для деяких; варіант, якого немає серед рецептів та їх інгредієнтів,
+    ніде не використовується, тож відсутність його ціни - не проблема даних.
+    """
+    used = set(recipes)
+    for recipe in recipes.values():
+        used.update(recipe['ingredients'])
+    return [item_id for item_id in item_ids if split_enchantment(item_id)[1] == 0 or item_id in used]
+
+def build_report(table: PriceTable, item_ids: Sequence[str], price_types: Sequence[str] = REPORT_PRICE_TYPES,
+                 cities: Sequence[str] = CITIES, recipes: Dict = RECIPES) -> Dict:
+    """
+    Звіт про якість даних знімка цін для каталогу предметів
+
+    Замість попередження на кожен пошук ціни всі проблеми знімка рахуються
+    один раз, векторно по PriceTable.source:
+      - missing_items - предметів каталогу немає в знімку зовсім;
+      - zero_price_items - предмет є, але ціна цього типу 0 у всіх містах;
+      - cells - клітинки [предмет, місто]: ціна свого міста (direct),
+        запасного міста (fallback) або ціни немає (missing);
+      - fallbacks - які клітинки беруть ціну з іншого міста і з якого.
+
+    Args:
+        table: Таблиця цін знімка
+        item_ids: Предмети каталогу (зачаровані варіанти без рецептів не перевіряються, див. report_items)
+        price_types: Типи цін для перевірки
+        cities: Міста для перевірки
+        recipes: Рецепти, за якими визначаються потрібні варіанти
+
+    Returns:
+        Словник звіту (придатний для JSON)
+    """
+    item_ids = report_items(item_ids, recipes)
+    present = [item_id for item_id in item_ids if item_id in table.item_index]
+    rows = np.array([table.item_index[item_id] for item_id in present], dtype=np.intp)
+    columns = [(city, table.city_index[city]) for city in cities if city in table.city_index]
+    column_index = np.array([j for _, j in columns], dtype=np.intp)
+
+    report = {
+        'items_total': len(item_ids),
+        'items_present': len(present),
+        'missing_items': [item_id for item_id in item_ids if item_id not in table.item_index],
+        'zero_price_items': {},
+        'cells': {},
+        'fallbacks_by_city': {},
+        'fallbacks': [],
+    }
+    for price_type in price_types:
+        k = table.price_type_index[price_type]
+        source = table.source[rows][:, column_index, k] if len(rows) else np.zeros((0, len(columns)), dtype=np.int16)
+        direct = source == column_index[None, :]
+        missing = source < 0
+        fallback = ~direct & ~missing
+
+        report['zero_price_items'][price_type] = [present[i] for i in np.flatnonzero(missing.all(axis=1))]
+        report['cells'][price_type] = {
+            'total': int(source.size),
+            'direct': int(direct.sum()),
+            'fallback': int(fallback.sum()),
+            'missing': int(missing.sum()),
+        }
+        report['fallbacks_by_city'][price_type] = {
+            city: int(fallback[:, c].sum()) for c, (city, _) in enumerate(columns)
+        }
+        for i, c in zip(*np.nonzero(fallback)):
+            report['fallbacks'].append({
+                'item_id': present[i],
+                'city': columns[c][0],
+                'price_type': price_type,
+                'source_city': table.cities[source[i, c]],
+            })
+    return report
+
+def format_summary(report: Dict, timestamp: Optional[str] = None) -> str:
+    """Короткий опис звіту для журналу (виводиться один раз на знімок)"""
+    header = "Якість даних цін" + (f" ({timestamp})" if timestamp else "")
+    lines = [f"{header}: {report['items_present']} з {report['items_total']} предметів каталогу є в знімку"]
+    if report['missing_items']:
+        lines.append(f"  немає в знімку: {len(report['missing_items'])} ({', '.join(report['missing_items'][:5])}"
+                     + (", ..." if len(report['missing_items']) > 5 else "") + ")")
+    for price_type, cells in report['cells'].items():
+        worst = sorted(report['fallbacks_by_city'][price_type].items(), key=lambda item: -item[1])[:3]
+        worst_text = ", ".join(f"{city}: {count}" for city, count in worst if count)
+        lines.append(
+            f"  {price_type}: власне місто {cells['direct']}, запасне {cells['fallback']}, немає {cells['missing']}"
+            f" з {cells['total']}; без ціни в жодному місті {len(report['zero_price_items'][price_type])} предметів"
+            + (f"; найбільше запасних: {worst_text}" if worst_text else "")
+        )
+    return "\n".join(lines)
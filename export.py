@@ -0,0 +1,148 @@
+import csv
+import io
+import itertools
+import json
+import numpy as np
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+from opportunities import OpportunityMatrix
+
+# Стовпці експорту таблиці прибутковості (порядок - як у CSV)
+EXPORT_COLUMNS = (
+    'potion_id', 'potion_name', 'craft_city', 'sell_city',
+    'focus_bonus', 'premium', 'return_rate', 'extra_bonus_pct', 'machine_cost', 'use_buy_price',
+    'cost_per_potion', 'sell_price', 'sell_price_after_tax', 'profit_per_potion', 'roi_percent',
+)
+# Скільки рядків збирається в один шматок потоку
+EXPORT_CHUNK_ROWS = 500
+# Обмеження кількості комбінацій налаштувань в одному експорті
+MAX_EXPORT_SETTINGS = 10_000
+
+def parse_number_list(value, default: Sequence) -> List:
+    """
+    Список чисел з рядка через кому (або списку з JSON); порожнє значення - default
+
+    Raises:
+        ValueError: якщо значення не є числом
+    """
+    if value is None or value == '' or value == []:
+        return list(default)
+    if isinstance(value, str):
+        value = [part for part in value.split(",") if part.strip()]
+    return [float(part) for part in value]
+
+def settings_grid(
+    focus_options: Sequence[bool] = (False, True),
+    premium_options: Sequence[bool] = (False, True),
+    machine_costs: Sequence[float] = (0.0,),
+    return_rates: Sequence[Optional[float]] = (None,),
+    extra_bonus_pcts: Sequence[float] = (0.0,),
+    use_buy_price: bool = False
+) -> Iterator[Dict]:
+    """
+    Комбінації налаштувань станку (лінива ітерація)
+
+    Args:
+        return_rates: Відсотки повернення (0.0 - 1.0); None - базовий для міста крафту
+    """
+    for focus, premium, machine_cost, return_rate, extra_bonus_pct in itertools.product(
+        focus_options, premium_options, machine_costs, return_rates, extra_bonus_pcts
+    ):
+        yield {
+            'focus_bonus': bool(focus),
+            'premium': bool(premium),
+            'machine_cost_per_100': float(machine_cost),
+            'return_rate': return_rate,
+            'extra_bonus_pct': float(extra_bonus_pct),
+            'use_buy_price': use_buy_price,
+        }
+
+def count_settings(*options: Sequence) -> int:
+    """Кількість комбінацій налаштувань для списків варіантів"""
+    count = 1
+    for values in options:
+        count *= len(values)
+    return count
+
+def iter_export_rows(matrix: OpportunityMatrix, prices: Dict, settings: Iterable[Dict]) -> Iterator[Dict]:
+    """
+    Рядки таблиці прибутковості зілля × місто крафту × місто продажу × налаштування
+
+    Для кожної комбінації налаштувань OpportunityMatrix рахує один блок [P, C, S],
+    і його рядки віддаються по одному, тож у пам'яті одночасно лише один блок,
+    скільки б налаштувань не було. Комбінації без ціни продажу або вартості
+    крафту пропускаються, як у рейтингу /opportunities.
+    """
+    for setting in settings:
+        result = matrix.compute(
+            prices,
+            machine_cost_per_100=setting['machine_cost_per_100'],
+            focus_bonus=setting['focus_bonus'],
+            extra_bonus_pct=setting['extra_bonus_pct'],
+            return_rate=setting['return_rate'],
+            use_buy_price=setting['use_buy_price'],
+            premium=setting['premium'],
+        )
+        valid = (result['sell_price'] > 0)[:, None, :] & (result['cost_per_potion'] > 0)[:, :, None]
+        if setting['return_rate'] is None:
+            return_rates = matrix.city_return_rates.tolist()
+        else:
+            return_rates = [float(setting['return_rate'])] * len(matrix.cities)
+
+        cost = result['cost_per_potion'].tolist()
+        sell = result['sell_price'].tolist()
+        sell_after_tax = result['sell_price_after_tax'].tolist()
+        profit = result['profit_per_potion']
+        roi = result['roi_percent']
+        for p, c, s in zip(*np.nonzero(valid)):
+            yield {
+                'potion_id': matrix.potion_ids[p],
+                'potion_name': matrix.potion_names[p],
+                'craft_city': matrix.cities[c],
+                'sell_city': matrix.cities[s],
+                'focus_bonus': setting['focus_bonus'],
+                'premium': setting['premium'],
+                'return_rate': return_rates[c],
+                'extra_bonus_pct': setting['extra_bonus_pct'],
+                'machine_cost': setting['machine_cost_per_100'],
+                'use_buy_price': setting['use_buy_price'],
+                'cost_per_potion': cost[p][c],
+                'sell_price': sell[p][s],
+                'sell_price_after_tax': sell_after_tax[p][s],
+                'profit_per_potion': profit.item(p, c, s),
+                'roi_percent': roi.item(p, c, s),
+            }
+
+def iter_csv(rows: Iterable[Dict], columns: Sequence[str] = EXPORT_COLUMNS,
+             chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[str]:
+    """CSV шматками по chunk_rows рядків (перший шматок - заголовок)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    pending = 1
+    for row in rows:
+        writer.writerow([row[column] for column in columns])
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
+
+def iter_ndjson(rows: Iterable[Dict], chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[str]:
+    """NDJSON (один JSON-об'єкт на рядок) шматками по chunk_rows рядків"""
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(row, ensure_ascii=False))
+        if len(chunk) >= chunk_rows:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+# Формат -> (функція серіалізації, MIME-тип)
+EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv; charset=utf-8'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson; charset=utf-8'),
+}
@@ -0,0 +1,351 @@
+import argparse
+import logging
+import math
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from flask import Flask, jsonify, request
+from cities import CITIES
+from price_table import PRICE_TYPES, DATE_SUFFIX
+from variants import price_key
+
+# Локальна заміна Albion Data API для офлайн-розробки і навантажувального тестування.
+# Запуск:  python fake_api.py serve --synthetic --latency 0.2 --error-rate 0.05
+# і далі:  ALBION_API_BASE=http://127.0.0.1:8765/api/v2/stats/prices python app.py
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+API_PATH = "/api/v2/stats/prices"
+HISTORY_PATH = "/api/v2/stats/history"
+# Скільки днів денної історії віддає ендпоінт історії
+HISTORY_DAYS = 28
+# Дата, якою справжнє API позначає відсутню ціну
+EMPTY_DATE = "0001-01-01T00:00:00"
+# Статуси, якими відповідає сервер при імітації збою
+ERROR_STATUSES = (500, 502, 503)
+
+class FakeApiConfig:
+    """
+    Поведінка фейкового API
+
+    Attributes:
+        latency: Базова затримка відповіді (секунди)
+        jitter: Випадкова додаткова затримка 0..jitter (секунди)
+        error_rate: Частка запитів, які отримують 5xx (0.0 - 1.0)
+        throttle_rate: Частка запитів, які отримують 429 незалежно від ліміту
+        rate_limit: Скільки запитів дозволено за rate_window (None - без ліміту)
+        rate_window: Вікно ліміту запитів (секунди)
+        retry_after: Значення заголовка Retry-After для випадкових 429
+        max_items: Максимум предметів в одному запиті (None - без ліміту; більше - 414)
+        seed: Зерно генератора (однакове зерно - однакові збої і ціни)
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, rate_limit: Optional[int] = None, rate_window: float = 60.0,
+                 retry_after: float = 1.0, max_items: Optional[int] = None, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.retry_after = retry_after
+        self.max_items = max_items
+        self.seed = seed
+
+class PriceSource:
+    """
+    Джерело цін для відповідей: знімок цін (prices_cache.json) або синтетичний генератор
+
+    Синтетичні ціни детерміновані для (зерно, предмет, місто, якість), тож будь-який
+    список предметів, зокрема згенеровані synthetic_item_ids, отримує стабільні ціни.
+    """
+
+    def __init__(self, prices: Optional[Dict] = None, seed: int = 0, observed_at: Optional[str] = None):
+        """
+        Args:
+            prices: {item_id: {city: {prices...}}} або None - синтетичні ціни
+            seed: Зерно синтетичного генератора
+            observed_at: Дата спостереження цін (за замовчуванням - час запуску)
+        """
+        self.prices = prices
+        self.seed = seed
+        self.observed_at = observed_at or time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())
+
+    @classmethod
+    def from_cache(cls, path: str) -> "PriceSource":
+        """Джерело з JSON-кешу (формат prices_cache.json)"""
+        import price_store
+        prices, timestamp, _ = price_store.load_json(path)
+        return cls(prices, observed_at=timestamp.strftime("%Y-%m-%dT%H:%M:%S"))
+
+    def _synthetic(self, item_id: str, city: str, quality: int) -> Dict:
+        """Ціни одного рядка; частина рядків порожня, як на справжньому ринку"""
+        rng = random.Random(f"{self.seed}:{item_id}:{city}:{quality}")
+        # Вищі якості торгуються рідше
+        if rng.random() < (0.15 if quality == 1 else 0.6):
+            return {}
+        base = random.Random(f"{self.seed}:{item_id}").randint(50, 50_000) * (1 + 0.3 * (quality - 1))
+        return {price_type: int(base * rng.uniform(0.85, 1.15)) for price_type in PRICE_TYPES}
+
+    def row(self, item_id: str, city: str, quality: int) -> Dict:
+        """Рядок відповіді у форматі Albion Data API"""
+        if self.prices is None:
+            values = self._synthetic(item_id, city, quality)
+            dates = {price_type: self.observed_at for price_type in values}
+        else:
+            city_data = self.prices.get(price_key(item_id, quality), {}).get(city, {})
+            values = {price_type: city_data.get(price_type, 0) for price_type in PRICE_TYPES}
+            dates = {
+                price_type: city_data.get(price_type + DATE_SUFFIX) or self.observed_at
+                for price_type in PRICE_TYPES if values[price_type]
+            }
+
+        row = {'item_id': item_id, 'city': city, 'quality': quality}
+        for price_type in PRICE_TYPES:
+            row[price_type] = values.get(price_type, 0)
+            row[price_type + DATE_SUFFIX] = dates.get(price_type, EMPTY_DATE) if row[price_type] else EMPTY_DATE
+        return row
+
+    def rows(self, item_ids: List[str], locations: List[str], qualities: List[int]) -> List[Dict]:
+        """Рядки для кожної комбінації предмет × місто × якість (як у справжньому API)"""
+        return [
+            self.row(item_id, city, quality)
+            for item_id in item_ids
+            for city in locations
+            for quality in qualities
+        ]
+
+    def history_row(self, item_id: str, city: str, quality: int, days: int = HISTORY_DAYS) -> Optional[Dict]:
+        """
+        Рядок ендпоінта історії: денні обсяги торгів (синтетичні для будь-якого джерела)
+
+        Returns:
+            Рядок або None, якщо предмет у місті не торгується
+        """
+        rng = random.Random(f"{self.seed}:history:{item_id}:{city}:{quality}")
+        if rng.random() < (0.2 if quality == 1 else 0.7):
+            return None
+        base_volume = rng.randint(1, 400) // quality
+        base_price = random.Random(f"{self.seed}:{item_id}").randint(50, 50_000) * (1 + 0.3 * (quality - 1))
+        today = int(time.time() // 86400)
+        data = []
+        for day in range(today - days + 1, today + 1):
+            count = int(base_volume * rng.uniform(0.0, 2.0))
+            if count:
+                data.append({
+                    'item_count': count,
+                    'avg_price': int(base_price * rng.uniform(0.9, 1.1)),
+                    'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(day * 86400)),
+                })
+        if not data:
+            return None
+        return {'location': city, 'item_id': item_id, 'quality': quality, 'data': data}
+
+    def history_rows(self, item_ids: List[str], locations: List[str], qualities: List[int]) -> List[Dict]:
+        """Рядки історії лише для комбінацій з угодами (як у справжньому API)"""
+        rows = (
+            self.history_row(item_id, city, quality)
+            for item_id in item_ids
+            for city in locations
+            for quality in qualities
+        )
+        return [row for row in rows if row is not None]
+
+def synthetic_item_ids(count: int) -> List[str]:
+    """Список синтетичних ID предметів для навантажувальних тестів"""
+    return [f"T{4 + n % 5}_FAKE_ITEM_{n:06d}" for n in range(count)]
+
+class FakeAlbionApi:
+    """Стан фейкового API: конфігурація, джерело цін, ліміт запитів і лічильники"""
+
+    def __init__(self, source: Optional[PriceSource] = None, config: Optional[FakeApiConfig] = None):
+        self.config = config or FakeApiConfig()
+        self.source = source or PriceSource(seed=self.config.seed)
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._window: deque = deque()
+        self.stats = {'requests': 0, 'ok': 0, 'errors': 0, 'throttled': 0, 'too_long': 0, 'items': 0, 'rows': 0}
+
+    def _count(self, key: str, value: int = 1):
+        with self._lock:
+            self.stats[key] += value
+
+    def _throttle(self) -> Optional[float]:
+        """Retry-After (секунди), якщо запит треба відхилити з 429, інакше None"""
+        config = self.config
+        with self._lock:
+            if self._rng.random() < config.throttle_rate:
+                return config.retry_after
+            if config.rate_limit is None:
+                return None
+            now = time.monotonic()
+            while self._window and now - self._window[0] >= config.rate_window:
+                self._window.popleft()
+            if len(self._window) >= config.rate_limit:
+                return max(0.0, config.rate_window - (now - self._window[0]))
+            self._window.append(now)
+            return None
+
+    def handle(self, items_param: str, locations: Optional[str], qualities: Optional[str],
+               history: bool = False) -> Tuple[int, object, Dict]:
+        """
+        Обробляє один запит цін (history - запит історії торгів)
+
+        Returns:
+            Кортеж (статус, тіло для JSON, заголовки)
+        """
+        self._count('requests')
+        config = self.config
+        with self._lock:
+            delay = config.latency + (self._rng.uniform(0, config.jitter) if config.jitter > 0 else 0.0)
+            fail = self._rng.random() < config.error_rate
+            status = self._rng.choice(ERROR_STATUSES)
+        if delay > 0:
+            time.sleep(delay)
+
+        retry_after = self._throttle()
+        if retry_after is not None:
+            self._count('throttled')
+            return 429, {'error': 'Too Many Requests'}, {'Retry-After': str(math.ceil(retry_after))}
+        if fail:
+            self._count('errors')
+            return status, {'error': 'Simulated failure'}, {}
+
+        item_ids = [item_id for item_id in items_param.split(",") if item_id]
+        if config.max_items is not None and len(item_ids) > config.max_items:
+            self._count('too_long')
+            return 414, {'error': 'URI Too Long'}, {}
+        city_list = [city.strip() for city in (locations or ",".join(CITIES)).split(",") if city.strip()]
+        quality_list = [int(q) for q in (qualities or "1").split(",") if q.strip().isdigit()] or [1]
+
+        rows = (self.source.history_rows if history else self.source.rows)(item_ids, city_list, quality_list)
+        self._count('ok')
+        self._count('items', len(item_ids))
+        self._count('rows', len(rows))
+        return 200, rows, {}
+
+def create_app(api: FakeAlbionApi) -> Flask:
+    """Flask-застосунок фейкового API"""
+    fake = Flask(__name__)
+
+    def respond(items, history=False):
+        status, body, headers = api.handle(items, request.args.get('locations'), request.args.get('qualities'),
+                                           history)
+        response = jsonify(body)
+        response.status_code = status
+        response.headers.update(headers)
+        return response
+
+    @fake.route(f"{API_PATH}/<path:items>")
+    def prices(items):
+        return respond(items)
+
+    @fake.route(f"{HISTORY_PATH}/<path:items>")
+    def history(items):
+        return respond(items, history=True)
+
+    @fake.route('/_fake/stats')
+    def stats():
+        with api._lock:
+            return jsonify(dict(api.stats))
+
+    return fake
+
+def start_in_thread(api: FakeAlbionApi, host: str = DEFAULT_HOST, port: int = 0):
+    """
+    Запускає фейкове API у фоновому потоці
+
+    Returns:
+        Кортеж (сервер werkzeug, базовий URL для ALBION_API_BASE); зупинка - server.shutdown()
+    """
+    from werkzeug.serving import make_server
+    server = make_server(host, port, create_app(api), threaded=True)
+    threading.Thread(target=server.serve_forever, name="fake-albion-api", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}{API_PATH}"
+
+def build_api(args) -> FakeAlbionApi:
+    """FakeAlbionApi з аргументів командного рядка"""
+    config = FakeApiConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        rate_limit=args.rate_limit,
+        rate_window=args.rate_window,
+        retry_after=args.retry_after,
+        max_items=args.max_items,
+        seed=args.seed,
+    )
+    source = PriceSource(seed=args.seed) if args.synthetic else PriceSource.from_cache(args.cache)
+    return FakeAlbionApi(source, config)
+
+def run_serve(args) -> int:
+    """Запускає фейкове API в поточному процесі"""
+    api = build_api(args)
+    print(f"Фейкове Albion Data API: ALBION_API_BASE=http://{args.host}:{args.port}{API_PATH}")
+    create_app(api).run(host=args.host, port=args.port, threaded=True)
+    return 0
+
+def run_stress(args) -> int:
+    """Проганяє конвеєр завантаження цін (fetch_all_prices) проти фейкового API"""
+    import get_prices
+
+    api = build_api(args)
+    # Журнал кожного запиту werkzeug заглушив би звіт
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server, base_url = start_in_thread(api, args.host)
+    get_prices.ALBION_API_BASE = base_url
+    item_ids = synthetic_item_ids(args.items)
+    limiter = get_prices.TokenBucket(rate=args.client_rate, capacity=max(1, args.workers))
+    try:
+        started = time.monotonic()
+        prices, failed_items = get_prices.fetch_all_prices(
+            item_ids, batch_size=args.batch_size, max_workers=args.workers, limiter=limiter
+        )
+        elapsed = time.monotonic() - started
+    finally:
+        server.shutdown()
+
+    print(f"\nПредметів: {len(item_ids)}, батчів: {(len(item_ids) + args.batch_size - 1) // args.batch_size}")
+    print(f"Ключів цін (предмети × якості): {len(prices)}, не вдалося: {len(failed_items)} предметів")
+    print(f"Час: {elapsed:.2f} с ({len(item_ids) / elapsed:.0f} предметів/с)" if elapsed > 0 else "Час: 0 с")
+    print("Сервер: " + ", ".join(f"{key}={value}" for key, value in api.stats.items()))
+    return 1 if failed_items else 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Локальна заміна Albion Data API")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_common(sub):
+        sub.add_argument('--host', default=DEFAULT_HOST)
+        sub.add_argument('--cache', default="prices_cache.json", help="JSON-кеш цін для відповідей")
+        sub.add_argument('--synthetic', action='store_true', help="синтетичні ціни замість кешу")
+        sub.add_argument('--latency', type=float, default=0.0, help="затримка відповіді, с")
+        sub.add_argument('--jitter', type=float, default=0.0, help="випадкова додаткова затримка, с")
+        sub.add_argument('--error-rate', type=float, default=0.0, help="частка відповідей 5xx")
+        sub.add_argument('--throttle-rate', type=float, default=0.0, help="частка випадкових відповідей 429")
+        sub.add_argument('--rate-limit', type=int, default=None, help="запитів за --rate-window, далі 429")
+        sub.add_argument('--rate-window', type=float, default=60.0, help="вікно ліміту запитів, с")
+        sub.add_argument('--retry-after', type=float, default=1.0, help="Retry-After для випадкових 429, с")
+        sub.add_argument('--max-items', type=int, default=None, help="максимум предметів у запиті (більше - 414)")
+        sub.add_argument('--seed', type=int, default=0)
+
+    serve = subparsers.add_parser('serve', help="запустити сервер")
+    add_common(serve)
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.set_defaults(handler=run_serve)
+
+    stress = subparsers.add_parser('stress', help="навантажити fetch_all_prices синтетичними предметами")
+    add_common(stress)
+    stress.add_argument('--items', type=int, default=10_000, help="кількість синтетичних предметів")
+    stress.add_argument('--batch-size', type=int, default=50)
+    stress.add_argument('--workers', type=int, default=4)
+    stress.add_argument('--client-rate', type=float, default=100.0, help="ліміт запитів клієнта на секунду")
+    stress.set_defaults(handler=run_stress, synthetic=True)
+    return parser
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    raise SystemExit(args.handler(args))
@@ -1,14 +1,205 @@
 import requests
-import json
+import numpy as np
 import os
+import random
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional, Tuple
+from price_table import PriceTable
+import price_store
+from history import get_history
+import metrics
+import data_quality
+from cities import CITIES, PRIORITY_CITIES, normalize_city
+from variants import QUALITIES, ENCHANTMENTS, price_key, split_price_key, split_enchantment, with_enchantments
 
-# Albion Data API base URL
-ALBION_API_BASE = "https://www.albion-online-data.com/api/v2/stats/prices"
+try:
+    import fcntl
+except ImportError:  # Windows - лише блокування в межах процесу
+    fcntl = None
+
+# Albion Data API base URL (змінна оточення ALBION_API_BASE - напр. локальний fake_api.py)
+DEFAULT_ALBION_API_BASE = "https://www.albion-online-data.com/api/v2/stats/prices"
+ALBION_API_BASE = os.environ.get("ALBION_API_BASE", DEFAULT_ALBION_API_BASE).rstrip("/")
+# Історія торгів (обсяги продажів) - сусідній ендпоінт того самого API
+ALBION_HISTORY_API_BASE = os.environ.get(
+    "ALBION_HISTORY_API_BASE", ALBION_API_BASE.rsplit("/", 1)[0] + "/history"
+).rstrip("/")
 # Основні локації для отримання цін (можна додати більше)
-DEFAULT_LOCATIONS = "Caerleon,Bridgewatch,Lymhurst,Martlock,FortSterling,Thetford,Brecilien"  # ДОДАНО: Brecilien
+DEFAULT_LOCATIONS = ",".join(CITIES)
 DEFAULT_QUALITY = "1"  # Якість предметів (1 = нормальна)
+# Якості, які завантажуються з API; ціни якості q > 1 зберігаються під ключем price_key(item_id, q)
+DEFAULT_QUALITIES = ",".join(str(q) for q in QUALITIES)
+
+# Параметри конвеєра завантаження цін
+API_BATCH_SIZE = 50         # API має обмеження на кількість предметів в одному запиті (зазвичай ~100)
+API_MAX_WORKERS = 4         # Кількість одночасних запитів
+API_RATE_PER_SECOND = 3.0   # Середня кількість запитів на секунду (ліміт API ~180 за хвилину)
+API_RATE_BURST = 4          # Скільки запитів можна зробити підряд без очікування
+API_MAX_RETRIES = 3         # Повторні спроби для батча після першої невдачі
+API_BACKOFF_BASE = 0.5      # Базова затримка експоненційного відступу (секунди)
+API_TIMEOUT = 30
+
+# Метрики конвеєра цін (див. metrics.py)
+_API_BATCH_SECONDS = metrics.histogram("albion_api_batch_seconds", "Тривалість запиту батча до Albion Data API")
+_API_BATCHES = {
+    result: metrics.counter("albion_api_batches_total", "Запити батчів до Albion Data API за результатом", result=result)
+    for result in ("ok", "error", "throttled")
+}
+_REFRESH_SECONDS = metrics.histogram("albion_price_refresh_seconds", "Тривалість оновлення цін з API",
+                                     buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300))
+_REFRESHES = {
+    result: metrics.counter("albion_price_refreshes_total", "Оновлення цін за результатом", result=result)
+    for result in ("ok", "failed", "not_due", "busy")
+}
+_CACHE_REQUESTS = {
+    result: metrics.counter("albion_price_cache_requests_total",
+                            "Запити цін: hit - свіжий знімок, stale - застарілий з фоновим оновленням, miss - очікування API",
+                            result=result)
+    for result in ("hit", "stale", "miss")
+}
+_SNAPSHOT_RELOADS = metrics.counter("albion_price_snapshot_reloads_total", "Перечитування файлу кешу цін воркером")
+_LOOKUP_HIT = metrics.counter("albion_price_lookups_total", "Пошук ціни предмета за результатом", result="hit")
+_LOOKUP_FALLBACK = metrics.counter("albion_price_lookups_total", result="fallback")
+_LOOKUP_MISS = metrics.counter("albion_price_lookups_total", result="miss")
+
+class ApiError(Exception):
+    """Помилка запиту до Albion Data API"""
+    
+    def __init__(self, message: str, retryable: bool = True, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """
+    Обмежувач частоти запитів (token bucket), спільний для всіх потоків
+    
+    Токени поповнюються зі швидкістю rate на секунду до capacity;
+    кожен запит забирає один токен і чекає, якщо їх немає.
+    """
+    
+    def __init__(self, rate: float = API_RATE_PER_SECOND, capacity: int = API_RATE_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Забирає один токен, за потреби чекаючи на поповнення"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Спільна keep-alive сесія з пулом з'єднань для запитів до API"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=API_MAX_WORKERS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+def _parse_price_rows(data: list) -> Dict:
+    """
+    Перетворює відповідь API (список) у словник {item_id: {city: {prices...}}}
+    
+    Ціни якості 1 записуються під ID предмета, інших якостей - під price_key(item_id, q).
+    API повертає рядок для кожної запитаної якості, тож порожні рядки якостей > 1
+    відкидаються - таблиця росте лише на реально торговані варіанти.
+    """
+    prices_dict = {}
+    for item_data in data:
+        item_id = item_data.get('item_id', '')
+        city = item_data.get('city', '')
+        quality = int(item_data.get('quality') or 1)
+        if quality != 1:
+            if not any(item_data.get(price_type) for price_type in
+                       ('buy_price_max', 'sell_price_min', 'buy_price_min', 'sell_price_max')):
+                continue
+            item_id = price_key(item_id, quality)
+        if item_id and city:
+            # Створюємо структуру: {item_id: {city: {prices...}}}
+            if item_id not in prices_dict:
+                prices_dict[item_id] = {}
+            
+            # Разом з цінами зберігаємо час, коли API бачило кожну з них
+            prices_dict[item_id][city] = {
+                'buy_price_max': item_data.get('buy_price_max', 0),
+                'sell_price_min': item_data.get('sell_price_min', 0),
+                'buy_price_min': item_data.get('buy_price_min', 0),
+                'sell_price_max': item_data.get('sell_price_max', 0),
+                'buy_price_max_date': item_data.get('buy_price_max_date'),
+                'sell_price_min_date': item_data.get('sell_price_min_date'),
+                'buy_price_min_date': item_data.get('buy_price_min_date'),
+                'sell_price_max_date': item_data.get('sell_price_max_date'),
+            }
+    return prices_dict
+
+def _request_batch(item_ids: list, locations: str, quality: str, session: Optional[requests.Session] = None,
+                   api_base: Optional[str] = None, parse_rows: Callable[[list], Dict] = _parse_price_rows,
+                   query: str = "") -> Dict:
+    """
+    Один запит до API для батча предметів
+    
+    Args:
+        api_base: Ендпоінт API (за замовчуванням ALBION_API_BASE - поточні ціни)
+        parse_rows: Перетворення відповіді у словник {item_id: ...}
+        query: Додаткові параметри запиту (наприклад, "&time-scale=24")
+    
+    Raises:
+        ApiError: якщо запит не вдався (retryable - чи варто повторити)
+    """
+    items_param = ",".join(item_ids)
+    url = f"{api_base or ALBION_API_BASE}/{items_param}?locations={locations}&qualities={quality}{query}"
+    
+    started = time.perf_counter()
+    try:
+        response = (session or requests).get(url, timeout=API_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        _API_BATCHES["error"].inc()
+        raise ApiError(f"Помилка при запиті до API: {e}") from e
+    finally:
+        _API_BATCH_SECONDS.observe(time.perf_counter() - started)
+    
+    if response.status_code == 200:
+        try:
+            rows = parse_rows(response.json())
+        except ValueError as e:
+            _API_BATCHES["error"].inc()
+            raise ApiError(f"Некоректна відповідь API: {e}") from e
+        _API_BATCHES["ok"].inc()
+        return rows
+    
+    _API_BATCHES["throttled" if response.status_code == 429 else "error"].inc()
+    retry_after = None
+    if response.status_code == 429:
+        try:
+            retry_after = float(response.headers.get('Retry-After', ''))
+        except ValueError:
+            retry_after = None
+    retryable = response.status_code == 429 or response.status_code >= 500
+    raise ApiError(f"Помилка API: статус код {response.status_code}", retryable, retry_after)
 
 def fetch_prices_for_items(item_ids: list, locations: str = DEFAULT_LOCATIONS, quality: str = DEFAULT_QUALITY) -> Dict:
     """
@@ -25,62 +216,304 @@ def fetch_prices_for_items(item_ids: list, locations: str = DEFAULT_LOCATIONS, q
     if not item_ids:
         return {}
     
-    # Формуємо URL з параметрами
-    items_param = ",".join(item_ids)
-    url = f"{ALBION_API_BASE}/{items_param}?locations={locations}&qualities={quality}"
-    
     try:
-        response = requests.get(url, timeout=30)
-        if response.status_code == 200:
-            data = response.json()
-            # Перетворюємо список у словник для зручності
-            prices_dict = {}
-            for item_data in data:
-                item_id = item_data.get('item_id', '')
-                city = item_data.get('city', '')
-                if item_id and city:
-                    # Створюємо структуру: {item_id: {city: {prices...}}}
-                    if item_id not in prices_dict:
-                        prices_dict[item_id] = {}
-                    
-                    prices_dict[item_id][city] = {
-                        'buy_price_max': item_data.get('buy_price_max', 0),
-                        'sell_price_min': item_data.get('sell_price_min', 0),
-                        'buy_price_min': item_data.get('buy_price_min', 0),
-                        'sell_price_max': item_data.get('sell_price_max', 0),
-                    }
-            return prices_dict
-        else:
-            print(f"Помилка API: статус код {response.status_code}")
-            return {}
-    except requests.exceptions.RequestException as e:
-        print(f"Помилка при запиті до API: {e}")
+        return _request_batch(item_ids, locations, quality, get_session())
+    except ApiError as e:
+        print(e)
         return {}
 
+def _fetch_batch_with_retry(batch: list, locations: str, quality: str, limiter: TokenBucket,
+                            max_retries: int = API_MAX_RETRIES, **request_options) -> Dict:
+    """
+    Завантажує батч з повторними спробами та експоненційним відступом
+    
+    Args:
+        request_options: Ендпоінт і розбір відповіді (див. _request_batch)
+    
+    Raises:
+        ApiError: якщо всі спроби вичерпано
+    """
+    session = get_session()
+    attempt = 0
+    while True:
+        limiter.acquire()
+        try:
+            return _request_batch(batch, locations, quality, session, **request_options)
+        except ApiError as e:
+            if not e.retryable or attempt >= max_retries:
+                raise
+            delay = e.retry_after if e.retry_after is not None else API_BACKOFF_BASE * (2 ** attempt)
+            # Невеликий розкид, щоб потоки не повторювали запити одночасно
+            time.sleep(delay * random.uniform(1.0, 1.25))
+            attempt += 1
+
+def fetch_all_prices(item_ids: list, locations: str = DEFAULT_LOCATIONS, quality: str = DEFAULT_QUALITIES,
+                     previous: Optional[Dict] = None, batch_size: int = API_BATCH_SIZE,
+                     max_workers: int = API_MAX_WORKERS, limiter: Optional[TokenBucket] = None,
+                     **request_options) -> Tuple[Dict, list]:
+    """
+    Паралельно завантажує ціни для всіх предметів батчами
+    
+    Args:
+        item_ids: Список ID предметів
+        locations: Локації для отримання цін
+        quality: Якості предметів через кому
+        previous: Попередні ціни (словник або PriceTable) для предметів з невдалих батчів
+        batch_size: Кількість предметів в одному запиті
+        max_workers: Кількість одночасних запитів
+        limiter: Обмежувач частоти запитів (за замовчуванням новий TokenBucket)
+        request_options: Інший ендпоінт і розбір відповіді (див. _request_batch)
+    
+    Returns:
+        Кортеж (ціни {item_id: {city: {prices...}}}, список ID з невдалих батчів)
+    """
+    batches = [item_ids[i:i + batch_size] for i in range(0, len(item_ids), batch_size)]
+    limiter = limiter or TokenBucket()
+    all_prices = {}
+    failed_items = []
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        futures = {
+            executor.submit(_fetch_batch_with_retry, batch, locations, quality, limiter, **request_options): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                all_prices.update(future.result())
+            except ApiError as e:
+                print(f"Не вдалося завантажити {len(batch)} предметів ({batch[0]}...): {e}")
+                failed_items.extend(batch)
+    
+    # Предмети з невдалих батчів беремо з попереднього знімка, а не викидаємо
+    if failed_items and previous:
+        for item_id in failed_items:
+            if item_id in previous and item_id not in all_prices:
+                all_prices[item_id] = previous[item_id]
+    
+    return all_prices, failed_items
+
 def get_all_items_from_modules() -> list:
     """
     Збирає всі ID предметів з potion.py та materials.py
+    
+    Для зілль додаються зачаровані варіанти @1-@3 (якості завантажуються
+    окремим параметром запиту, див. DEFAULT_QUALITIES).
     """
+    return list(_catalog_items())
+
+@lru_cache(maxsize=None)
+def _catalog_items() -> Tuple[str, ...]:
+    """Каталог предметів процесу (модулі каталогу не змінюються під час роботи)"""
     from potion import POTION_IDS
     from materials import MATERIALS_IDS
     
-    all_items = list(POTION_IDS.keys()) + list(MATERIALS_IDS.keys())
-    return all_items
+    return tuple(with_enchantments(POTION_IDS.keys(), ENCHANTMENTS) + list(MATERIALS_IDS.keys()))
 
-def save_prices_to_cache(prices: Dict, cache_file: str = "prices_cache.json"):
-    """Зберігає ціни в кеш"""
-    cache_data = {
-        'prices': prices,
-        'timestamp': datetime.now().isoformat()
-    }
-    with open(cache_file, "w", encoding='utf-8') as f:
-        json.dump(cache_data, f, ensure_ascii=False, indent=2)
+CACHE_FILE = "prices_cache.bin"           # Бінарний знімок (див. price_store.py)
+LEGACY_CACHE_FILE = "prices_cache.json"   # JSON-кеш старого формату / експорт для налагодження
+LOCK_FILE = "prices_cache.lock"
+CACHE_MAX_AGE_HOURS = 6
+REFRESH_RETRY_SECONDS = 300  # Пауза між спробами фонового оновлення, якщо API недоступне
+
+# TTL окремих предметів для інкрементального оновлення
+ITEM_TTL_HOURS = CACHE_MAX_AGE_HOURS
+VOLATILE_ITEM_TTL_HOURS = 1   # Дорогі зілля T7/T8 - ціни змінюються найшвидше
+VOLATILE_MIN_TIER = 7
+MAX_TTL_BACKOFF = 4           # Якщо API не має нових даних, TTL подвоюється до x4
+
+@lru_cache(maxsize=None)
+def is_volatile_item(item_id: str) -> bool:
+    """Чи потребує предмет частішого оновлення (зілля T7/T8)"""
+    from potion import POTION_IDS
     
-    # Оновлюємо час останнього оновлення
-    with open("last_update.txt", "w") as time_file:
-        time_file.write(datetime.now().isoformat())
+    # Зачаровані варіанти (@1-@3) оновлюються так само, як базове зілля
+    item_id = split_enchantment(item_id)[0]
+    if item_id not in POTION_IDS or len(item_id) < 2 or not item_id[1].isdigit():
+        return False
+    return int(item_id[1]) >= VOLATILE_MIN_TIER
 
-def load_cached_prices(cache_file: str = "prices_cache.json", max_age_hours: int = 6) -> Optional[Dict]:
+def item_refresh_deadlines(table: PriceTable, item_ids: list) -> np.ndarray:
+    """
+    Час (секунди epoch), після якого кожен предмет треба завантажити знову
+    
+    Базовий TTL - ITEM_TTL_HOURS (VOLATILE_ITEM_TTL_HOURS для T7/T8 зілль). Якщо
+    попередні завантаження не принесли новіших за часом API цін, TTL
+    подвоюється (до MAX_TTL_BACKOFF), тож запити до API ростуть з кількістю
+    змін на ринку, а не з розміром каталогу. Предмети, яких немає в таблиці, - 0.
+    """
+    deadlines = np.zeros(len(item_ids))
+    index = table.item_index
+    rows = np.fromiter((index.get(item_id, -1) for item_id in item_ids), dtype=np.intp, count=len(item_ids))
+    ttl_hours = np.fromiter(
+        (VOLATILE_ITEM_TTL_HOURS if is_volatile_item(item_id) else ITEM_TTL_HOURS for item_id in item_ids),
+        dtype=float, count=len(item_ids)
+    )
+    known = rows >= 0
+    rows = rows[known]
+    backoff = np.minimum(2.0 ** np.minimum(table.stale_streak[rows], 16), MAX_TTL_BACKOFF)
+    deadlines[known] = table.fetched_at[rows] + ttl_hours[known] * 3600 * backoff
+    return deadlines
+
+def items_due_for_refresh(table: PriceTable, item_ids: list, now: Optional[float] = None) -> list:
+    """Предмети, TTL яких минув (або яких ще немає в таблиці)"""
+    now = time.time() if now is None else now
+    deadlines = item_refresh_deadlines(table, item_ids)
+    return [item_id for item_id, deadline in zip(item_ids, deadlines) if deadline <= now]
+
+class PriceSnapshot:
+    """
+    Знімок цін, який живе в пам'яті процесу (gunicorn worker)
+    
+    Attributes:
+        prices: Таблиця цін PriceTable (поводиться як словник {item_id: {city: {prices...}}})
+        timestamp: Час оновлення цін з API
+        version: Номер знімка, монотонно зростає в межах процесу
+        signature: (шлях, mtime_ns, size) файлу кешу, з якого завантажено знімок
+        next_refresh_at: Найближчий час (секунди epoch), коли TTL якогось предмета мине
+        quality_report: Звіт про якість даних (data_quality.build_report), рахується при першому зверненні
+    """
+    
+    def __init__(self, prices: PriceTable, timestamp: datetime, version: int, signature: Optional[Tuple] = None):
+        self.prices = prices
+        self.timestamp = timestamp
+        self.version = version
+        self.signature = signature
+        deadlines = item_refresh_deadlines(prices, get_all_items_from_modules())
+        self.next_refresh_at = float(deadlines.min()) if len(deadlines) else 0.0
+        self._quality_report: Optional[Dict] = None
+    
+    @property
+    def quality_report(self) -> Dict:
+        """Пропущені предмети, запасні міста і нульові ціни знімка (один раз на знімок)"""
+        if self._quality_report is None:
+            self._quality_report = data_quality.build_report(self.prices, get_all_items_from_modules())
+        return self._quality_report
+    
+    @property
+    def age(self) -> timedelta:
+        """Вік знімка"""
+        return datetime.now() - self.timestamp
+    
+    def is_expired(self, max_age_hours: float = CACHE_MAX_AGE_HOURS) -> bool:
+        """Чи застарів знімок"""
+        return self.age >= timedelta(hours=max_age_hours)
+    
+    def needs_refresh(self) -> bool:
+        """Чи минув TTL хоча б одного предмета каталогу"""
+        return time.time() >= self.next_refresh_at
+
+_snapshot: Optional[PriceSnapshot] = None
+_snapshot_version = 0
+_snapshot_lock = threading.Lock()
+_refresh_mutex = threading.Lock()
+
+def _cache_signature(cache_file: str) -> Optional[Tuple]:
+    """
+    Повертає (шлях, mtime_ns, size, inode) файлу кешу або None, якщо файлу немає
+    
+    Кожен новий знімок записується новим файлом (os.replace), тож inode змінюється
+    навіть тоді, коли mtime і розмір збіглися.
+    """
+    try:
+        stat = os.stat(cache_file)
+    except OSError:
+        return None
+    return (cache_file, stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+def _locate_cache(cache_file: str) -> Optional[Tuple]:
+    """Сигнатура бінарного кешу, а якщо його ще немає - JSON-кешу старого формату"""
+    signature = _cache_signature(cache_file)
+    if signature is None and cache_file == CACHE_FILE:
+        signature = _cache_signature(LEGACY_CACHE_FILE)
+    return signature
+
+def _install_snapshot(prices: Dict, timestamp: datetime, signature: Optional[Tuple],
+                      item_meta: Optional[Dict] = None) -> PriceSnapshot:
+    """Публікує новий знімок для процесу з наступним номером версії"""
+    global _snapshot, _snapshot_version
+    table = PriceTable.from_prices(prices, item_meta=item_meta)
+    _snapshot_version += 1
+    _snapshot = PriceSnapshot(table, timestamp, _snapshot_version, signature)
+    return _snapshot
+
+def _read_cache_file(cache_file: str) -> Tuple[PriceTable, datetime]:
+    """
+    Читає файл кешу (бінарний знімок або JSON старого формату) і повертає (таблиця, час оновлення)
+    
+    Бінарний знімок відображається у пам'ять (спільні сторінки для всіх воркерів);
+    індекс предметів перевикористовується з поточного знімка, якщо каталог не змінився.
+    """
+    if cache_file.endswith(".json"):
+        prices, timestamp, item_meta = price_store.load_json(cache_file)
+        return PriceTable.from_prices(prices, item_meta=item_meta), timestamp
+    previous = _snapshot.prices if _snapshot is not None else None
+    return price_store.read_snapshot(cache_file, previous=previous)
+
+def get_snapshot(cache_file: str = CACHE_FILE) -> Optional[PriceSnapshot]:
+    """
+    Повертає знімок цін процесу, перечитуючи файл кешу лише коли він змінився
+    
+    На теплому воркері це один os.stat без читання файлу.
+    
+    Args:
+        cache_file: Шлях до файлу кешу
+    
+    Returns:
+        PriceSnapshot або None, якщо кешу немає
+    """
+    signature = _locate_cache(cache_file)
+    snapshot = _snapshot
+    if signature is None:
+        return snapshot
+    if snapshot is not None and snapshot.signature == signature:
+        return snapshot
+    
+    with _snapshot_lock:
+        # Інший потік міг уже перезавантажити знімок
+        if _snapshot is not None and _snapshot.signature == signature:
+            return _snapshot
+        try:
+            table, timestamp = _read_cache_file(signature[0])
+        except (ValueError, KeyError, IOError) as e:
+            print(f"Помилка при завантаженні кешу: {e}")
+            return _snapshot
+        _SNAPSHOT_RELOADS.inc()
+        return _install_snapshot(table, timestamp, signature)
+
+def save_prices_to_cache(prices: Dict, cache_file: str = CACHE_FILE, item_meta: Optional[Dict] = None) -> PriceSnapshot:
+    """
+    Зберігає ціни в кеш і публікує їх як поточний знімок процесу
+    
+    Знімок (разом із часом оновлення) записується одним файлом через
+    тимчасовий файл + os.replace, тож інші воркери бачать або старий,
+    або новий кеш повністю і підхоплюють його за зміною сигнатури файлу.
+    Воркер, який оновив ціни, теж працює з відображеним у пам'ять файлом,
+    а не з власною копією таблиці.
+    """
+    timestamp = datetime.now()
+    if item_meta is None:
+        item_meta = {item_id: {'fetched_at': timestamp.timestamp(), 'stale_streak': 0} for item_id in prices}
+    table = PriceTable.from_prices(prices, item_meta=item_meta)
+    price_store.write_snapshot(cache_file, table, timestamp)
+    
+    with _snapshot_lock:
+        signature = _cache_signature(cache_file)
+        try:
+            table, timestamp = price_store.read_snapshot(cache_file, previous=_snapshot.prices if _snapshot else None)
+        except (ValueError, OSError) as e:
+            print(f"Помилка при відображенні кешу: {e}")
+        return _install_snapshot(table, timestamp, signature)
+
+def export_prices_json(path: str = LEGACY_CACHE_FILE) -> bool:
+    """Експортує поточний знімок у JSON для налагодження"""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return False
+    price_store.export_json(path, snapshot.prices, snapshot.timestamp)
+    return True
+
+def load_cached_prices(cache_file: str = CACHE_FILE, max_age_hours: int = CACHE_MAX_AGE_HOURS) -> Optional[Dict]:
     """
     Завантажує ціни з кешу, якщо вони не застарілі
     
@@ -91,103 +524,333 @@ def load_cached_prices(cache_file: str = "prices_cache.json", max_age_hours: int
     Returns:
         Словник з цінами або None, якщо кеш застарів/не існує
     """
-    if not os.path.exists(cache_file):
+    snapshot = get_snapshot(cache_file)
+    if snapshot is None or snapshot.is_expired(max_age_hours):
         return None
+    return snapshot.prices
+
+@contextmanager
+def _refresh_lock(blocking: bool = True, lock_path: str = LOCK_FILE, mutex: threading.Lock = _refresh_mutex):
+    """
+    Міжпроцесне блокування оновлення цін (single-flight між gunicorn воркерами)
     
-    if not os.path.exists("last_update.txt"):
-        return None
+    Args:
+        blocking: Чекати на блокування (False - одразу повернути False)
+        lock_path: Файл блокування (інше оновлення, напр. обсягів, - свій файл і свій mutex)
+        mutex: Блокування між потоками процесу
     
+    Yields:
+        True, якщо блокування отримано; False, якщо оновлення вже виконує інший процес
+    """
+    with mutex if blocking else _nonblocking(mutex) as acquired:
+        if not acquired:
+            yield False
+            return
+        with open(lock_path, "a") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    yield False
+                    return
+            try:
+                yield True
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+@contextmanager
+def _nonblocking(lock):
+    """Неблокуюча спроба взяти threading.Lock у with-блоці"""
+    acquired = lock.acquire(blocking=False)
     try:
-        with open("last_update.txt", "r") as time_file:
-            last_update_str = time_file.read().strip()
-            last_update_time = datetime.fromisoformat(last_update_str)
+        yield acquired
+    finally:
+        if acquired:
+            lock.release()
+
+def _merge_refreshed_items(previous: Optional[PriceTable], fetched: Dict, refreshed_items: list,
+                           now: float) -> Tuple[Dict, Dict]:
+    """
+    Об'єднує щойно завантажені предмети з попереднім знімком
+    
+    Returns:
+        Кортеж (ціни {item_id: {city: {prices...}}}, метадані предметів)
+    """
+    merged = previous.to_dict() if previous else {}
+    item_meta = previous.item_meta() if previous else {}
+    previous_observed = dict(zip(previous.item_ids, previous.observed_at())) if previous else {}
+    
+    refreshed_table = PriceTable.from_prices({item_id: fetched.get(item_id, {}) for item_id in refreshed_items})
+    refreshed_observed = dict(zip(refreshed_table.item_ids, refreshed_table.observed_at()))
+    
+    # Ціни інших якостей: {item_id: [ключі]} у відповіді і в попередньому знімку
+    fetched_variants: Dict[str, list] = {}
+    for key in fetched:
+        item_id, quality = split_price_key(key)
+        if quality != 1:
+            fetched_variants.setdefault(item_id, []).append(key)
+    previous_variants: Dict[str, list] = {}
+    for key in merged:
+        item_id, quality = split_price_key(key)
+        if quality != 1:
+            previous_variants.setdefault(item_id, []).append(key)
+    
+    for item_id in refreshed_items:
+        # Предмет без рядків у відповіді API теж вважається завантаженим
+        merged[item_id] = fetched.get(item_id, {})
+        old_meta = item_meta.get(item_id, {})
+        has_new_data = refreshed_observed.get(item_id, 0) > previous_observed.get(item_id, 0)
+        item_meta[item_id] = {
+            'fetched_at': now,
+            'stale_streak': 0 if has_new_data else int(old_meta.get('stale_streak', 0)) + 1
+        }
+        # Якості, яких більше немає на ринку, прибираються; TTL - спільний з якістю 1
+        for key in previous_variants.get(item_id, []):
+            merged.pop(key, None)
+            item_meta.pop(key, None)
+        for key in fetched_variants.get(item_id, []):
+            merged[key] = fetched[key]
+            item_meta[key] = {'fetched_at': now, 'stale_streak': 0}
+    return merged, item_meta
+
+def refresh_prices(locations: str = DEFAULT_LOCATIONS, blocking: bool = True,
+                   full: bool = False) -> Optional[PriceTable]:
+    """
+    Завантажує ціни з API і публікує новий знімок (не більше одного оновлення одночасно)
+    
+    За замовчуванням оновлення інкрементальне: завантажуються лише предмети,
+    TTL яких минув (див. item_refresh_deadlines).
+    
+    Args:
+        locations: Локації для отримання цін
+        blocking: Чекати, поки інший процес завершить оновлення (False - одразу вийти)
+        full: Завантажити всі предмети каталогу незалежно від TTL
+    
+    Returns:
+        Таблиця цін або None, якщо оновлення виконує інший процес
+    """
+    with _refresh_lock(blocking) as acquired:
+        if not acquired:
+            _REFRESHES["busy"].inc()
+            return None
         
-        # Перевіряємо, чи не минув час для оновлення кешу
-        if datetime.now() - last_update_time < timedelta(hours=max_age_hours):
-            with open(cache_file, "r", encoding='utf-8') as f:
-                cache_data = json.load(f)
-                return cache_data.get('prices', {})
-    except (ValueError, json.JSONDecodeError, IOError) as e:
-        print(f"Помилка при завантаженні кешу: {e}")
-        return None
+        # Поки чекали блокування, інший воркер міг уже опублікувати нові ціни
+        snapshot = get_snapshot()
+        previous = snapshot.prices if snapshot is not None and snapshot.prices else None
+        all_items = get_all_items_from_modules()
+        due_items = all_items if full or previous is None else items_due_for_refresh(previous, all_items)
+        # Обсяги торгів (свій TTL) завантажуються паралельно з цінами через спільний обмежувач частоти
+        limiter = TokenBucket()
+        volume_thread = _start_volume_refresh(locations, full, limiter)
+        try:
+            if not due_items:
+                _REFRESHES["not_due"].inc()
+                return previous
+            
+            print(f"Оновлюємо ціни з API ({len(due_items)} з {len(all_items)} предметів)...")
+            started = time.monotonic()
+            fetched, failed_items = fetch_all_prices(due_items, locations, limiter=limiter)
+            _REFRESH_SECONDS.observe(time.monotonic() - started)
+        finally:
+            if volume_thread is not None:
+                volume_thread.join()
+        print(f"Завантаження цін зайняло {time.monotonic() - started:.1f} с.")
+        
+        # Якщо жоден батч не вдався, це не оновлення - залишаємо старий знімок з його часом
+        if len(failed_items) < len(due_items):
+            failed = set(failed_items)
+            refreshed_items = [item_id for item_id in due_items if item_id not in failed]
+            merged, item_meta = _merge_refreshed_items(previous, fetched, refreshed_items, time.time())
+            if failed_items:
+                print(f"Попередження: {len(failed_items)} предметів не оновлено, використано попередні ціни.")
+            snapshot = save_prices_to_cache(merged, item_meta=item_meta)
+            _REFRESHES["ok"].inc()
+            print(f"Оновлено ціни для {len(refreshed_items)} предметів.")
+            # Попередження про дані - один раз на знімок, а не на кожен пошук ціни
+            print(data_quality.format_summary(snapshot.quality_report, snapshot.timestamp.isoformat(timespec='seconds')))
+            _append_history(snapshot)
+            return snapshot.prices
+        
+        _REFRESHES["failed"].inc()
+        print("Попередження: не вдалося отримати ціни з API.")
+        # Спробуємо використати старі дані зі знімка
+        if previous is not None:
+            print("Використовуємо застарілі дані з кешу.")
+            return previous
+        return PriceTable.from_prices({})
+
+def _append_history(snapshot: PriceSnapshot):
+    """Дописує новий знімок в історію цін (помилка історії не зриває оновлення)"""
+    try:
+        changed = get_history().append(snapshot.prices, snapshot.timestamp)
+        print(f"Історія цін: записано {changed} змінених цін.")
+    except sqlite3.Error as e:
+        print(f"Помилка запису історії цін: {e}")
+
+_volume_thread: Optional[threading.Thread] = None
+
+def _start_volume_refresh(locations: str, full: bool, limiter: TokenBucket) -> Optional[threading.Thread]:
+    """
+    Запускає потік оновлення обсягів торгів, якщо їх TTL минув і потік ще не виконується
+
+    Returns:
+        Запущений потік або None, якщо оновлювати нічого
+    """
+    global _volume_thread
+    import volumes  # volumes сам імпортує цей модуль
+    with _snapshot_lock:
+        if _volume_thread is not None and _volume_thread.is_alive():
+            return None
+        if not full and not volumes.volumes_due():
+            return None
+        _volume_thread = threading.Thread(target=_refresh_market_volumes, args=(locations, full, limiter),
+                                          name="volume-refresh", daemon=True)
+        _volume_thread.start()
+        return _volume_thread
+
+def _refresh_market_volumes(locations: str, full: bool, limiter: TokenBucket):
+    """Оновлює обсяги торгів, TTL яких минув (помилка обсягів не зриває оновлення цін)"""
+    import volumes
+    try:
+        volumes.refresh_volumes(locations, full=full, limiter=limiter)
+    except Exception as e:
+        # Розбір відповіді чи запис файлу теж можуть впасти - кеш обсягів лишається попереднім
+        volumes.record_refresh_failure()
+        print(f"Помилка оновлення обсягів торгів: {e}")
+
+_refresh_thread: Optional[threading.Thread] = None
+_last_background_attempt = 0.0
+
+def refresh_in_background(locations: str = DEFAULT_LOCATIONS) -> bool:
+    """
+    Запускає фонове оновлення цін, якщо воно ще не виконується в цьому процесі
     
-    return None
+    Returns:
+        True, якщо потік оновлення запущено
+    """
+    global _refresh_thread, _last_background_attempt
+    with _snapshot_lock:
+        if _refresh_thread is not None and _refresh_thread.is_alive():
+            return False
+        # Якщо API недоступне, не пробуємо на кожен запит
+        now = time.monotonic()
+        if _last_background_attempt and now - _last_background_attempt < REFRESH_RETRY_SECONDS:
+            return False
+        _last_background_attempt = now
+        _refresh_thread = threading.Thread(
+            target=_background_refresh, args=(locations,), name="price-refresh", daemon=True
+        )
+        _refresh_thread.start()
+    return True
 
-def get_prices(force_refresh: bool = False, locations: str = DEFAULT_LOCATIONS, auto_refresh: bool = True) -> Dict:
+def _background_refresh(locations: str):
+    """Тіло фонового потоку оновлення"""
+    try:
+        refresh_prices(locations, blocking=False)
+    except Exception as e:
+        print(f"Помилка фонового оновлення цін: {e}")
+
+def get_prices(force_refresh: bool = False, locations: str = DEFAULT_LOCATIONS, auto_refresh: bool = True,
+               background: bool = True) -> PriceTable:
     """
-    Отримує ціни - спочатку з кешу, якщо він актуальний, інакше з API
+    Отримує ціни - спочатку зі знімка в пам'яті, якщо він актуальний, інакше з API
     
     Args:
         force_refresh: Якщо True, примусово оновлює ціни з API
         locations: Локації для отримання цін
-        auto_refresh: Якщо True, автоматично оновлює ціни, якщо вони застарілі (старші 6 годин)
+        auto_refresh: Якщо True, автоматично оновлює предмети, TTL яких минув
+        background: Якщо True, застарілі ціни повертаються одразу, а оновлення йде у фоні
+            (запити не чекають на мережу); False - оновити і дочекатися (для CLI)
     
     Returns:
-        Словник з цінами
-    """
-    # Перевіряємо актуальність кешу
-    if not force_refresh and auto_refresh:
-        cached_prices = load_cached_prices(max_age_hours=6)
-        if cached_prices:
-            # Перевіряємо, чи потрібно оновлення
-            if os.path.exists("last_update.txt"):
-                try:
-                    with open("last_update.txt", "r") as time_file:
-                        last_update_str = time_file.read().strip()
-                        last_update_time = datetime.fromisoformat(last_update_str)
-                        time_since_update = datetime.now() - last_update_time
-                        
-                        if time_since_update >= timedelta(hours=6):
-                            print(f"Кеш застарів ({time_since_update.seconds // 3600} годин тому). Оновлюємо...")
-                            force_refresh = True  # Автоматично оновлюємо
-                        else:
-                            hours_left = 6 - (time_since_update.seconds // 3600)
-                            print(f"Використовуємо кешовані дані (оновлено {time_since_update.seconds // 3600} год тому, залишилось ~{hours_left} год до оновлення).")
-                            return cached_prices
-                except (ValueError, IOError):
-                    pass
-    
+        Таблиця цін PriceTable (порожня, якщо цін немає)
+    """
     if not force_refresh:
-        cached_prices = load_cached_prices()
-        if cached_prices:
-            print("Використовуємо кешовані дані.")
-            return cached_prices
+        snapshot = get_snapshot()
+        if snapshot is not None and snapshot.prices:
+            if not auto_refresh or not snapshot.needs_refresh():
+                _CACHE_REQUESTS["hit"].inc()
+                return snapshot.prices
+            if background:
+                _CACHE_REQUESTS["stale"].inc()
+                refresh_in_background(locations)
+                return snapshot.prices
+            _CACHE_REQUESTS["miss"].inc()
+            return refresh_prices(locations, blocking=True)
     
-    print("Оновлюємо ціни з API...")
-    all_items = get_all_items_from_modules()
+    _CACHE_REQUESTS["miss"].inc()
+    return refresh_prices(locations, blocking=True, full=True)
+
+def find_item_price(item_id: str, prices: Dict, city: str = "Caerleon", price_type: str = "sell_price_min",
+                    quality: int = 1) -> Tuple[float, Optional[str]]:
+    """
+    Шукає ціну предмета без виведення попереджень
     
-    # API має обмеження на кількість предметів в одному запиті (зазвичай ~100)
-    # Розбиваємо на батчі
-    batch_size = 50
-    all_prices = {}
+    Args:
+        item_id: ID предмета (зачаровані - з суфіксом @n)
+        prices: Словник з усіма цінами
+        city: Місто для отримання ціни
+        price_type: Тип ціни ('sell_price_min', 'buy_price_max', тощо)
+        quality: Якість предмета (1-5)
     
-    for i in range(0, len(all_items), batch_size):
-        batch = all_items[i:i + batch_size]
-        print(f"Завантаження цін для предметів {i+1}-{min(i+batch_size, len(all_items))} з {len(all_items)}...")
-        batch_prices = fetch_prices_for_items(batch, locations)
-        all_prices.update(batch_prices)
-        # Невелика затримка між запитами, щоб не перевантажити API
-        import time
-        if i + batch_size < len(all_items):
-            time.sleep(0.5)
-    
-    if all_prices:
-        save_prices_to_cache(all_prices)
-        print(f"Оновлено ціни для {len(all_prices)} предметів.")
+    Returns:
+        Кортеж (ціна, місто, з якого взято ціну) або (0.0, None), якщо не знайдено
+    """
+    item_id = price_key(item_id, quality)
+    if isinstance(prices, PriceTable):
+        price, source_city = prices.lookup(item_id, city, price_type)
     else:
-        print("Попередження: не вдалося отримати ціни з API.")
-        # Спробуємо завантажити старі дані з кешу
-        cached_prices = load_cached_prices(max_age_hours=999999)  # Беремо навіть старі дані
-        if cached_prices:
-            print("Використовуємо застарілі дані з кешу.")
-            return cached_prices
+        price, source_city = _find_in_dict(item_id, prices, city, price_type)
     
-    return all_prices
+    if source_city is None:
+        _LOOKUP_MISS.inc()
+    elif source_city == city or source_city == normalize_city(city):
+        _LOOKUP_HIT.inc()
+    else:
+        _LOOKUP_FALLBACK.inc()
+    return price, source_city
+
+def _find_in_dict(item_id: str, prices: Dict, city: str, price_type: str) -> Tuple[float, Optional[str]]:
+    """find_item_price для звичайного словника цін (ті самі правила запасних міст, що й у PriceTable)"""
+    city = normalize_city(city)
+    item_data = prices.get(item_id)
+    if not isinstance(item_data, dict):
+        return 0.0, None
+    
+    # Спочатку шукаємо в обраному місті
+    city_data = item_data.get(city)
+    if isinstance(city_data, dict):
+        price = city_data.get(price_type, 0)
+        if price > 0:
+            return float(price), city
+    
+    # Якщо в обраному місті немає ціни або вона 0, шукаємо в інших містах
+    # Пріоритет: Caerleon > Thetford > інші
+    for priority_city in PRIORITY_CITIES:
+        if priority_city != city:
+            city_data = item_data.get(priority_city)
+            if isinstance(city_data, dict):
+                price = city_data.get(price_type, 0)
+                if price > 0:
+                    return float(price), priority_city
+    
+    # Якщо не знайшли в пріоритетних, шукаємо в будь-якому місті
+    for other_city, city_data in item_data.items():
+        if isinstance(city_data, dict) and other_city != city:
+            price = city_data.get(price_type, 0)
+            if price > 0:
+                return float(price), other_city
+    
+    return 0.0, None
 
 def get_item_price(item_id: str, prices: Dict, city: str = "Caerleon", price_type: str = "sell_price_min") -> float:
     """
     Отримує ціну конкретного предмета
     
+    Попередження не виводяться: пропущені предмети і запасні міста знімка
+    зібрані в PriceSnapshot.quality_report (див. data_quality.py).
+    
     Args:
         item_id: ID предмета
         prices: Словник з усіма цінами
@@ -197,50 +860,24 @@ def get_item_price(item_id: str, prices: Dict, city: str = "Caerleon", price_typ
     Returns:
         Ціна предмета або 0, якщо не знайдено
     """
-    if item_id not in prices:
-        print(f"Попередження: предмет {item_id} не знайдено в цінах")
-        return 0.0
-    
-    item_data = prices[item_id]
-    
-    # Якщо дані зберігаються по містах
-    if isinstance(item_data, dict):
-        # Спочатку шукаємо в обраному місті
-        if city in item_data:
-            city_data = item_data[city]
-            if isinstance(city_data, dict):
-                price = city_data.get(price_type, 0)
-                if price > 0:
-                    return float(price)
-        
-        # Якщо в обраному місті немає ціни або вона 0, шукаємо в інших містах
-        # Пріоритет: Caerleon > Thetford > інші
-        priority_cities = ["Caerleon", "Thetford", "Bridgewatch", "Lymhurst", "Martlock", "FortSterling", "Brecilien"]
-        
-        for priority_city in priority_cities:
-            if priority_city in item_data and priority_city != city:
-                city_data = item_data[priority_city]
-                if isinstance(city_data, dict):
-                    price = city_data.get(price_type, 0)
-                    if price > 0:
-                        print(f"Попередження: для {item_id} в {city} немає ціни (або 0), використовуємо {priority_city}: {price}")
-                        return float(price)
-        
-        # Якщо не знайшли в пріоритетних, шукаємо в будь-якому місті
-        for other_city, city_data in item_data.items():
-            if isinstance(city_data, dict) and other_city != city:
-                price = city_data.get(price_type, 0)
-                if price > 0:
-                    print(f"Попередження: для {item_id} в {city} немає даних, використовуємо {other_city}: {price}")
-                    return float(price)
-    
-    return 0.0
+    return find_item_price(item_id, prices, city, price_type)[0]
 
 # Приклад використання
 if __name__ == "__main__":
-    prices = get_prices()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Ціни Albion Online")
+    parser.add_argument("--refresh", action="store_true", help="Примусово оновити всі ціни з API")
+    parser.add_argument("--export-json", metavar="PATH", nargs="?", const=LEGACY_CACHE_FILE,
+                        help=f"Експортувати знімок у JSON (за замовчуванням {LEGACY_CACHE_FILE})")
+    args = parser.parse_args()
+    
+    prices = get_prices(force_refresh=args.refresh, background=False)
     print(f"Завантажено цін: {len(prices)}")
+    if args.export_json:
+        export_prices_json(args.export_json)
+        print(f"Знімок експортовано в {args.export_json}")
     # Приклад отримання ціни
-    if prices:
+    elif prices:
         first_item = list(prices.keys())[0]
-        print(f"Приклад: {first_item} = {prices[first_item]}")
\ No newline at end of file
+        print(f"Приклад: {first_item} = {prices[first_item]}")
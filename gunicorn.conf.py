@@ -0,0 +1,11 @@
+import os
+
+# gunicorn читає цей файл автоматично (Procfile: gunicorn app:app).
+# Метрики воркерів підсумовуються через файли - лише під gunicorn, до імпорту metrics
+os.environ.setdefault("METRICS_DIR", "metrics")
+
+import metrics
+
+def child_exit(server, worker):
+    """Файл метрик завершеного воркера більше не підсумовується в /metrics"""
+    metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,253 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from price_table import PriceTable
+from cities import normalize_city
+
+HISTORY_DB = "prices_history.sqlite3"
+# Скільки читання чекає на блокування бази, перш ніж здатися (секунди)
+HISTORY_READ_TIMEOUT_SECONDS = 5
+
+# Ціни зберігаються тільки коли змінюються: рядок у prices - це точка зміни
+# для (предмет, місто), і він діє до наступного рядка. Таблиця latest тримає
+# останній стан кожної пари, що є в поточному знімку, щоб не шукати його при
+# кожному дописуванні. Пара, якої більше немає у знімку (напр. зачарований
+# варіант зник з ринку), отримує в prices нульовий рядок і видаляється з latest,
+# тож latest не росте без меж.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    item_id TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS cities (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    ts INTEGER PRIMARY KEY,
+    changed_rows INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS prices (
+    item INTEGER NOT NULL,
+    city INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    sell_price_min INTEGER NOT NULL,
+    buy_price_max INTEGER NOT NULL,
+    buy_price_min INTEGER NOT NULL,
+    sell_price_max INTEGER NOT NULL,
+    PRIMARY KEY (item, city, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS latest (
+    item INTEGER NOT NULL,
+    city INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    sell_price_min INTEGER NOT NULL,
+    buy_price_max INTEGER NOT NULL,
+    buy_price_min INTEGER NOT NULL,
+    sell_price_max INTEGER NOT NULL,
+    PRIMARY KEY (item, city)
+) WITHOUT ROWID;
+"""
+
+PRICE_COLUMNS = ("sell_price_min", "buy_price_max", "buy_price_min", "sell_price_max")
+
+class PriceHistory:
+    """
+    Локальне сховище історії цін у SQLite
+
+    Запис іде через одне з'єднання під блокуванням, а читання (/history) -
+    через власне з'єднання кожного потоку: у режимі WAL читачі не чекають
+    ні на запис, ні один на одного.
+    """
+
+    def __init__(self, db_path: str = HISTORY_DB):
+        """
+        Args:
+            db_path: Шлях до файлу бази даних
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # З'єднання читання закривається разом з потоком, якому належить
+        self._local = threading.local()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._item_ids: Dict[str, int] = {}
+        self._city_ids: Dict[str, int] = {}
+
+    def close(self):
+        reader = getattr(self._local, "conn", None)
+        if reader is not None:
+            reader.close()
+            self._local.conn = None
+        self._conn.close()
+
+    def _reader(self) -> sqlite3.Connection:
+        """З'єднання потоку для читання (створюється при першому зверненні потоку)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            uri = f"file:{os.path.abspath(self.db_path)}?mode=ro"
+            conn = self._local.conn = sqlite3.connect(uri, uri=True, timeout=HISTORY_READ_TIMEOUT_SECONDS)
+        return conn
+
+    def _intern(self, table: str, column: str, cache: Dict[str, int], name: str) -> int:
+        """Повертає id рядка довідника (items/cities), додаючи його за потреби"""
+        row_id = cache.get(name)
+        if row_id is None:
+            self._conn.execute(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)", (name,))
+            row_id = self._conn.execute(f"SELECT id FROM {table} WHERE {column} = ?", (name,)).fetchone()[0]
+            cache[name] = row_id
+        return row_id
+
+    def _lookup(self, conn: sqlite3.Connection, table: str, column: str, cache: Dict[str, int],
+                name: str) -> Optional[int]:
+        """id рядка довідника без додавання (None - невідомий)"""
+        row_id = cache.get(name)
+        if row_id is None:
+            row = conn.execute(f"SELECT id FROM {table} WHERE {column} = ?", (name,)).fetchone()
+            if row is None:
+                return None
+            row_id = cache[name] = row[0]
+        return row_id
+
+    def append(self, table: PriceTable, timestamp: Optional[datetime] = None, complete: bool = True) -> int:
+        """
+        Дописує знімок цін в історію
+
+        Зберігаються лише клітинки, ціни в яких змінилися з попереднього знімка.
+        Пари (предмет, місто), яких немає в повному знімку, закриваються нульовим
+        рядком у prices і видаляються з latest.
+
+        Args:
+            table: Таблиця цін
+            timestamp: Час знімка (за замовчуванням зараз)
+            complete: Таблиця - весь знімок (False - лише частина предметів, нічого не видаляється)
+
+        Returns:
+            Кількість записаних (змінених) рядків
+        """
+        ts = int((timestamp or datetime.now()).timestamp())
+        price_columns = [table.price_type_index[c] for c in PRICE_COLUMNS]
+        values = table.values[:, :, price_columns].astype('int64')
+
+        with self._lock, self._conn:
+            item_rows = [self._intern("items", "item_id", self._item_ids, item_id) for item_id in table.item_ids]
+            city_rows = [self._intern("cities", "name", self._city_ids, city) for city in table.cities]
+            latest = {
+                (item, city): prices
+                for item, city, *prices in self._conn.execute(
+                    f"SELECT item, city, {', '.join(PRICE_COLUMNS)} FROM latest"
+                )
+            }
+
+            changed = []
+            for i, item in enumerate(item_rows):
+                for j, city in enumerate(city_rows):
+                    prices = values[i, j].tolist()
+                    previous = latest.get((item, city))
+                    # Клітинки, яких ніколи не було в історії і які порожні, не зберігаємо
+                    if previous == prices or (previous is None and not any(prices)):
+                        continue
+                    changed.append((item, city, ts, *prices))
+
+            # Пари, що зникли зі знімка: нульовий рядок закриває їх в історії
+            removed = []
+            if complete:
+                present = {(item, city) for item in item_rows for city in city_rows}
+                removed = [key for key in latest if key not in present]
+            closed = [(item, city, ts, *[0] * len(PRICE_COLUMNS)) for item, city in removed if any(latest[item, city])]
+
+            placeholders = ", ".join("?" * (3 + len(PRICE_COLUMNS)))
+            columns = f"item, city, ts, {', '.join(PRICE_COLUMNS)}"
+            self._conn.executemany(f"INSERT OR REPLACE INTO prices ({columns}) VALUES ({placeholders})", changed + closed)
+            self._conn.executemany(f"INSERT OR REPLACE INTO latest ({columns}) VALUES ({placeholders})", changed)
+            self._conn.executemany("DELETE FROM latest WHERE item = ? AND city = ?", removed)
+            self._conn.execute("INSERT OR REPLACE INTO snapshots (ts, changed_rows) VALUES (?, ?)",
+                               (ts, len(changed) + len(closed)))
+        return len(changed) + len(closed)
+
+    def query(self, item_id: str, city: str, since: Optional[datetime] = None,
+              until: Optional[datetime] = None) -> List[Dict]:
+        """
+        Історія цін предмета в місті за проміжок часу
+
+        Першим іде стан на початок проміжку (остання зміна до since), далі всі зміни.
+
+        Args:
+            item_id: ID предмета
+            city: Місто
+            since: Початок проміжку (за замовчуванням - уся історія)
+            until: Кінець проміжку (за замовчуванням - зараз)
+
+        Returns:
+            Список {'timestamp': datetime, 'sell_price_min': ..., ...}
+        """
+        conn = self._reader()
+        item = self._lookup(conn, "items", "item_id", self._item_ids, item_id)
+        city_row = self._lookup(conn, "cities", "name", self._city_ids, normalize_city(city))
+        if item is None or city_row is None:
+            return []
+
+        start = int(since.timestamp()) if since else 0
+        end = int(until.timestamp()) if until else int(time.time())
+        columns = f"ts, {', '.join(PRICE_COLUMNS)}"
+        rows = []
+        if since is not None:
+            rows += conn.execute(
+                f"SELECT {columns} FROM prices WHERE item = ? AND city = ? AND ts < ? ORDER BY ts DESC LIMIT 1",
+                (item, city_row, start)
+            ).fetchall()
+        rows += conn.execute(
+            f"SELECT {columns} FROM prices WHERE item = ? AND city = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+            (item, city_row, start, end)
+        ).fetchall()
+
+        return [
+            {'timestamp': datetime.fromtimestamp(ts), **dict(zip(PRICE_COLUMNS, prices))}
+            for ts, *prices in rows
+        ]
+
+    def query_days(self, item_id: str, city: str, days: float = 30) -> List[Dict]:
+        """Історія цін за останні days днів"""
+        return self.query(item_id, city, since=datetime.now() - timedelta(days=days))
+
+    def prices_at(self, when: datetime) -> Dict:
+        """
+        Відновлює ціни на момент часу when
+
+        Returns:
+            Словник {item_id: {city: {prices...}}}, придатний для PriceTable.from_prices
+        """
+        ts = int(when.timestamp())
+        columns = ", ".join(f"p.{column}" for column in PRICE_COLUMNS)
+        # Останній рядок кожної пари до when (SQLite бере решту стовпців з рядка з MAX);
+        # пари зі збереженими раніше цінами, яких уже немає в latest, теж враховуються
+        rows = self._reader().execute(
+            f"SELECT i.item_id, c.name, MAX(p.ts), {columns} FROM prices p "
+            "JOIN items i ON i.id = p.item JOIN cities c ON c.id = p.city "
+            "WHERE p.ts <= ? GROUP BY p.item, p.city",
+            (ts,)
+        ).fetchall()
+
+        prices: Dict = {}
+        for item_id, city, _, *values in rows:
+            # Нульовий рядок - пара на той момент зникла зі знімка
+            if any(values):
+                prices.setdefault(item_id, {})[city] = dict(zip(PRICE_COLUMNS, values))
+        return prices
+
+_history: Optional[PriceHistory] = None
+_history_lock = threading.Lock()
+
+def get_history(db_path: str = HISTORY_DB) -> PriceHistory:
+    """Спільне для процесу сховище історії"""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = PriceHistory(db_path)
+    return _history
@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Можливі формати файлів (у порядку пріоритету)
+IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.webp']
+
+# Папки для пошуку (підтримуємо різні варіанти назв папок), у порядку пріоритету
+IMAGE_DIRS = {
+    'potion': [
+        'static/images/potions',      # potions/ (множина)
+        'static/images/potion',       # potion/ (однина)
+        'static/images',              # Без підпапки
+        'albion_icons',               # Стара папка
+    ],
+    'ingredient': [
+        'static/images/materials',    # materials/
+        'static/images/ingredients',  # ingredients/ (альтернатива)
+        'static/images/ingredient',   # ingredient/ (однина)
+        'static/images',              # Без підпапки
+        'albion_icons',               # Стара папка
+    ],
+}
+
+# Як часто (секунди) перевіряти mtime папок - щоб пошук лишався O(1)
+MANIFEST_CHECK_INTERVAL = 2.0
+
+class ImageManifest:
+    """
+    Маніфест зображень предметів: item_id -> шлях для url_for('static', ...)
+
+    Папки скануються один раз; маніфест перебудовується, коли змінюється
+    mtime будь-якої з папок (перевірка не частіше MANIFEST_CHECK_INTERVAL).
+    """
+
+    def __init__(self, base_dir: str = BASE_DIR, check_interval: float = MANIFEST_CHECK_INTERVAL):
+        """
+        Args:
+            base_dir: Корінь проєкту, відносно якого задано IMAGE_DIRS
+            check_interval: Мінімальний інтервал між перевірками mtime папок
+        """
+        self.base_dir = base_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._images: Dict[str, Dict[str, str]] = {}
+        self._mtimes: Dict[str, Optional[int]] = {}
+        self._checked_at = 0.0
+        # Зростає при кожній перебудові - для інвалідації кешів, що залежать від зображень
+        self.version = 0
+        self.rebuild()
+
+    def _dir_mtimes(self) -> Dict[str, Optional[int]]:
+        """mtime кожної папки пошуку (None - папки немає)"""
+        mtimes = {}
+        for directories in IMAGE_DIRS.values():
+            for directory in directories:
+                if directory in mtimes:
+                    continue
+                try:
+                    mtimes[directory] = os.stat(os.path.join(self.base_dir, directory)).st_mtime_ns
+                except OSError:
+                    mtimes[directory] = None
+        return mtimes
+
+    def rebuild(self):
+        """Сканує папки із зображеннями і будує маніфест"""
+        mtimes = self._dir_mtimes()
+        # Файли кожної папки: stem -> ім'я файлу з найпріоритетнішим розширенням
+        listings: Dict[str, Dict[str, str]] = {}
+        for directory, mtime in mtimes.items():
+            files = {}
+            if mtime is not None:
+                for entry in os.scandir(os.path.join(self.base_dir, directory)):
+                    stem, ext = os.path.splitext(entry.name)
+                    if ext not in IMAGE_EXTENSIONS or not entry.is_file():
+                        continue
+                    current = files.get(stem)
+                    if current is None or IMAGE_EXTENSIONS.index(ext) < IMAGE_EXTENSIONS.index(os.path.splitext(current)[1]):
+                        files[stem] = entry.name
+            listings[directory] = files
+
+        images = {}
+        for image_type, directories in IMAGE_DIRS.items():
+            mapping = {}
+            # Папки з нижчим пріоритетом записуються першими і перезаписуються вищими
+            for directory in reversed(directories):
+                for stem, filename in listings[directory].items():
+                    path = f'{directory}/{filename}'
+                    # Повертаємо шлях без 'static/' для url_for
+                    mapping[stem] = path[len('static/'):] if path.startswith('static/') else path
+            images[image_type] = mapping
+
+        with self._lock:
+            self._images = images
+            self._mtimes = mtimes
+            self._checked_at = time.monotonic()
+            self.version += 1
+
+    def _refresh_if_changed(self):
+        """Перебудовує маніфест, якщо змінився вміст папок"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        if self._dir_mtimes() != self._mtimes:
+            self.rebuild()
+
+    def current_version(self) -> int:
+        """Версія маніфесту з урахуванням змін у папках"""
+        self._refresh_if_changed()
+        return self.version
+
+    def get(self, item_id: str, image_type: str = 'potion') -> Optional[str]:
+        """
+        Шлях до зображення предмета або None
+
+        Args:
+            item_id: ID предмета
+            image_type: 'potion' або будь-що інше для інгредієнтів
+        """
+        self._refresh_if_changed()
+        kind = 'potion' if image_type == 'potion' else 'ingredient'
+        return self._images[kind].get(item_id)
+
+    def missing(self, item_ids, image_type: str = 'potion') -> List[str]:
+        """Предмети зі списку, для яких немає зображення"""
+        return [item_id for item_id in item_ids if self.get(item_id, image_type) is None]
+
+_manifest: Optional[ImageManifest] = None
+
+def get_manifest() -> ImageManifest:
+    """Спільний для процесу маніфест зображень"""
+    global _manifest
+    if _manifest is None:
+        _manifest = ImageManifest()
+    return _manifest
+
+def catalog_ingredients() -> List[str]:
+    """Усі інгредієнти: з materials.py і з рецептів"""
+    from materials import MATERIALS_IDS
+    from recipes import RECIPES
+
+    ingredients = list(MATERIALS_IDS.keys())
+    for recipe in RECIPES.values():
+        for ingredient_id in recipe['ingredients']:
+            if ingredient_id not in ingredients:
+                ingredients.append(ingredient_id)
+    return ingredients
+
+if __name__ == '__main__':
+    import argparse
+    from potion import POTION_IDS
+
+    parser = argparse.ArgumentParser(description="Звіт про предмети без зображень")
+    parser.add_argument("--strict", action="store_true", help="Код виходу 1, якщо є предмети без зображень")
+    args = parser.parse_args()
+
+    manifest = get_manifest()
+    missing_potions = manifest.missing(POTION_IDS.keys(), 'potion')
+    missing_ingredients = manifest.missing(catalog_ingredients(), 'ingredient')
+
+    print(f"Зілля без зображення: {len(missing_potions)}")
+    for item_id in missing_potions:
+        print(f"  ✗ {item_id}")
+    print(f"Інгредієнти без зображення: {len(missing_ingredients)}")
+    for item_id in missing_ingredients:
+        print(f"  ✗ {item_id}")
+
+    if args.strict and (missing_potions or missing_ingredients):
+        raise SystemExit(1)
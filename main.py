@@ -1,17 +1,20 @@
-from calculator import PotionCalculator
+import argparse
+import collections
+import contextlib
+import itertools
+import json
+import sys
+from calculator import PotionCalculator, default_return_rate
 from potion import POTION_IDS
+from recipes import RECIPES
 from get_prices import get_prices
-
-# Список доступних міст
-CITIES = [
-    "Caerleon",
-    "Bridgewatch",
-    "Lymhurst",
-    "Martlock",
-    "FortSterling",
-    "Thetford",
-    "Brecilien"  # ДОДАНО: Бресіліон
-]
+from cities import CITIES, normalize_city
+from sweep import sweep_parameters, sweep_to_json, grid_axis, bool_options
+from planner import ProductionPlanner
+from opportunities import OpportunityMatrix
+from export import settings_grid, iter_export_rows, EXPORT_FORMATS
+from batch import (load_scenarios, grid_scenarios, grid_size, run_batch, sort_results, stream_results,
+                   SORT_KEYS, MAX_GRID_SCENARIOS)
 
 def select_city(prompt: str) -> str:
     """Вибір міста зі списку"""
@@ -54,7 +57,7 @@ def get_user_settings():
     
     craft_city = select_city("Місто для крафту:")
     sell_city = select_city("Місто для продажу:")
-    default_return_rate = 24.8 if craft_city == "Brecilien" else 15.2
+    station_return_rate = default_return_rate(craft_city) * 100
     
     while True:
         try:
@@ -94,8 +97,8 @@ def get_user_settings():
     
     while True:
         try:
-            prompt = f"Фінальний відсоток повернення ресурсів (як на станку, 0-100) [{default_return_rate}]: "
-            return_rate_in = input(prompt).strip() or str(default_return_rate)
+            prompt = f"Фінальний відсоток повернення ресурсів (як на станку, 0-100) [{station_return_rate:.1f}]: "
+            return_rate_in = input(prompt).strip() or str(station_return_rate)
             return_rate = float(return_rate_in) / 100.0
             if 0 <= return_rate <= 1:
                 break
@@ -123,7 +126,7 @@ def main():
     
     # Завантажуємо ціни
     print("\nЗавантаження цін...")
-    prices = get_prices()
+    prices = get_prices(background=False)
     
     if not prices:
         print("Помилка: не вдалося завантажити ціни. Перевірте підключення до інтернету.")
@@ -176,5 +179,337 @@ def main():
         else:
             print("Введіть 'так' або 'ні'.")
 
+def print_sweep_report(result):
+    """Виводить найкращі налаштування і межі беззбитковості для кожного варіанта фокусу/преміуму"""
+    axes = result['axes']
+    print("\n" + "="*60)
+    print(f"Сітка параметрів для: {result['potion_name']} ({result['craft_city']} → {result['sell_city']})")
+    print("="*60)
+    print(f"Ціна продажу: {result['sell_price']:.2f} срібла")
+    print(f"Точок сітки: {result['profit_per_potion'].size}")
+    
+    extra_index = 0
+    for f, focus in enumerate(axes['focus_bonus']):
+        for p, premium in enumerate(axes['premium']):
+            print(f"\n--- Фокус: {'Так' if focus else 'Ні'}, преміум: {'Так' if premium else 'Ні'}, "
+                  f"додатковий бонус: {axes['extra_bonus_pct'][extra_index]:.1f}% ---")
+            profit = result['profit_per_potion'][f, p, :, extra_index, :]
+            r, m = divmod(int(profit.argmax()), profit.shape[1])
+            print(f"Найкраще: повернення {axes['return_rate'][r]*100:.1f}%, станок {axes['machine_cost'][m]:.0f} "
+                  f"→ {profit[r, m]:.2f} срібла з зілля")
+            
+            # Декілька точок меж беззбитковості
+            for m in sorted({0, len(axes['machine_cost']) // 2, len(axes['machine_cost']) - 1}):
+                rate = result['break_even_return_rate'][f, p, extra_index, m]
+                rate_text = "недосяжно" if rate != rate else f"{rate*100:.1f}%"
+                print(f"  Станок {axes['machine_cost'][m]:.0f}: беззбитково від повернення {rate_text}")
+            for r in sorted({0, len(axes['return_rate']) // 2, len(axes['return_rate']) - 1}):
+                cost = result['break_even_machine_cost'][f, p, r, extra_index]
+                cost_text = "збиток за будь-якої ціни" if cost != cost else f"до {cost:.0f} за 100 їжі"
+                print(f"  Повернення {axes['return_rate'][r]*100:.1f}%: станок {cost_text}")
+    print("="*60 + "\n")
+
+def run_sweep(args):
+    """Підкоманда sweep: сітка налаштувань станку для одного зілля"""
+    prices = get_prices(background=False)
+    if not prices:
+        print("Помилка: не вдалося завантажити ціни. Перевірте підключення до інтернету.")
+        return 1
+    
+    craft_city = normalize_city(args.craft_city)
+    calculator = PotionCalculator(prices=prices, craft_city=craft_city,
+                                  sell_city=normalize_city(args.sell_city or craft_city))
+    try:
+        result = sweep_parameters(
+            calculator,
+            args.potion_id,
+            return_rates=grid_axis(*args.return_rate) / 100.0,
+            machine_costs=grid_axis(*args.machine_cost),
+            extra_bonus_pcts=grid_axis(*args.extra_bonus),
+            focus_options=bool_options(args.focus),
+            premium_options=bool_options(args.premium),
+            use_buy_price=args.use_buy_price,
+            craft_intermediates=args.craft_intermediates
+        )
+    except ValueError as e:
+        print(f"Помилка: {e}")
+        return 1
+    if result is None:
+        print(f"Помилка: зілля з ID {args.potion_id} не знайдено!")
+        return 1
+    
+    if args.json:
+        print(json.dumps(sweep_to_json(result), ensure_ascii=False))
+    else:
+        print_sweep_report(result)
+    return 0
+
+def parse_caps(pairs):
+    """Ліміти у форматі ID=число"""
+    caps = {}
+    for pair in pairs or []:
+        item_id, _, value = pair.partition('=')
+        caps[item_id.strip()] = float(value)
+    return caps
+
+def print_plan_report(result):
+    """Виводить план виробництва і список покупок"""
+    totals = result['totals']
+    print("\n" + "="*60)
+    print("План виробництва (жадібний розв'язок, не обов'язково оптимальний)")
+    print("="*60)
+    for row in result['plan']:
+        focus = ", фокус" if row['focus_bonus'] else ""
+        print(f"{row['potion_name']}: {row['crafts']} крафтів ({row['potions']:.0f} зілля), "
+              f"{row['craft_city']} → {row['sell_city']}{focus}")
+        print(f"  Закупівля: {row['silver_cost']:.0f} срібла (після повернення {row['net_cost']:.0f}), "
+              f"прибуток: {row['profit']:.0f} срібла")
+    
+    print(f"\n--- Список покупок ---")
+    for city, materials in result['shopping_list'].items():
+        print(f"{city}:")
+        for material in materials:
+            print(f"  {material['name']}: {material['quantity']}")
+    
+    print(f"\n--- Разом ---")
+    print(f"Крафтів: {totals['crafts']}")
+    print(f"Витрачено срібла: {totals['silver_used']:.0f} (залишок {totals['silver_left']:.0f})")
+    if totals['focus_used'] or totals['focus_left']:
+        print(f"Витрачено фокусу: {totals['focus_used']:.0f} (залишок {totals['focus_left']:.0f})")
+    print(f"Очікуваний прибуток: {totals['profit']:.0f} срібла")
+    print("="*60 + "\n")
+
+def run_plan(args):
+    """Підкоманда plan: жадібний (не обов'язково оптимальний) набір зілль під бюджет, фокус і ринок"""
+    prices = get_prices(background=False)
+    if not prices:
+        print("Помилка: не вдалося завантажити ціни. Перевірте підключення до інтернету.")
+        return 1
+    
+    try:
+        result = ProductionPlanner().plan(
+            prices,
+            budget=args.budget,
+            focus_points=args.focus,
+            market_caps=parse_caps(args.market_caps),
+            default_market_cap=args.market_cap,
+            ingredient_caps=parse_caps(args.ingredient_caps),
+            machine_cost_per_100=args.machine_cost,
+            extra_bonus_pct=args.extra_bonus,
+            return_rate=args.return_rate / 100.0 if args.return_rate is not None else None,
+            use_buy_price=args.use_buy_price,
+            premium=args.premium,
+            craft_cities=[normalize_city(c) for c in args.craft_cities] if args.craft_cities else None,
+            sell_cities=[normalize_city(c) for c in args.sell_cities] if args.sell_cities else None,
+            volume_days=args.volume_days
+        )
+    except ValueError as e:
+        print(f"Помилка: {e}")
+        return 1
+    
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        print_plan_report(result)
+    return 0
+
+def run_export(args):
+    """Підкоманда export: повна таблиця прибутковості у CSV або NDJSON (потоково)"""
+    # Повідомлення завантаження цін - у stderr, щоб не змішувались з таблицею у stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        prices = get_prices(background=False)
+    if not prices:
+        print("Помилка: не вдалося завантажити ціни. Перевірте підключення до інтернету.", file=sys.stderr)
+        return 1
+    
+    settings = settings_grid(
+        focus_options=bool_options(args.focus),
+        premium_options=bool_options(args.premium),
+        machine_costs=args.machine_cost,
+        return_rates=[rate / 100.0 for rate in args.return_rate] if args.return_rate else [None],
+        extra_bonus_pcts=args.extra_bonus,
+        use_buy_price=args.use_buy_price
+    )
+    serialize, _ = EXPORT_FORMATS[args.format]
+    chunks = serialize(iter_export_rows(OpportunityMatrix(cities=CITIES), prices, settings))
+    if args.output == "-":
+        sys.stdout.writelines(chunks)
+        return 0
+    with open(args.output, "w", encoding="utf-8", newline="") as f:
+        f.writelines(chunks)
+    print(f"Таблицю збережено в {args.output}", file=sys.stderr)
+    return 0
+
+def print_batch_report(shown, total):
+    """Виводить таблицю результатів пакетного розрахунку (найприбутковіші зверху; total - усього сценаріїв)"""
+    print(f"{'Зілля':<28} {'Крафт':<12} {'Продаж':<12} {'Фокус':<6} {'Повер.':>7} {'Станок':>7} "
+          f"{'Вартість':>10} {'Прибуток':>10} {'ROI':>8}")
+    print("-"*108)
+    for row in shown:
+        if row['error']:
+            print(f"#{row['index']} {row['potion_id'] or ''}: {row['error']}")
+            continue
+        print(f"{row['potion_id']:<28} {row['craft_city']:<12} {row['sell_city']:<12} "
+              f"{'так' if row['focus_bonus'] else 'ні':<6} {row['return_rate']*100:>6.1f}% {row['machine_cost']:>7.0f} "
+              f"{row['cost_per_potion']:>10.1f} {row['profit_per_potion']:>10.1f} {row['roi_percent']:>7.1f}%")
+    if len(shown) < total:
+        print(f"... ще {total - len(shown)} сценаріїв")
+
+def run_batch_command(args):
+    """Підкоманда batch: розрахунок сценаріїв з файлів або сітки без діалогу (для cron)"""
+    try:
+        scenarios = []
+        for path in args.scenarios:
+            scenarios.extend(load_scenarios(path))
+    except (OSError, ValueError) as e:
+        print(f"Помилка: не вдалося прочитати сценарії: {e}", file=sys.stderr)
+        return 1
+    
+    grid_axes = None
+    if args.potions or not args.scenarios:
+        grid_axes = dict(
+            potion_ids=args.potions,
+            craft_cities=[normalize_city(city) for city in args.craft_cities],
+            sell_cities=[normalize_city(city) for city in args.sell_cities] if args.sell_cities else None,
+            quantities=args.quantity,
+            qualities=args.quality,
+            focus_options=bool_options(args.focus),
+            premium_options=bool_options(args.premium),
+            return_rates=args.return_rate or [None],
+            machine_costs=args.machine_cost,
+            extra_bonus_pcts=args.extra_bonus,
+        )
+        size = grid_size(*(values or (RECIPES if key == 'potion_ids' else [None]) for key, values in grid_axes.items()))
+        if size > MAX_GRID_SCENARIOS:
+            print(f"Помилка: сітка з {size} сценаріїв, дозволено не більше {MAX_GRID_SCENARIOS}", file=sys.stderr)
+            return 1
+    
+    with contextlib.redirect_stdout(sys.stderr):
+        prices = get_prices(background=False, auto_refresh=not args.no_refresh)
+    if not prices:
+        print("Помилка: не вдалося завантажити ціни. Перевірте підключення до інтернету.", file=sys.stderr)
+        return 1
+    
+    if grid_axes is not None:
+        grid = grid_scenarios(**grid_axes, use_buy_price=args.use_buy_price,
+                              craft_intermediates=args.craft_intermediates,
+                              source_anywhere=args.source_anywhere, transport_cost=args.transport_cost)
+        scenarios = itertools.chain(scenarios, grid)
+    counts = {'total': 0, 'errors': 0}
+    def counted(rows):
+        for row in rows:
+            counts['total'] += 1
+            counts['errors'] += bool(row['error'])
+            yield row
+    
+    # Рядки йдуть з пулу потоком: у файл - одразу, у пам'яті лише найкращі --limit для таблиці
+    rows = counted(run_batch(scenarios, prices, processes=args.processes))
+    try:
+        if args.output:
+            rows = stream_results(rows, args.output, args.format)
+        if args.quiet:
+            collections.deque(rows, maxlen=0)
+        else:
+            shown = sort_results(rows, args.sort, args.limit)
+    except (OSError, ValueError) as e:
+        print(f"Помилка: {e}", file=sys.stderr)
+        return 1
+    
+    if args.output:
+        print(f"Результати {counts['total']} сценаріїв збережено в {args.output}", file=sys.stderr)
+    if not args.quiet:
+        print_batch_report(shown, counts['total'])
+    if counts['errors']:
+        print(f"Сценаріїв з помилкою: {counts['errors']} з {counts['total']}", file=sys.stderr)
+    return 1 if counts['total'] and counts['errors'] == counts['total'] else 0
+
+def build_parser():
+    """Аргументи командного рядка; без підкоманди запускається інтерактивний режим"""
+    parser = argparse.ArgumentParser(description="Albion Online - Калькулятор вартості крафту зілля")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    sweep = subparsers.add_parser("sweep", help="Прибуток і межі беззбитковості на сітці налаштувань станку")
+    sweep.add_argument("potion_id", help="ID зілля")
+    sweep.add_argument("--craft-city", default="Caerleon", help="Місто крафту")
+    sweep.add_argument("--sell-city", help="Місто продажу (за замовчуванням - місто крафту)")
+    sweep.add_argument("--return-rate", nargs=3, type=float, default=[0, 50, 51], metavar=("MIN", "MAX", "STEPS"),
+                       help="Відсоток повернення, %% (за замовчуванням 0 50 51)")
+    sweep.add_argument("--machine-cost", nargs=3, type=float, default=[0, 1000, 21], metavar=("MIN", "MAX", "STEPS"),
+                       help="Вартість станку за 100 їжі (за замовчуванням 0 1000 21)")
+    sweep.add_argument("--extra-bonus", nargs=3, type=float, default=[0, 0, 1], metavar=("MIN", "MAX", "STEPS"),
+                       help="Додатковий бонус, %% (за замовчуванням 0 0 1)")
+    sweep.add_argument("--focus", default="both", help="Фокус: true, false або both")
+    sweep.add_argument("--premium", default="both", help="Преміум: true, false або both")
+    sweep.add_argument("--use-buy-price", action="store_true", help="Ціна покупки матеріалів")
+    sweep.add_argument("--craft-intermediates", action="store_true", help="Крафтити масло й самогон, якщо дешевше")
+    sweep.add_argument("--json", action="store_true", help="Вивести повний результат у JSON")
+    sweep.set_defaults(handler=run_sweep)
+    
+    plan = subparsers.add_parser(
+        "plan", help="План виробництва під бюджет, фокус і місткість ринку",
+        description="План виробництва під бюджет, фокус і місткість ринку. Розв'язок жадібний: "
+                    "план добрий, але не обов'язково оптимальний.")
+    plan.add_argument("--budget", type=float, required=True,
+                      help="Бюджет срібла на покупку інгредієнтів і станок (до повернення ресурсів)")
+    plan.add_argument("--focus", type=float, default=0.0, help="Доступний фокус (0 - без фокусу)")
+    plan.add_argument("--market-cap", type=float, help="Скільки зілль одного виду приймає ринок міста")
+    plan.add_argument("--market-caps", nargs="*", metavar="POTION=N", help="Ліміти ринку для окремих зілль")
+    plan.add_argument("--volume-days", type=float,
+                      help="Ліміт ринку - обсяг продажів за стільки днів (з історії торгів API)")
+    plan.add_argument("--ingredient-caps", nargs="*", metavar="MATERIAL=N", help="Ліміти інгредієнтів на весь план")
+    plan.add_argument("--machine-cost", type=float, default=0.0, help="Вартість станку за 100 їжі")
+    plan.add_argument("--extra-bonus", type=float, default=0.0, help="Додатковий бонус, %%")
+    plan.add_argument("--return-rate", type=float, help="Відсоток повернення, %% (за замовчуванням - базовий міста)")
+    plan.add_argument("--premium", action="store_true", help="Преміум акаунт")
+    plan.add_argument("--use-buy-price", action="store_true", help="Ціна покупки матеріалів")
+    plan.add_argument("--craft-cities", nargs="*", help="Дозволені міста крафту")
+    plan.add_argument("--sell-cities", nargs="*", help="Дозволені міста продажу")
+    plan.add_argument("--json", action="store_true", help="Вивести план у JSON")
+    plan.set_defaults(handler=run_plan)
+    
+    export = subparsers.add_parser("export", help="Повна таблиця прибутковості у CSV або NDJSON")
+    export.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv", help="Формат (за замовчуванням csv)")
+    export.add_argument("--output", default="-", help="Файл (за замовчуванням - стандартний вивід)")
+    export.add_argument("--machine-cost", nargs="+", type=float, default=[0.0], help="Вартості станку за 100 їжі")
+    export.add_argument("--return-rate", nargs="+", type=float,
+                        help="Відсотки повернення, %% (за замовчуванням - базовий міста крафту)")
+    export.add_argument("--extra-bonus", nargs="+", type=float, default=[0.0], help="Додаткові бонуси, %%")
+    export.add_argument("--focus", default="both", help="Фокус: true, false або both")
+    export.add_argument("--premium", default="both", help="Преміум: true, false або both")
+    export.add_argument("--use-buy-price", action="store_true", help="Ціна покупки матеріалів")
+    export.set_defaults(handler=run_export)
+    
+    batch = subparsers.add_parser("batch", help="Розрахунок сценаріїв з файлів CSV/JSON або сітки параметрів")
+    batch.add_argument("scenarios", nargs="*", help="Файли сценаріїв (.csv або .json, параметри як у /api/calculate)")
+    batch.add_argument("--potions", nargs="+", help="Сітка: зілля (без файлів сценаріїв - усі рецепти)")
+    batch.add_argument("--craft-cities", nargs="+", default=["Caerleon"], help="Сітка: міста крафту")
+    batch.add_argument("--sell-cities", nargs="+", help="Сітка: міста продажу (за замовчуванням - місто крафту)")
+    batch.add_argument("--quantity", nargs="+", type=int, default=[1], help="Сітка: кількість зілля")
+    batch.add_argument("--quality", nargs="+", type=int, default=[1], help="Сітка: якість зілля (1-5)")
+    batch.add_argument("--return-rate", nargs="+", type=float,
+                       help="Сітка: відсотки повернення, %% (за замовчуванням - базовий міста крафту)")
+    batch.add_argument("--machine-cost", nargs="+", type=float, default=[0.0], help="Сітка: вартості станку за 100 їжі")
+    batch.add_argument("--extra-bonus", nargs="+", type=float, default=[0.0], help="Сітка: додаткові бонуси, %%")
+    batch.add_argument("--focus", default="false", help="Сітка: фокус true, false або both")
+    batch.add_argument("--premium", default="false", help="Сітка: преміум true, false або both")
+    batch.add_argument("--use-buy-price", action="store_true", help="Сітка: ціна покупки матеріалів")
+    batch.add_argument("--craft-intermediates", action="store_true", help="Сітка: крафтити масло й самогон, якщо дешевше")
+    batch.add_argument("--source-anywhere", action="store_true", help="Сітка: купувати інгредієнти в найдешевшому місті")
+    batch.add_argument("--transport-cost", type=float, default=0.0, help="Сітка: перевезення одиниці інгредієнта, срібла")
+    batch.add_argument("--processes", type=int, help="Кількість процесів (за замовчуванням - кількість ядер)")
+    batch.add_argument("--sort", choices=SORT_KEYS, default="profit_per_potion", help="Ключ сортування")
+    batch.add_argument("--limit", type=int, default=30,
+                       help="Скільки рядків вивести (0 - усі; тоді всі результати сортуються в пам'яті)")
+    batch.add_argument("--output", help="Файл результатів (.csv, .json або .ndjson) у порядку сценаріїв, без сортування")
+    batch.add_argument("--format", choices=("csv", "json", "ndjson"), help="Формат файлу результатів")
+    batch.add_argument("--quiet", action="store_true", help="Не виводити таблицю (лише файл результатів)")
+    batch.add_argument("--no-refresh", action="store_true", help="Не оновлювати ціни з API, якщо кеш є")
+    batch.set_defaults(handler=run_batch_command)
+    return parser
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = build_parser().parse_args()
+    if args.command is None:
+        main()
+    else:
+        raise SystemExit(args.handler(args))
\ No newline at end of file
@@ -15,16 +15,21 @@ MATERIALS_IDS={
 "T6_MILK":"Овечье молоко",
 "T6_BUTTER":"Овечье масло",
 "T6_ALCOHOL":"Картофельный самогон",
+"T6_POTATO":"Картофель",
 
 "T7_MULLEIN":"Царский огнецвет",
 "T7_ALCOHOL":"Кукурузный самогон",
+"T7_CORN":"Кукуруза",
 
 "T8_YARROW":"Упырый тысячелистник",
 "T8_MILK":"Коровье молоко",
 "T8_BUTTER":"Коровье масло",
 "T8_ALCOHOL":"Тыквенный самогон",
+"T8_PUMPKIN":"Тыква",
 
 "T1_ALCHEMY_EXTRACT_LEVEL1":"Базовый магический экстракт",
+"T1_ALCHEMY_EXTRACT_LEVEL2":"Очищенный магический экстракт",
+"T1_ALCHEMY_EXTRACT_LEVEL3":"Чистый магический экстракт",
 
 "T3_ALCHEMY_RARE_PANTHER":"Прочные теневые когти",
 "T3_ALCHEMY_RARE_ENT":"Прочные корни хьерна",
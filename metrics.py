@@ -0,0 +1,287 @@
+import atexit
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Метрики у текстовому форматі Prometheus без зовнішніх залежностей.
+#
+# Кожен процес (gunicorn worker) рахує у своїй пам'яті - інкремент лічильника
+# коштує одне захоплення блокування. Файли воркерів вмикаються змінною
+# середовища METRICS_DIR (її задає gunicorn.conf.py); без неї - CLI, пакетні
+# воркери, тести - метрики живуть лише в пам'яті процесу і нічого не пишеться.
+# З METRICS_DIR фоновий потік раз на METRICS_FLUSH_SECONDS (і кожен запит
+# /metrics) записує значення воркера у METRICS_DIR/worker-<pid>.json,
+# а /metrics підсумовує файли всіх воркерів, тож відповідь однакова незалежно
+# від того, який воркер її обслужив. Файл завершеного воркера видаляється
+# (хук child_exit у gunicorn.conf.py, atexit самого процесу, а файли з pid
+# неживих процесів /metrics пропускає і прибирає), тож його лічильники не
+# підсумовуються вічно, а новий процес з тим самим pid не перезаписує чужі
+# значення. Як і в multiprocess-режимі клієнта Prometheus, після перезапуску
+# воркера сума лічильників зменшується - Prometheus сприймає це як скидання.
+METRICS_DIR = os.environ.get("METRICS_DIR") or None
+METRICS_FLUSH_SECONDS = 5.0
+
+# Межі кошиків гістограм за замовчуванням (секунди)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+class Counter:
+    """Лічильник, який тільки зростає"""
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def state(self):
+        return self.value
+
+class Histogram:
+    """Гістограма з фіксованими межами кошиків (кількість у кожному кошику, сума, кількість)"""
+    __slots__ = ('buckets', 'counts', 'sum', '_lock')
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # Останній елемент - кошик +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        """Вимірює тривалість блоку with"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def state(self):
+        with self._lock:
+            return {'counts': list(self.counts), 'sum': self.sum}
+
+class Registry:
+    """
+    Реєстр метрик процесу
+
+    Метрика - сімейство (ім'я, тип, опис) з окремим значенням для кожного набору міток.
+    Для гарячих шляхів метрику варто отримати один раз і зберегти в змінній модуля.
+    """
+
+    def __init__(self, directory: Optional[str] = METRICS_DIR, flush_seconds: float = METRICS_FLUSH_SECONDS):
+        """
+        Args:
+            directory: Тека файлів воркерів (None - тільки метрики поточного процесу)
+            flush_seconds: Як часто воркер записує свої значення у файл
+        """
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._families: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._flush_error_reported = False
+        if directory is not None:
+            atexit.register(self._remove_own_file)
+            self._start_flusher()
+            # Потоки не переживають fork: воркер gunicorn запускає власний
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=self._start_flusher)
+
+    def _start_flusher(self):
+        """Фоновий потік, який раз на flush_seconds записує значення процесу у файл"""
+        def run():
+            while True:
+                time.sleep(self.flush_seconds)
+                self.flush()
+        threading.Thread(target=run, name="metrics-flush", daemon=True).start()
+
+    def _get(self, kind: str, name: str, help_text: str, labels: Dict[str, str], factory: Callable):
+        key: LabelKey = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        family = self._families.get(name)
+        if family is not None:
+            metric = family['metrics'].get(key)
+            if metric is not None:
+                return metric
+        with self._lock:
+            family = self._families.setdefault(name, {'type': kind, 'help': help_text, 'metrics': {}})
+            if family['type'] != kind:
+                raise ValueError(f"метрика {name} вже зареєстрована як {family['type']}")
+            return family['metrics'].setdefault(key, factory())
+
+    def counter(self, name: str, help_text: str = "", **labels) -> Counter:
+        """Лічильник (створюється при першому зверненні)"""
+        return self._get('counter', name, help_text, labels, Counter)
+
+    def histogram(self, name: str, help_text: str = "", buckets: Iterable[float] = DEFAULT_BUCKETS,
+                  **labels) -> Histogram:
+        """Гістограма (створюється при першому зверненні)"""
+        return self._get('histogram', name, help_text, labels, lambda: Histogram(buckets))
+
+    def snapshot(self) -> Dict:
+        """Значення всіх метрик процесу у вигляді, придатному для JSON"""
+        with self._lock:
+            families = {name: dict(family, metrics=dict(family['metrics'])) for name, family in self._families.items()}
+        result = {}
+        for name, family in families.items():
+            samples = []
+            for key, metric in family['metrics'].items():
+                sample = {'labels': dict(key), 'value': metric.state()}
+                if family['type'] == 'histogram':
+                    sample['buckets'] = list(metric.buckets)
+                samples.append(sample)
+            result[name] = {'type': family['type'], 'help': family['help'], 'samples': samples}
+        return result
+
+    def _worker_file(self, pid: Optional[int] = None) -> str:
+        return os.path.join(self.directory, f"worker-{pid or os.getpid()}.json")
+
+    def mark_process_dead(self, pid: int):
+        """Видаляє файл метрик завершеного процесу (хук child_exit у gunicorn)"""
+        if self.directory is None:
+            return
+        path = self._worker_file(pid)
+        for stale in (path, f"{path}.tmp"):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+    def _remove_own_file(self):
+        # pid на момент виходу: дочірній процес після fork не видаляє файл батька
+        self.mark_process_dead(os.getpid())
+
+    def flush(self):
+        """Записує значення процесу у файл воркера (процес без метрик, напр. майстер gunicorn, не пише)"""
+        if self.directory is None or not self._families:
+            return
+        path = self._worker_file()
+        temp_path = f"{path}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            if not self._flush_error_reported:
+                print(f"Не вдалося записати метрики в {path}: {e}")
+                self._flush_error_reported = True
+
+    def collect(self) -> Dict:
+        """Сума метрик усіх воркерів (для поточного процесу - живі значення)"""
+        self.flush()
+        snapshots = [self.snapshot()]
+        if self.directory is not None and os.path.isdir(self.directory):
+            own_file = os.path.basename(self._worker_file())
+            for name in sorted(os.listdir(self.directory)):
+                if name == own_file or not (name.startswith("worker-") and name.endswith(".json")):
+                    continue
+                pid = name[len("worker-"):-len(".json")]
+                if pid.isdigit() and not _pid_alive(int(pid)):
+                    # Воркер завершився, не прибравши за собою (напр. SIGKILL)
+                    self.mark_process_dead(int(pid))
+                    continue
+                try:
+                    with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return merge_snapshots(snapshots)
+
+    def render(self, gauges: Optional[List[Tuple[str, str, Dict[str, str], float]]] = None) -> str:
+        """
+        Текстовий формат Prometheus
+
+        Args:
+            gauges: Додаткові значення на момент запиту: (ім'я, опис, мітки, значення)
+        """
+        lines = []
+        for name, family in sorted(self.collect().items()):
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            for sample in family['samples']:
+                labels = sample['labels']
+                if family['type'] == 'counter':
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(sample['value'])}")
+                    continue
+                cumulative = 0
+                bounds = [_format_value(bound) for bound in sample['buckets']] + ["+Inf"]
+                for bound, count in zip(bounds, sample['value']['counts']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(dict(labels, le=bound))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(sample['value']['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        for name, help_text, labels, value in gauges or []:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+def _pid_alive(pid: int) -> bool:
+    """Чи існує процес з таким pid (на Windows перевірки немає - вважається живим)"""
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def merge_snapshots(snapshots: Iterable[Dict]) -> Dict:
+    """Підсумовує знімки метрик кількох воркерів (гістограми з різними кошиками не змішуються)"""
+    merged: Dict[str, Dict] = {}
+    for snapshot in snapshots:
+        for name, family in snapshot.items():
+            target = merged.setdefault(name, {'type': family['type'], 'help': family['help'], 'samples': {}})
+            if target['type'] != family['type']:
+                continue
+            for sample in family['samples']:
+                key = tuple(sorted(sample['labels'].items()))
+                existing = target['samples'].get(key)
+                if existing is None:
+                    target['samples'][key] = json.loads(json.dumps(sample))
+                elif family['type'] == 'counter':
+                    existing['value'] += sample['value']
+                elif existing['buckets'] == sample['buckets']:
+                    existing['value']['counts'] = [a + b for a, b in zip(existing['value']['counts'], sample['value']['counts'])]
+                    existing['value']['sum'] += sample['value']['sum']
+    for family in merged.values():
+        family['samples'] = [family['samples'][key] for key in sorted(family['samples'])]
+    return merged
+
+def _escape(value: str) -> str:
+    """Екранування значення мітки за форматом Prometheus"""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+mark_process_dead = REGISTRY.mark_process_dead
@@ -0,0 +1,207 @@
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+from recipes import RECIPES
+from potion import POTION_ITEM_VALUES
+from get_prices import find_item_price
+from price_table import PriceTable
+from cities import CITIES
+from sourcing import get_sourcing
+from calculator import (
+    NUTRITION_RATIO,
+    SALES_TAX_RATE,
+    LISTING_FEE_RATE,
+    BRECILIEN_CRAFT_BONUS,
+    default_return_rate,
+)
+
+# Ключі сортування ranked()
+RANK_KEYS = ("profit", "roi")
+
+class OpportunityMatrix:
+    """
+    Матричний розрахунок прибутковості для всіх зілль × міст крафту × міст продажу.
+
+    Рецепти перетворюються в матрицю кількостей [зілля, матеріал] один раз,
+    після чого вартість, ціна після податків, прибуток і ROI для всіх комбінацій
+    обчислюються одним проходом NumPy з тими ж формулами, що й у
+    PotionCalculator.calculate_craft_cost.
+    """
+
+    def __init__(self, recipes: Dict = RECIPES, cities: Optional[Sequence[str]] = None):
+        """
+        Args:
+            recipes: Словник рецептів (за замовчуванням RECIPES)
+            cities: Список міст (за замовчуванням CITIES)
+        """
+        self.cities = list(cities) if cities is not None else list(CITIES)
+        self.potion_ids = list(recipes.keys())
+        self.potion_names = [recipes[p]['name'] for p in self.potion_ids]
+
+        # Матеріали у порядку першої появи в рецептах
+        material_ids = []
+        for potion_id in self.potion_ids:
+            for ingredient_id in recipes[potion_id]['ingredients']:
+                if ingredient_id not in material_ids:
+                    material_ids.append(ingredient_id)
+        self.material_ids = material_ids
+        material_index = {m: i for i, m in enumerate(material_ids)}
+
+        self.quantities = np.zeros((len(self.potion_ids), len(material_ids)))
+        for p, potion_id in enumerate(self.potion_ids):
+            for ingredient_id, quantity in recipes[potion_id]['ingredients'].items():
+                self.quantities[p, material_index[ingredient_id]] = quantity
+
+        self.yields = np.array([recipes[p].get('yield', 1) for p in self.potion_ids], dtype=float)
+        self.item_values = np.array([float(POTION_ITEM_VALUES.get(p, 0.0)) for p in self.potion_ids])
+        self.nutrition_costs = self.item_values * NUTRITION_RATIO
+
+        # Бонус виходу та базовий відсоток повернення по містах крафту
+        self.city_yield_bonus = np.array([BRECILIEN_CRAFT_BONUS if c == "Brecilien" else 0.0 for c in self.cities])
+        self.city_return_rates = np.array([default_return_rate(c) for c in self.cities])
+
+        self._prices_ref = None
+        self._price_cache = {}
+
+    def price_matrices(self, prices: Dict, use_buy_price: bool = False):
+        """
+        Будує матриці цін [матеріал, місто] та [зілля, місто] з тим самим
+        пошуком запасного міста, що й get_item_price.
+        Результат кешується, поки передається той самий словник цін.
+        """
+        if prices is not self._prices_ref:
+            self._prices_ref = prices
+            self._price_cache = {}
+
+        material_price_type = "buy_price_max" if use_buy_price else "sell_price_min"
+        if material_price_type not in self._price_cache:
+            self._price_cache[material_price_type] = self._resolve_matrix(prices, self.material_ids, material_price_type)
+        if 'potion_sell' not in self._price_cache:
+            self._price_cache['potion_sell'] = self._resolve_matrix(prices, self.potion_ids, "sell_price_min")
+
+        return self._price_cache[material_price_type], self._price_cache['potion_sell']
+
+    def _resolve_matrix(self, prices: Dict, item_ids, price_type: str) -> np.ndarray:
+        """Матриця цін [предмет, місто] з урахуванням запасних міст"""
+        if isinstance(prices, PriceTable):
+            return prices.resolved_matrix(item_ids, self.cities, price_type)
+        return np.array([
+            [find_item_price(item_id, prices, city, price_type)[0] for city in self.cities]
+            for item_id in item_ids
+        ]).reshape(len(item_ids), len(self.cities))
+
+    def compute(
+        self,
+        prices: Dict,
+        machine_cost_per_100: float = 0.0,
+        focus_bonus: bool = False,
+        extra_bonus_pct: float = 0.0,
+        return_rate: Optional[float] = None,
+        use_buy_price: bool = False,
+        premium: bool = False,
+        transport_cost: Optional[float] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Розраховує прибутковість для всіх зілль × міст крафту × міст продажу
+
+        Args:
+            prices: Словник з цінами
+            machine_cost_per_100: Вартість користування станком за 100 їжі
+            focus_bonus: Чи використовується фокус
+            extra_bonus_pct: Додатковий бонус у відсотках
+            return_rate: Відсоток повернення (0.0 - 1.0); None - базовий для кожного міста крафту
+            use_buy_price: Використовувати ціну покупки матеріалів
+            premium: Преміум акаунт (податок 4% замість 8%)
+            transport_cost: Купувати матеріали в найдешевшому місті з цією вартістю
+                перевезення одиниці (None - ціни міста крафту, як раніше)
+
+        Returns:
+            Словник масивів: cost_per_potion і outlay_per_craft [P, C], sell_price
+            і sell_price_after_tax [P, S], profit_per_potion і roi_percent [P, C, S].
+            outlay_per_craft - срібло, яке треба мати до крафту: повна вартість
+            інгредієнтів і станку, до повернення ресурсів і бонусів
+        """
+        material_prices, potion_prices = self.price_matrices(prices, use_buy_price)
+        if transport_cost is not None:
+            material_prices = get_sourcing(prices, use_buy_price, transport_cost).cost_matrix(
+                self.material_ids, self.cities)
+
+        if return_rate is None:
+            return_rates = self.city_return_rates
+        else:
+            return_rates = np.full(len(self.cities), float(return_rate))
+
+        # [P, C]: вартість інгредієнтів одного крафту в кожному місті крафту
+        ingredient_cost_base = self.quantities @ material_prices
+        ingredient_cost = ingredient_cost_base * (1 - return_rates)
+        machine_cost = (self.nutrition_costs / 100.0 * machine_cost_per_100)[:, None]
+
+        focus_multiplier = 0.8 if focus_bonus else 1.0
+        extra_bonus_multiplier = max(0.0, 1.0 - (extra_bonus_pct / 100.0))
+        cost_per_craft = (ingredient_cost + machine_cost) * focus_multiplier * extra_bonus_multiplier
+
+        effective_yield = self.yields[:, None] * (1.0 + self.city_yield_bonus)[None, :]
+        cost_per_potion = cost_per_craft / effective_yield
+
+        # [P, S]: ціна продажу після податку та комісії
+        effective_sales_tax = SALES_TAX_RATE * (0.5 if premium else 1.0)
+        sell_price_after_tax = potion_prices - potion_prices * effective_sales_tax - potion_prices * LISTING_FEE_RATE
+
+        # [P, C, S]
+        profit = sell_price_after_tax[:, None, :] - cost_per_potion[:, :, None]
+        cost_3d = np.broadcast_to(cost_per_potion[:, :, None], profit.shape)
+        roi = np.divide(profit * 100, cost_3d, out=np.zeros_like(profit), where=cost_3d > 0)
+
+        return {
+            'cost_per_potion': cost_per_potion,
+            'outlay_per_craft': ingredient_cost_base + machine_cost,
+            'sell_price': potion_prices,
+            'sell_price_after_tax': sell_price_after_tax,
+            'profit_per_potion': profit,
+            'roi_percent': roi,
+        }
+
+    def ranked(self, result: Dict[str, np.ndarray], sort_by: str = "profit", limit: Optional[int] = None,
+               min_profit: Optional[float] = None) -> List[Dict]:
+        """
+        Перетворює результат compute() у відсортований список можливостей
+
+        Args:
+            result: Результат compute()
+            sort_by: Ключ з RANK_KEYS: 'profit' (прибуток з одного зілля) або 'roi'
+            limit: Максимальна кількість записів
+            min_profit: Мінімальний прибуток з одного зілля
+
+        Returns:
+            Список словників, від найвигіднішої комбінації
+        """
+        if sort_by not in RANK_KEYS:
+            raise ValueError(f"невідомий ключ сортування {sort_by!r}, можливі: {', '.join(RANK_KEYS)}")
+        if limit is not None and limit < 1:
+            raise ValueError(f"limit має бути не менше 1, отримано {limit}")
+        profit = result['profit_per_potion']
+        key = result['roi_percent'] if sort_by == "roi" else profit
+
+        # Зілля без ціни продажу не є можливістю
+        valid = (result['sell_price'] > 0)[:, None, :] & (result['cost_per_potion'] > 0)[:, :, None]
+        if min_profit is not None:
+            valid &= profit >= min_profit
+
+        flat = np.flatnonzero(valid)
+        order = flat[np.argsort(-key.ravel()[flat], kind='stable')]
+        if limit is not None:
+            order = order[:limit]
+
+        rows = []
+        for p, c, s in zip(*np.unravel_index(order, profit.shape)):
+            rows.append({
+                'potion_id': self.potion_ids[p],
+                'potion_name': self.potion_names[p],
+                'craft_city': self.cities[c],
+                'sell_city': self.cities[s],
+                'cost_per_potion': float(result['cost_per_potion'][p, c]),
+                'sell_price': float(result['sell_price'][p, s]),
+                'sell_price_after_tax': float(result['sell_price_after_tax'][p, s]),
+                'profit_per_potion': float(profit[p, c, s]),
+                'roi_percent': float(result['roi_percent'][p, c, s]),
+            })
+        return rows
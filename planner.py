@@ -0,0 +1,283 @@
+import math
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+from opportunities import OpportunityMatrix
+from materials import MATERIALS_IDS
+from volumes import MarketVolumes, get_volumes
+
+# Оцінка витрат фокусу на один крафт: частка від ItemValue зілля
+# (точних значень у даних гри немає; можна передати власні через focus_per_craft)
+FOCUS_PER_ITEM_VALUE = 0.25
+
+class ProductionPlanner:
+    """
+    Оптимізатор плану виробництва: які зілля, де крафтити і де продавати
+
+    Кандидати - усі комбінації зілля × місто крафту × місто продажу × фокус
+    (економіка з OpportunityMatrix, тобто та сама, що в PotionCalculator).
+    Змінна рішення - кількість крафтів кандидата. Обмеження:
+      - бюджет срібла на інгредієнти і станок - повна сума покупки до крафту,
+        бо повернені ресурси з'являються лише після нього (прибуток - чистий,
+        з урахуванням повернення);
+      - денний запас фокусу (тільки для крафтів з фокусом);
+      - скільки зілль ринок міста продажу прийме за день (на зілля);
+      - необов'язкові ліміти на загальну кількість інгредієнтів - інгредієнти
+        на кшталт T6_FOXGLOVE і T5_TEASEL спільні для різних зілль.
+
+    Це багатовимірний цілочисельний рюкзак. Він розв'язується жадібно,
+    тож план добрий, але оптимальність не гарантується:
+    кандидати без фокусу впорядковуються за прибутком на одиницю зваженого
+    ресурсу (кожен ресурс нормується на свій залишок) і беруться максимальні
+    цілі кількості; далі фокус витрачається на переведення найвигідніших
+    крафтів на фокус, а залишки дозаповнюються за прибутком.
+    Для одного обмеження перший прохід - оптимум LP-релаксації з округленням вниз.
+    """
+
+    def __init__(self, matrix: Optional[OpportunityMatrix] = None):
+        """
+        Args:
+            matrix: Матриця рецептів (за замовчуванням - нова OpportunityMatrix)
+        """
+        self.matrix = matrix or OpportunityMatrix()
+
+    def _candidates(self, prices: Dict, focus_available: bool, machine_cost_per_100: float,
+                    extra_bonus_pct: float, return_rate: Optional[float], use_buy_price: bool, premium: bool,
+                    focus_per_craft: Optional[Dict], craft_cities: Optional[Sequence[str]],
+                    sell_cities: Optional[Sequence[str]]) -> Dict[str, np.ndarray]:
+        """Плоскі масиви кандидатів з додатним прибутком"""
+        m = self.matrix
+        n_cities = len(m.cities)
+        effective_yield = m.yields[:, None] * (1.0 + m.city_yield_bonus)[None, :]  # [P, C]
+        return_rates = m.city_return_rates if return_rate is None else np.full(n_cities, float(return_rate))
+
+        focus_per_craft = focus_per_craft or {}
+        focus_costs = np.array([
+            float(focus_per_craft.get(p, m.item_values[i] * FOCUS_PER_ITEM_VALUE))
+            for i, p in enumerate(m.potion_ids)
+        ])
+
+        craft_ok = np.array([craft_cities is None or c in craft_cities for c in m.cities])
+        sell_ok = np.array([sell_cities is None or c in sell_cities for c in m.cities])
+
+        parts = []
+        for focus in ((False, True) if focus_available else (False,)):
+            result = m.compute(prices, machine_cost_per_100, focus, extra_bonus_pct, return_rate, use_buy_price, premium)
+            valid = (result['sell_price'] > 0)[:, None, :] & (result['cost_per_potion'] > 0)[:, :, None]
+            valid &= craft_ok[None, :, None] & sell_ok[None, None, :]
+            profit_per_craft = result['profit_per_potion'] * effective_yield[:, :, None]
+            valid &= profit_per_craft > 0
+
+            p, c, s = np.nonzero(valid)
+            parts.append({
+                'potion': p, 'craft': c, 'sell': s,
+                'focus': np.full(len(p), focus),
+                'profit': profit_per_craft[p, c, s],
+                'silver': result['outlay_per_craft'][p, c],
+                'net_cost': result['cost_per_potion'][p, c] * effective_yield[p, c],
+                'focus_cost': focus_costs[p] if focus else np.zeros(len(p)),
+                'potions': effective_yield[p, c],
+                'return_rate': return_rates[c],
+            })
+
+        return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+    def plan(
+        self,
+        prices: Dict,
+        budget: float,
+        focus_points: float = 0.0,
+        market_caps: Optional[Dict[str, float]] = None,
+        default_market_cap: Optional[float] = None,
+        ingredient_caps: Optional[Dict[str, float]] = None,
+        machine_cost_per_100: float = 0.0,
+        extra_bonus_pct: float = 0.0,
+        return_rate: Optional[float] = None,
+        use_buy_price: bool = False,
+        premium: bool = False,
+        focus_per_craft: Optional[Dict[str, float]] = None,
+        craft_cities: Optional[Sequence[str]] = None,
+        sell_cities: Optional[Sequence[str]] = None,
+        volumes: Optional[MarketVolumes] = None,
+        volume_days: Optional[float] = None
+    ) -> Dict:
+        """
+        Будує план виробництва
+
+        Args:
+            prices: Таблиця або словник з цінами
+            budget: Бюджет срібла на покупку інгредієнтів і станок (до повернення ресурсів)
+            focus_points: Доступний фокус (0 - без фокусу)
+            market_caps: {potion_id: скільки зілль приймає ринок одного міста продажу}
+            default_market_cap: Ліміт ринку для зілль без запису в market_caps (None - без ліміту)
+            ingredient_caps: {material_id: максимальна кількість на весь план}
+            machine_cost_per_100: Вартість станку за 100 їжі
+            extra_bonus_pct: Додатковий бонус у відсотках
+            return_rate: Відсоток повернення (0.0 - 1.0); None - базовий для міста крафту
+            use_buy_price: Використовувати ціну покупки матеріалів
+            premium: Преміум акаунт
+            focus_per_craft: {potion_id: витрати фокусу на крафт} замість оцінки
+            craft_cities: Дозволені міста крафту (None - усі)
+            sell_cities: Дозволені міста продажу (None - усі)
+            volumes: Обсяги торгів для volume_days (None - з кешу обсягів)
+            volume_days: Ліміт ринку - обсяг продажів за стільки днів у кожному місті продажу
+                (разом з market_caps діє менший; None - обсяги не враховуються)
+
+        Returns:
+            Словник: solver ('greedy'), plan (рядки плану), totals і shopping_list {місто крафту: {матеріал: кількість}}.
+            silver_cost і silver_used - срібло на покупку до крафту, net_cost - вартість
+            після повернення ресурсів, з якої рахується прибуток
+        """
+        m = self.matrix
+        cand = self._candidates(prices, focus_points > 0, machine_cost_per_100, extra_bonus_pct, return_rate,
+                                use_buy_price, premium, focus_per_craft, craft_cities, sell_cities)
+        n = len(cand['profit'])
+        market_caps = market_caps or {}
+        ingredient_caps = ingredient_caps or {}
+
+        # Залишки ресурсів
+        silver_left = float(budget)
+        focus_left = float(focus_points)
+        if volume_days is not None and volumes is None:
+            volumes = get_volumes()
+        market_left = {}
+        for potion_index, potion_id in enumerate(m.potion_ids):
+            cap = market_caps.get(potion_id, default_market_cap)
+            for sell_index, city in enumerate(m.cities):
+                limit = math.inf if cap is None else float(cap)
+                if volume_days is not None:
+                    daily = volumes.daily_volume_for(potion_id, city)
+                    if daily is not None:
+                        limit = min(limit, daily * volume_days)
+                market_left[(potion_index, sell_index)] = limit
+        capped_materials = [(j, material) for j, material in enumerate(m.material_ids) if material in ingredient_caps]
+        ingredient_left = {j: float(ingredient_caps[material]) for j, material in capped_materials}
+
+        # Витрата обмежених інгредієнтів на крафт (з урахуванням повернення)
+        usage = {
+            j: m.quantities[cand['potion'], j] * (1 - cand['return_rate'])
+            for j, _ in capped_materials
+        }
+
+        def max_crafts(i: int) -> int:
+            """Скільки крафтів кандидата i вміщується в залишки"""
+            limits = [silver_left / cand['silver'][i]]
+            if cand['focus_cost'][i] > 0:
+                limits.append(focus_left / cand['focus_cost'][i])
+            limits.append(market_left[(cand['potion'][i], cand['sell'][i])] / cand['potions'][i])
+            for j in ingredient_left:
+                if usage[j][i] > 0:
+                    limits.append(ingredient_left[j] / usage[j][i])
+            return max(0, int(math.floor(min(limits) + 1e-9)))
+
+        def efficiency() -> np.ndarray:
+            """Прибуток на одиницю зваженого ресурсу (кожен ресурс нормується на залишок)"""
+            weight = cand['silver'] / max(silver_left, 1e-9)
+            if focus_points > 0:
+                weight = weight + cand['focus_cost'] / max(focus_left, 1e-9)
+            for j in ingredient_left:
+                weight = weight + usage[j] / max(ingredient_left[j], 1e-9)
+            return cand['profit'] / weight
+
+        crafts = np.zeros(n, dtype=np.int64)
+
+        def allocate(order):
+            """Бере для кожного кандидата по порядку максимальну цілу кількість крафтів"""
+            nonlocal silver_left, focus_left
+            for i in order:
+                count = max_crafts(i)
+                if count <= 0:
+                    continue
+                crafts[i] += count
+                silver_left -= count * cand['silver'][i]
+                focus_left -= count * cand['focus_cost'][i]
+                market_left[(cand['potion'][i], cand['sell'][i])] -= count * cand['potions'][i]
+                for j in ingredient_left:
+                    ingredient_left[j] -= count * usage[j][i]
+
+        def upgrade_to_focus():
+            """
+            Переводить вибрані крафти без фокусу на фокус, починаючи з найбільшого
+            приросту прибутку на одиницю фокусу. Срібло на покупку, ринок та
+            інгредієнти не змінюються - фокус зменшує лише чисту вартість.
+            """
+            nonlocal focus_left
+            twins = {
+                (cand['potion'][i], cand['craft'][i], cand['sell'][i]): i
+                for i in np.flatnonzero(cand['focus'])
+            }
+            upgrades = []
+            for i in np.flatnonzero((crafts > 0) & ~cand['focus']):
+                twin = twins.get((cand['potion'][i], cand['craft'][i], cand['sell'][i]))
+                if twin is not None and cand['focus_cost'][twin] > 0:
+                    gain = (cand['profit'][twin] - cand['profit'][i]) / cand['focus_cost'][twin]
+                    upgrades.append((gain, i, twin))
+            for gain, i, twin in sorted(upgrades, reverse=True):
+                count = min(int(crafts[i]), int(math.floor(focus_left / cand['focus_cost'][twin] + 1e-9)))
+                if gain <= 0 or count <= 0:
+                    continue
+                crafts[i] -= count
+                crafts[twin] += count
+                focus_left -= count * cand['focus_cost'][twin]
+
+        # 1) без фокусу - за ефективністю; 2) найвигідніші крафти переводяться на фокус;
+        # 3) залишки срібла і фокусу дозаповнюються за прибутком
+        order = np.argsort(-efficiency(), kind='stable')
+        allocate(order[~cand['focus'][order]])
+        if focus_points > 0:
+            upgrade_to_focus()
+        allocate(np.argsort(-cand['profit'], kind='stable'))
+
+        return self._describe(cand, crafts, budget, focus_points, silver_left, focus_left)
+
+    def _describe(self, cand: Dict, crafts: np.ndarray, budget: float, focus_points: float,
+                  silver_left: float, focus_left: float) -> Dict:
+        """Перетворює вибрані кількості крафтів у план і список покупок"""
+        m = self.matrix
+        rows: List[Dict] = []
+        shopping: Dict[str, Dict[str, float]] = {}
+        for i in np.flatnonzero(crafts):
+            p, c, s = cand['potion'][i], cand['craft'][i], cand['sell'][i]
+            count = int(crafts[i])
+            craft_city = m.cities[c]
+            rows.append({
+                'potion_id': m.potion_ids[p],
+                'potion_name': m.potion_names[p],
+                'craft_city': craft_city,
+                'sell_city': m.cities[s],
+                'focus_bonus': bool(cand['focus'][i]),
+                'crafts': count,
+                'potions': float(count * cand['potions'][i]),
+                'silver_cost': float(count * cand['silver'][i]),
+                'net_cost': float(count * cand['net_cost'][i]),
+                'focus_cost': float(count * cand['focus_cost'][i]),
+                'profit': float(count * cand['profit'][i]),
+            })
+            # Спільні інгредієнти різних зілль зводяться в один список на місто крафту
+            city_list = shopping.setdefault(craft_city, {})
+            for j in np.flatnonzero(m.quantities[p]):
+                material = m.material_ids[j]
+                city_list[material] = city_list.get(material, 0.0) + m.quantities[p, j] * count * (1 - cand['return_rate'][i])
+
+        rows.sort(key=lambda row: -row['profit'])
+        shopping_list = {
+            city: [
+                {'material_id': material, 'name': MATERIALS_IDS.get(material, material), 'quantity': math.ceil(quantity - 1e-9)}
+                for material, quantity in sorted(materials.items(), key=lambda item: -item[1])
+            ]
+            for city, materials in shopping.items()
+        }
+        return {
+            # Розв'язок жадібний, не обов'язково оптимальний
+            'solver': 'greedy',
+            'plan': rows,
+            'totals': {
+                'profit': sum(row['profit'] for row in rows),
+                'silver_used': float(budget - silver_left),
+                'silver_left': float(silver_left),
+                'net_cost': sum(row['net_cost'] for row in rows),
+                'focus_used': float(focus_points - focus_left),
+                'focus_left': float(focus_left),
+                'crafts': int(crafts.sum()),
+            },
+            'shopping_list': shopping_list,
+        }
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+import numpy as np
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from price_table import PriceTable, DERIVED_ARRAYS
+
+# Формат файлу знімка цін:
+#   заголовок  <4s H H d I>  magic, версія схеми, резерв, час оновлення (epoch), довжина метаданих
+#   метадані   JSON (cities, price_types, опис масивів і блоку item_ids)
+#   масиви     сирі байти кожного масиву, вирівняні по ARRAY_ALIGNMENT
+#   item_ids   ID предметів через "\n" (UTF-8) з відбитком blake2b у метаданих
+#
+# Воркери відображають файл у пам'ять лише для читання (mmap) і створюють масиви
+# PriceTable прямо поверх відображення, тож усі воркери ділять одні сторінки
+# кешу ОС. З версії 2 у файлі є й похідні масиви (запасні міста), тому воркеру
+# не треба нічого перераховувати, а якщо відбиток item_ids збігається з
+# попереднім знімком, то й розбирати ID та будувати індекс. Новий знімок - новий файл (os.replace), тож
+# старе відображення лишається цілим, доки на нього посилаються запити.
+MAGIC = b"APCB"
+SCHEMA_VERSION = 2
+# Версії, які вміє читати decode_table (у версії 1 немає похідних масивів)
+SUPPORTED_SCHEMAS = (1, 2)
+# mmap на Windows блокує заміну файлу через os.replace
+USE_MMAP = os.name != "nt"
+HEADER = struct.Struct("<4sHHdI")
+ARRAY_ALIGNMENT = 64
+
+# Масиви PriceTable, які зберігаються у файлі, і їх типи
+TABLE_ARRAYS = {
+    'values': '<f8',
+    'dates': '<i8',
+    'fetched_at': '<f8',
+    'stale_streak': '<i2',
+    'mask': '|b1',
+    'source': '<i2',
+    'any_source': '<i2',
+    'resolved': '<f8',
+    'any_resolved': '<f8',
+}
+
+class SnapshotFormatError(ValueError):
+    """Файл не є знімком цін підтримуваної версії"""
+
+def _align(offset: int) -> int:
+    return (offset + ARRAY_ALIGNMENT - 1) // ARRAY_ALIGNMENT * ARRAY_ALIGNMENT
+
+def _data_start(meta_len: int) -> int:
+    """Початок секції масивів (зсуви масивів у метаданих рахуються від неї)"""
+    return _align(HEADER.size + meta_len)
+
+def encode_table(table: PriceTable, timestamp: datetime) -> bytes:
+    """Серіалізує таблицю цін у компактний бінарний формат"""
+    arrays = {name: np.ascontiguousarray(getattr(table, name), dtype=dtype) for name, dtype in TABLE_ARRAYS.items()}
+
+    ids_bytes = "\n".join(table.item_ids).encode('utf-8')
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': TABLE_ARRAYS[name], 'shape': list(array.shape), 'offset': offset}
+        offset = _align(offset + array.nbytes)
+    item_ids_block = {
+        'offset': offset,
+        'length': len(ids_bytes),
+        'count': len(table.item_ids),
+        'digest': hashlib.blake2b(ids_bytes, digest_size=16).hexdigest(),
+    }
+    meta_bytes = json.dumps({
+        'cities': table.cities,
+        'price_types': list(table.price_types),
+        'arrays': layout,
+        'item_ids': item_ids_block,
+    }, ensure_ascii=False).encode('utf-8')
+
+    data_start = _data_start(len(meta_bytes))
+    buffer = bytearray(data_start + offset + len(ids_bytes))
+    HEADER.pack_into(buffer, 0, MAGIC, SCHEMA_VERSION, 0, timestamp.timestamp(), len(meta_bytes))
+    buffer[HEADER.size:HEADER.size + len(meta_bytes)] = meta_bytes
+    for name, array in arrays.items():
+        start = data_start + layout[name]['offset']
+        buffer[start:start + array.nbytes] = array.tobytes()
+    ids_start = data_start + offset
+    buffer[ids_start:ids_start + len(ids_bytes)] = ids_bytes
+    return bytes(buffer)
+
+def _decode_item_ids(buffer, data_start: int, block: Dict, previous: Optional[PriceTable]):
+    """
+    ID предметів знімка і готовий індекс
+
+    Returns:
+        Кортеж (item_ids, item_index або None, відбиток)
+    """
+    if isinstance(block, list):  # Версія 1: список прямо в метаданих
+        return block, None, None
+    digest = block['digest']
+    if previous is not None and previous.item_ids_digest == digest:
+        return previous.item_ids, previous.item_index, digest
+    start = data_start + block['offset']
+    text = bytes(buffer[start:start + block['length']]).decode('utf-8')
+    item_ids = text.split("\n") if block['count'] else []
+    return item_ids, None, digest
+
+def decode_table(buffer, previous: Optional[PriceTable] = None) -> Tuple[PriceTable, datetime]:
+    """
+    Відновлює таблицю цін з буфера (bytes, mmap) без копіювання масивів
+
+    Args:
+        buffer: Вміст файлу знімка
+        previous: Попередня таблиця - її item_ids та індекс перевикористовуються,
+            якщо список предметів не змінився
+
+    Raises:
+        SnapshotFormatError: якщо буфер не є знімком підтримуваної версії
+    """
+    if len(buffer) < HEADER.size:
+        raise SnapshotFormatError("Файл знімка занадто короткий")
+    magic, schema, _, timestamp, meta_len = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise SnapshotFormatError("Невідомий формат файлу знімка")
+    if schema not in SUPPORTED_SCHEMAS:
+        raise SnapshotFormatError(f"Непідтримувана версія схеми знімка: {schema}")
+
+    meta = json.loads(bytes(buffer[HEADER.size:HEADER.size + meta_len]).decode('utf-8'))
+    data_start = _data_start(meta_len)
+    arrays = {}
+    for name, spec in meta['arrays'].items():
+        count = math.prod(spec['shape'])
+        arrays[name] = np.frombuffer(
+            buffer, dtype=np.dtype(spec['dtype']), count=count, offset=data_start + spec['offset']
+        ).reshape(spec['shape'])
+
+    derived = {name: arrays[name] for name in DERIVED_ARRAYS} if all(name in arrays for name in DERIVED_ARRAYS) else None
+    item_ids, item_index, digest = _decode_item_ids(buffer, data_start, meta['item_ids'], previous)
+    table = PriceTable(
+        item_ids, meta['cities'], arrays['values'], meta['price_types'],
+        dates=arrays['dates'], fetched_at=arrays['fetched_at'], stale_streak=arrays['stale_streak'],
+        derived=derived, item_index=item_index
+    )
+    table.item_ids_digest = digest
+    return table, datetime.fromtimestamp(timestamp)
+
+def write_snapshot(path: str, table: PriceTable, timestamp: datetime):
+    """Атомарно записує знімок: тимчасовий файл у тій самій папці + os.replace"""
+    data = encode_table(table, timestamp)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def read_snapshot(path: str, use_mmap: bool = USE_MMAP,
+                  previous: Optional[PriceTable] = None) -> Tuple[PriceTable, datetime]:
+    """
+    Читає знімок з файлу
+
+    Args:
+        path: Шлях до файлу знімка
+        use_mmap: Відобразити файл у пам'ять лише для читання (масиви таблиці без копіювання)
+        previous: Попередня таблиця процесу (див. decode_table)
+    """
+    with open(path, "rb") as f:
+        if not use_mmap:
+            return decode_table(f.read(), previous)
+        # Відображення живе, поки на нього посилаються масиви таблиці
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return decode_table(buffer, previous)
+
+def export_json(path: str, table: PriceTable, timestamp: datetime):
+    """Експортує знімок у JSON (формат старого prices_cache.json) для налагодження"""
+    cache_data = {
+        'prices': table.to_dict(),
+        'timestamp': timestamp.isoformat(),
+        'items': table.item_meta()
+    }
+    with open(path, "w", encoding='utf-8') as f:
+        json.dump(cache_data, f, ensure_ascii=False, indent=2)
+
+def load_json(path: str) -> Tuple[Dict, datetime, Dict]:
+    """
+    Читає JSON-кеш (старий формат prices_cache.json)
+
+    Returns:
+        Кортеж (ціни, час оновлення, метадані предметів)
+    """
+    with open(path, "r", encoding='utf-8') as f:
+        cache_data = json.load(f)
+
+    timestamp_str = cache_data.get('timestamp')
+    timestamp = datetime.fromisoformat(timestamp_str) if timestamp_str else datetime.fromtimestamp(0)
+    prices = cache_data.get('prices', {})
+    # Кеш без метаданих: вважаємо, що всі предмети завантажено разом із кешем
+    item_meta = cache_data.get('items') or {
+        item_id: {'fetched_at': timestamp.timestamp()} for item_id in prices
+    }
+    return prices, timestamp, item_meta
@@ -0,0 +1,269 @@
+import numpy as np
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from cities import CITIES, PRIORITY_CITIES, normalize_city
+from variants import price_key
+
+# Типи цін, які повертає Albion Data API
+PRICE_TYPES = ("sell_price_min", "buy_price_max", "buy_price_min", "sell_price_max")
+# Суфікс поля з часом спостереження ціни в API ("sell_price_min_date")
+DATE_SUFFIX = "_date"
+# Масиви, які обчислюються з values при побудові таблиці (знімок у price_store зберігає їх готовими)
+DERIVED_ARRAYS = ("mask", "source", "any_source", "resolved", "any_resolved")
+
+def parse_api_date(value) -> int:
+    """Перетворює дату з API ("2025-12-12T10:15:00", UTC) у секунди epoch; 0 - дати немає"""
+    if not value:
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        parsed = datetime.fromisoformat(str(value).rstrip("Z"))
+    except ValueError:
+        return 0
+    # API позначає відсутню ціну датою 0001-01-01
+    if parsed.year < 2000:
+        return 0
+    return int(parsed.replace(tzinfo=timezone.utc).timestamp())
+
+def format_api_date(epoch: int) -> str:
+    """Зворотне до parse_api_date перетворення (формат дати API)"""
+    if epoch <= 0:
+        return "0001-01-01T00:00:00"
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+class PriceTable(Mapping):
+    """
+    Щільна таблиця цін з інтернованими індексами предметів і міст
+
+    values - масив float64 [предмет, місто, тип ціни], mask - де ціна > 0.
+    Назви міст нормалізуються при побудові, а запасне місто для кожної
+    клітинки визначається один раз на таблицю: resolved містить ціну з
+    урахуванням запасного міста, source - індекс міста, звідки її взято (-1 - ціни немає).
+    Пошук ціни - це кілька звернень до словників індексів і одне до масиву.
+
+    dates - час спостереження кожної ціни в API (секунди epoch, 0 - невідомо),
+    fetched_at і stale_streak - коли предмет востаннє завантажували з API і
+    скільки завантажень поспіль API не мав для нього новіших даних.
+
+    Для сумісності таблиця поводиться як словник тільки для читання
+    {item_id: {city: {price_type: price, price_type_date: date}}}.
+    """
+
+    def __init__(self, item_ids: Sequence[str], cities: Sequence[str], values: np.ndarray,
+                 price_types: Sequence[str] = PRICE_TYPES, dates: Optional[np.ndarray] = None,
+                 fetched_at: Optional[np.ndarray] = None, stale_streak: Optional[np.ndarray] = None,
+                 derived: Optional[Dict[str, np.ndarray]] = None, item_index: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            item_ids: ID предметів (рядки таблиці)
+            cities: Назви міст (стовпці таблиці)
+            values: Масив цін [предмет, місто, тип ціни]
+            price_types: Назви типів цін (третій вимір)
+            dates: Час спостереження цін [предмет, місто, тип ціни]
+            fetched_at: Час останнього завантаження кожного предмета (секунди epoch)
+            stale_streak: Кількість завантажень поспіль без нових даних
+            derived: Готові mask, source, any_source, resolved, any_resolved (напр. зі знімка
+                у спільній пам'яті) - тоді запасні міста не перераховуються
+            item_index: Готовий індекс {item_id: рядок} для тих самих item_ids (з попереднього знімка)
+        """
+        self.item_ids = list(item_ids)
+        self.cities = list(cities)
+        self.price_types = tuple(price_types)
+        self.values = values
+        self.dates = dates if dates is not None else np.zeros(values.shape, dtype=np.int64)
+        self.fetched_at = fetched_at if fetched_at is not None else np.zeros(len(self.item_ids))
+        self.stale_streak = stale_streak if stale_streak is not None else np.zeros(len(self.item_ids), dtype=np.int16)
+
+        self.item_index = item_index if item_index is not None else dict(zip(self.item_ids, range(len(self.item_ids))))
+        # Відбиток списку item_ids (заповнює price_store), щоб наступний знімок міг перевикористати індекс
+        self.item_ids_digest: Optional[str] = None
+        self.city_index = {city: j for j, city in enumerate(self.cities)}
+        self.price_type_index = {price_type: k for k, price_type in enumerate(self.price_types)}
+
+        # Порядок пошуку запасного міста: спочатку пріоритетні, потім решта
+        priority = [self.city_index[c] for c in PRIORITY_CITIES if c in self.city_index]
+        self._fallback_order = priority + [j for j in range(len(self.cities)) if j not in priority]
+        if derived is None:
+            self.mask = values > 0
+            self._resolve_fallbacks()
+        else:
+            for name in DERIVED_ARRAYS:
+                setattr(self, name, derived[name])
+
+    def _resolve_fallbacks(self):
+        """Один раз визначає місто-джерело ціни для кожної клітинки [предмет, місто, тип ціни]"""
+        n_items, n_cities, n_types = self.values.shape
+        source = np.full((n_items, n_cities, n_types), -1, dtype=np.int16)
+        # Для невідомого міста - перше місто з ціною в порядку пріоритету
+        any_source = np.full((n_items, n_types), -1, dtype=np.int16)
+
+        for j in reversed(self._fallback_order):
+            any_source[self.mask[:, j, :]] = j
+        for j in range(n_cities):
+            unresolved = ~self.mask[:, j, :]
+            column = np.where(self.mask[:, j, :], j, -1).astype(np.int16)
+            for fallback in self._fallback_order:
+                if fallback == j:
+                    continue
+                hit = unresolved & self.mask[:, fallback, :]
+                column[hit] = fallback
+                unresolved &= ~hit
+            source[:, j, :] = column
+
+        self.source = source
+        self.any_source = any_source
+        self.resolved = self._gather(source)
+        self.any_resolved = self._gather(any_source[:, None, :])[:, 0, :]
+
+    def _gather(self, source: np.ndarray) -> np.ndarray:
+        """Вибирає ціни за індексами міст-джерел (-1 -> 0.0)"""
+        index = np.clip(source, 0, None).astype(np.intp)
+        picked = np.take_along_axis(self.values, index, axis=1) if self.values.size else np.zeros(source.shape)
+        return np.where(source >= 0, picked, 0.0)
+
+    @classmethod
+    def from_prices(cls, prices: Dict, price_types: Sequence[str] = PRICE_TYPES,
+                    item_meta: Optional[Dict] = None) -> "PriceTable":
+        """
+        Будує таблицю зі словника {item_id: {city: {prices...}}}
+
+        Args:
+            prices: Словник з цінами (поля *_date з API зберігаються як час спостереження)
+            price_types: Типи цін
+            item_meta: {item_id: {'fetched_at': секунди epoch, 'stale_streak': n}}
+        """
+        if isinstance(prices, PriceTable):
+            return prices
+
+        item_ids = [item_id for item_id, item_data in prices.items() if isinstance(item_data, dict)]
+        # Канонічні міста завжди присутні, невідомі додаються в кінець
+        cities: List[str] = list(CITIES)
+        for item_id in item_ids:
+            for city in prices[item_id]:
+                city = normalize_city(city)
+                if city not in cities:
+                    cities.append(city)
+        city_index = {city: j for j, city in enumerate(cities)}
+
+        values = np.zeros((len(item_ids), len(cities), len(price_types)))
+        dates = np.zeros(values.shape, dtype=np.int64)
+        for i, item_id in enumerate(item_ids):
+            for city, city_data in prices[item_id].items():
+                if not isinstance(city_data, dict):
+                    continue
+                j = city_index[normalize_city(city)]
+                for k, price_type in enumerate(price_types):
+                    price = city_data.get(price_type, 0) or 0
+                    # Дублікати на кшталт "FortSterling"/"Fort Sterling": пізніший рядок з ціною > 0
+                    # перезаписує попередній, а нульова ціна дубліката наявну ціну не затирає
+                    if price > 0:
+                        values[i, j, k] = price
+                        dates[i, j, k] = parse_api_date(city_data.get(price_type + DATE_SUFFIX))
+
+        item_meta = item_meta or {}
+        fetched_at = np.array([float(item_meta.get(item_id, {}).get('fetched_at', 0)) for item_id in item_ids])
+        stale_streak = np.array([int(item_meta.get(item_id, {}).get('stale_streak', 0)) for item_id in item_ids],
+                                dtype=np.int16)
+
+        return cls(item_ids, cities, values, price_types, dates, fetched_at, stale_streak)
+
+    def to_dict(self) -> Dict:
+        """Перетворює таблицю назад у словник {item_id: {city: {prices...}}}"""
+        return {item_id: self[item_id] for item_id in self.item_ids}
+
+    def item_meta(self) -> Dict:
+        """Метадані завантаження предметів у форматі параметра item_meta з from_prices"""
+        return {
+            item_id: {'fetched_at': float(self.fetched_at[i]), 'stale_streak': int(self.stale_streak[i])}
+            for i, item_id in enumerate(self.item_ids)
+        }
+
+    def observed_at(self) -> np.ndarray:
+        """Найновіший час спостереження ціни для кожного предмета [предмет] (0 - невідомо)"""
+        if not self.dates.size:
+            return np.zeros(len(self.item_ids), dtype=np.int64)
+        return self.dates.max(axis=(1, 2))
+
+    def lookup(self, item_id: str, city: str, price_type: str = "sell_price_min") -> Tuple[float, Optional[str]]:
+        """
+        Шукає ціну предмета в місті, а якщо її немає - в запасному місті
+
+        Returns:
+            Кортеж (ціна, місто, з якого взято ціну) або (0.0, None), якщо не знайдено
+        """
+        i = self.item_index.get(item_id)
+        if i is None:
+            return 0.0, None
+        k = self.price_type_index[price_type]
+
+        j = self.city_index.get(city)
+        if j is None:
+            j = self.city_index.get(normalize_city(city))
+        if j is None:
+            source = self.any_source.item(i, k)
+            price = self.any_resolved.item(i, k)
+        else:
+            source = self.source.item(i, j, k)
+            price = self.resolved.item(i, j, k)
+
+        if source < 0:
+            return 0.0, None
+        return price, self.cities[source]
+
+    def resolved_matrix(self, item_ids: Sequence[str], cities: Sequence[str],
+                        price_type: str = "sell_price_min", quality: int = 1) -> np.ndarray:
+        """
+        Повертає матрицю цін [предмет, місто] з урахуванням запасних міст
+
+        Невідомі предмети (і якості без цін) мають ціну 0.
+        """
+        k = self.price_type_index[price_type]
+        matrix = np.zeros((len(item_ids), len(cities)))
+        rows = np.array([self.item_index.get(price_key(item_id, quality), -1) for item_id in item_ids], dtype=np.intp)
+        known = rows >= 0
+        for c, city in enumerate(cities):
+            j = self.city_index.get(normalize_city(city))
+            column = self.any_resolved[:, k] if j is None else self.resolved[:, j, k]
+            matrix[known, c] = column[rows[known]]
+        return matrix
+
+    def direct_matrix(self, item_ids: Sequence[str], cities: Sequence[str],
+                      price_type: str = "sell_price_min", quality: int = 1) -> np.ndarray:
+        """
+        Повертає матрицю цін [предмет, місто] лише з власних цін міст (без запасних міст)
+
+        Клітинки без ціни в самому місті (і невідомі предмети) мають ціну 0.
+        """
+        k = self.price_type_index[price_type]
+        rows = np.array([self.item_index.get(price_key(item_id, quality), -1) for item_id in item_ids], dtype=np.intp)
+        columns = np.array([self.city_index.get(normalize_city(city), -1) for city in cities], dtype=np.intp)
+        # Один вибір по рядках і стовпцях; невідомі предмети і міста обнуляються маскою
+        matrix = self.values[rows[:, None], columns[None, :], k]
+        return np.where((rows >= 0)[:, None] & (columns >= 0)[None, :], matrix, 0.0)
+
+    # --- Інтерфейс словника тільки для читання ---
+
+    def __getitem__(self, item_id: str) -> Dict:
+        i = self.item_index[item_id]
+        row = self.values[i]
+        row_dates = self.dates[i]
+        item_data = {}
+        for j, city in enumerate(self.cities):
+            city_data = {}
+            for k, price_type in enumerate(self.price_types):
+                price = row[j, k]
+                city_data[price_type] = int(price) if price.is_integer() else float(price)
+                city_data[price_type + DATE_SUFFIX] = format_api_date(int(row_dates[j, k]))
+            item_data[city] = city_data
+        return item_data
+
+    def __contains__(self, item_id) -> bool:
+        return item_id in self.item_index
+
+    def __iter__(self):
+        return iter(self.item_ids)
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
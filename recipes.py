@@ -190,4 +190,57 @@ RECIPES={
 
 }
 
-}
\ No newline at end of file
+}
+# Проміжні інгредієнти, які можна скрафтити самому замість купівлі на ринку
+# (вирішує crafting.py). Масло готується з молока, самогон - з овочів.
+# Магічний екстракт (T1_ALCHEMY_EXTRACT_LEVEL1) тут не описано - він завжди купується.
+INTERMEDIATE_RECIPES={
+
+"T4_BUTTER":{
+    "name": "Козье масло",
+    "yield": 1,
+    "ingredients":{
+        "T4_MILK": 1
+    }
+},
+
+"T6_BUTTER":{
+    "name": "Овечье масло",
+    "yield": 1,
+    "ingredients":{
+        "T6_MILK": 1
+    }
+},
+
+"T8_BUTTER":{
+    "name": "Коровье масло",
+    "yield": 1,
+    "ingredients":{
+        "T8_MILK": 1
+    }
+},
+
+"T6_ALCOHOL":{
+    "name": "Картофельный самогон",
+    "yield": 1,
+    "ingredients":{
+        "T6_POTATO": 1
+    }
+},
+
+"T7_ALCOHOL":{
+    "name": "Кукурузный самогон",
+    "yield": 1,
+    "ingredients":{
+        "T7_CORN": 1
+    }
+},
+
+"T8_ALCOHOL":{
+    "name": "Тыквенный самогон",
+    "yield": 1,
+    "ingredients":{
+        "T8_PUMPKIN": 1
+    }
+},
+}
@@ -0,0 +1,61 @@
+from typing import Dict
+from calculator import default_return_rate
+from cities import CITIES, normalize_city
+from variants import QUALITIES
+
+def parse_flag(value) -> bool:
+    """Булевий параметр: true/1/on з JSON, форми або CSV"""
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'on', 'yes')
+    return bool(value)
+
+def parse_scenario(data) -> Dict:
+    """
+    Перетворює параметри сценарію (JSON, форма або рядок CSV) в аргументи розрахунку
+    
+    Returns:
+        Словник з craft_city, sell_city і аргументами PotionCalculator.calculate_craft_cost
+    
+    Raises:
+        ValueError: якщо параметр відсутній або має невірне значення
+    """
+    potion_id = data.get('potion_id')
+    craft_city = normalize_city(data.get('craft_city') or 'Caerleon')
+    sell_city = normalize_city(data.get('sell_city') or craft_city)
+    if not potion_id:
+        raise ValueError("не вказано potion_id")
+    for city in (craft_city, sell_city):
+        if city not in CITIES:
+            raise ValueError(f"невідоме місто: {city}")
+    quantity = data.get('quantity')
+    quantity = 1 if quantity is None or quantity == '' else int(quantity)
+    if quantity <= 0:
+        raise ValueError("кількість повинна бути більше 0")
+    quality = data.get('quality')
+    quality = 1 if quality is None or quality == '' else int(quality)
+    if quality not in QUALITIES:
+        raise ValueError("якість повинна бути від 1 до 5")
+    
+    # return_rate у відсотках, як у формі; без нього - базовий відсоток міста крафту
+    return_rate_pct = data.get('return_rate')
+    if return_rate_pct is None or return_rate_pct == '':
+        return_rate = default_return_rate(craft_city)
+    else:
+        return_rate = float(return_rate_pct) / 100.0
+    
+    return {
+        'craft_city': craft_city,
+        'sell_city': sell_city,
+        'potion_id': potion_id,
+        'quantity': quantity,
+        'machine_cost_per_100': float(data.get('machine_cost', 0) or 0),
+        'focus_bonus': parse_flag(data.get('focus_bonus', False)),
+        'extra_bonus_pct': float(data.get('extra_bonus_pct', 0) or 0),
+        'return_rate': return_rate,
+        'use_buy_price': parse_flag(data.get('use_buy_price', False)),
+        'premium': parse_flag(data.get('premium', False)),
+        'craft_intermediates': parse_flag(data.get('craft_intermediates', False)),
+        'quality': quality,
+        'source_anywhere': parse_flag(data.get('source_anywhere', False)),
+        'transport_cost': float(data.get('transport_cost', 0) or 0),
+    }
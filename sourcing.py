@@ -0,0 +1,201 @@
+import math
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from recipes import RECIPES
+from materials import MATERIALS_IDS
+from price_table import PriceTable
+from cities import CITIES, normalize_city
+
+def recipe_materials(recipes: Dict = RECIPES) -> List[str]:
+    """Матеріали рецептів у порядку першої появи"""
+    material_ids = []
+    for recipe in recipes.values():
+        for ingredient_id in recipe['ingredients']:
+            if ingredient_id not in material_ids:
+                material_ids.append(ingredient_id)
+    return material_ids
+
+# Інгредієнти всіх рецептів (порядок рядків IngredientSourcing за замовчуванням)
+RECIPE_MATERIALS = tuple(recipe_materials())
+
+class IngredientSourcing:
+    """
+    Де купувати кожен інгредієнт: найдешевше місто з урахуванням перевезення
+
+    Для кожного матеріалу і кожного міста крафту береться argmin по містах
+    купівлі від (власна ціна міста + вартість перевезення одиниці до міста крафту).
+    Весь розрахунок - один векторний мінімум по масиву [матеріал, місто купівлі,
+    місто крафту] при створенні, тож далі ціна інгредієнта - це звернення до
+    масиву, а вартість інгредієнтів усього каталогу - одне матричне множення.
+    Об'єкт прив'язаний до однієї таблиці цін (див. get_sourcing).
+
+    Attributes:
+        material_ids: Матеріали (рядки)
+        cities: Міста купівлі і крафту (стовпці)
+        market_price: Власні ціни міст [M, C] (0 - у місті немає ціни)
+        transport: Вартість перевезення одиниці [місто купівлі, місто крафту]
+        unit_cost: Найменша ціна з перевезенням [M, місто крафту] (0 - ціни немає в жодному місті)
+        source: Індекс міста купівлі [M, місто крафту] (-1 - ціни немає)
+        any_source, any_cost: Найдешевше місто і ціна без перевезення [M] (для невідомого міста крафту)
+    """
+
+    def __init__(self, prices: Dict, material_ids: Optional[Sequence[str]] = None,
+                 cities: Sequence[str] = CITIES, use_buy_price: bool = False, transport_cost: float = 0.0,
+                 transport_costs: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            prices: Таблиця або словник з цінами
+            material_ids: Матеріали (за замовчуванням - усі інгредієнти RECIPES)
+            cities: Міста, де можна купувати і крафтити
+            use_buy_price: Ціна покупки (buy_price_max) замість sell_price_min
+            transport_cost: Вартість перевезення одиниці матеріалу з іншого міста
+            transport_costs: {місто купівлі: вартість перевезення одиниці} замість transport_cost
+        """
+        table = PriceTable.from_prices(prices)
+        self.material_ids = list(material_ids if material_ids is not None else RECIPE_MATERIALS)
+        self.material_index = {material: i for i, material in enumerate(self.material_ids)}
+        self.cities = [normalize_city(city) for city in cities]
+        self.city_index = {city: j for j, city in enumerate(self.cities)}
+        price_type = "buy_price_max" if use_buy_price else "sell_price_min"
+        self.market_price = table.direct_matrix(self.material_ids, self.cities, price_type)
+
+        per_city = np.array([
+            float((transport_costs or {}).get(city, transport_cost)) for city in self.cities
+        ])
+        # Купівля в самому місті крафту нічого не коштує на перевезення
+        self.transport = np.where(np.eye(len(self.cities), dtype=bool), 0.0, per_city[:, None])
+
+        # [M, місто купівлі, місто крафту]
+        landed = np.where(self.market_price[:, :, None] > 0,
+                          self.market_price[:, :, None] + self.transport[None, :, :], np.inf)
+        source = landed.argmin(axis=1)
+        unit_cost = np.take_along_axis(landed, source[:, None, :], axis=1)[:, 0, :]
+        available = np.isfinite(unit_cost)
+        self.source = np.where(available, source, -1)
+        self.unit_cost = np.where(available, unit_cost, 0.0)
+
+        # Для невідомого міста крафту - найдешевше місто без вартості перевезення
+        listed = np.where(self.market_price > 0, self.market_price, np.inf)
+        any_source = listed.argmin(axis=1)
+        any_cost = np.take_along_axis(listed, any_source[:, None], axis=1)[:, 0]
+        any_available = np.isfinite(any_cost)
+        self.any_source = np.where(any_available, any_source, -1)
+        self.any_cost = np.where(any_available, any_cost, 0.0)
+        self._no_transport = np.zeros(len(self.cities))
+
+    def _column(self, craft_city: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Вибір закупівлі для міста крафту
+
+        Returns:
+            Кортеж (місто купівлі [M], ціна з перевезенням [M], перевезення з кожного міста [C],
+            власні ціни міста крафту [M]); невідоме місто - найдешевше місто без перевезення
+        """
+        j = self.city_index.get(normalize_city(craft_city))
+        if j is None:
+            return self.any_source, self.any_cost, self._no_transport, np.zeros(len(self.material_ids))
+        return self.source[:, j], self.unit_cost[:, j], self.transport[:, j], self.market_price[:, j]
+
+    def unit_price(self, material_id: str, craft_city: str) -> Tuple[float, Optional[str], float]:
+        """
+        Returns:
+            Кортеж (ціна з перевезенням, місто купівлі або None, вартість перевезення одиниці)
+        """
+        i = self.material_index.get(material_id)
+        if i is None:
+            return 0.0, None, 0.0
+        source, unit_cost, transport, _ = self._column(craft_city)
+        s = source[i]
+        if s < 0:
+            return 0.0, None, 0.0
+        return float(unit_cost[i]), self.cities[s], float(transport[s])
+
+    def cost_matrix(self, material_ids: Sequence[str], cities: Sequence[str]) -> np.ndarray:
+        """
+        Ціни з перевезенням [матеріал, місто крафту] у потрібному порядку (для OpportunityMatrix)
+
+        Матеріали і міста, яких немає в розрахунку, мають ціну 0.
+        """
+        rows = np.array([self.material_index.get(material, -1) for material in material_ids], dtype=np.intp)
+        columns = np.array([self.city_index.get(normalize_city(city), -1) for city in cities], dtype=np.intp)
+        matrix = self.unit_cost[rows[:, None], columns[None, :]]
+        return np.where((rows >= 0)[:, None] & (columns >= 0)[None, :], matrix, 0.0)
+
+    def catalog(self, craft_city: str) -> List[Dict]:
+        """Найвигідніше місто купівлі кожного матеріалу для міста крафту"""
+        source, unit_cost, transport, local_price = self._column(craft_city)
+        rows = []
+        for i, material in enumerate(self.material_ids):
+            s = source[i]
+            local = local_price[i]
+            rows.append({
+                'material_id': material,
+                'name': MATERIALS_IDS.get(material, material),
+                'buy_city': self.cities[s] if s >= 0 else None,
+                'market_price': float(self.market_price[i, s]) if s >= 0 else 0.0,
+                'transport_cost': float(transport[s]) if s >= 0 else 0.0,
+                'unit_cost': float(unit_cost[i]),
+                'local_price': float(local),
+                'saving_per_unit': float(local - unit_cost[i]) if local > 0 and s >= 0 else 0.0,
+            })
+        return rows
+
+    def shopping_list(self, quantities: Dict[str, float], craft_city: str) -> Dict[str, List[Dict]]:
+        """
+        Список покупок по містах купівлі
+
+        Args:
+            quantities: {material_id: скільки одиниць потрібно}
+            craft_city: Місто крафту, куди везуться матеріали (невідоме - без перевезення)
+
+        Returns:
+            {місто купівлі: [{material_id, name, quantity, unit_price, transport_cost, total_cost}]};
+            матеріали без ціни в жодному місті пропускаються
+        """
+        source, _, transport_from, _ = self._column(craft_city)
+        shopping: Dict[str, List[Dict]] = {}
+        for material, quantity in quantities.items():
+            quantity = math.ceil(quantity - 1e-9)
+            i = self.material_index.get(material)
+            if quantity <= 0 or i is None or source[i] < 0:
+                continue
+            s = source[i]
+            unit_price = float(self.market_price[i, s])
+            transport = float(transport_from[s])
+            shopping.setdefault(self.cities[s], []).append({
+                'material_id': material,
+                'name': MATERIALS_IDS.get(material, material),
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'transport_cost': transport,
+                'total_cost': (unit_price + transport) * quantity,
+            })
+        return shopping
+
+# Розрахунки останньої таблиці цін: (таблиця, {(use_buy_price, transport_cost): IngredientSourcing})
+_sourcing = (None, {})
+_sourcing_lock = threading.Lock()
+
+def get_sourcing(prices: Dict, use_buy_price: bool = False, transport_cost: float = 0.0) -> IngredientSourcing:
+    """
+    Спільний розрахунок закупівлі для таблиці цін
+
+    Поки передається той самий знімок цін, розрахунок для тих самих налаштувань
+    перевикористовується між запитами; новий знімок скидає кеш.
+    """
+    global _sourcing
+    key = (use_buy_price, float(transport_cost))
+    with _sourcing_lock:
+        cached_prices, sourcings = _sourcing
+        if prices is not cached_prices:
+            sourcings = {}
+            _sourcing = (prices, sourcings)
+        sourcing = sourcings.get(key)
+        if sourcing is None:
+            # Кеш для різних вартостей перевезення не росте без меж
+            if len(sourcings) >= 32:
+                sourcings.clear()
+            sourcing = sourcings[key] = IngredientSourcing(prices, use_buy_price=use_buy_price,
+                                                           transport_cost=transport_cost)
+        return sourcing
@@ -0,0 +1,171 @@
+import numpy as np
+from typing import Dict, Optional, Sequence
+from recipes import RECIPES
+from calculator import (
+    PotionCalculator,
+    NUTRITION_RATIO,
+    SALES_TAX_RATE,
+    LISTING_FEE_RATE,
+)
+from get_prices import find_item_price
+
+# Осі сітки у порядку вимірів результату
+SWEEP_AXES = ('focus_bonus', 'premium', 'return_rate', 'extra_bonus_pct', 'machine_cost')
+# Обмеження розміру сітки (кількість точок) для одного розрахунку
+MAX_SWEEP_POINTS = 2_000_000
+
+def grid_axis(start: float, stop: float, steps: int) -> np.ndarray:
+    """
+    Рівномірна вісь сітки від start до stop включно
+
+    Raises:
+        ValueError: якщо steps < 1
+    """
+    steps = int(steps)
+    if steps < 1:
+        raise ValueError("кількість кроків повинна бути не менше 1")
+    if steps == 1:
+        return np.array([float(start)])
+    return np.linspace(float(start), float(stop), steps)
+
+def bool_options(value) -> tuple:
+    """Варіанти булевого параметра: 'both' - обидва, інакше одне значення"""
+    if value is None or str(value).strip().lower() in ('', 'both', 'all'):
+        return (False, True)
+    if isinstance(value, bool):
+        return (value,)
+    return (str(value).strip().lower() in ('1', 'true', 'on', 'yes', 'так'),)
+
+def sweep_parameters(
+    calculator: PotionCalculator,
+    potion_id: str,
+    return_rates: Sequence[float],
+    machine_costs: Sequence[float] = (0.0,),
+    extra_bonus_pcts: Sequence[float] = (0.0,),
+    focus_options: Sequence[bool] = (False, True),
+    premium_options: Sequence[bool] = (False, True),
+    use_buy_price: bool = False,
+    craft_intermediates: bool = False
+) -> Optional[Dict]:
+    """
+    Розраховує прибуток і ROI зілля на сітці налаштувань станку одним проходом NumPy
+
+    Ціни інгредієнтів і зілля беруться один раз, далі всі комбінації
+    обчислюються тими ж формулами, що й у PotionCalculator.calculate_craft_cost.
+
+    Args:
+        calculator: Калькулятор з цінами та містами крафту/продажу
+        potion_id: ID зілля
+        return_rates: Відсотки повернення (0.0 - 1.0)
+        machine_costs: Вартість станку за 100 їжі
+        extra_bonus_pcts: Додатковий бонус у відсотках
+        focus_options: Варіанти використання фокусу
+        premium_options: Варіанти преміум акаунта
+        use_buy_price: Використовувати ціну покупки матеріалів
+        craft_intermediates: Крафтити проміжні інгредієнти, якщо це дешевше
+
+    Raises:
+        ValueError: якщо сітка більша за MAX_SWEEP_POINTS
+
+    Returns:
+        Словник з осями сітки, масивами profit_per_potion і roi_percent
+        [фокус, преміум, повернення, бонус, станок] і межами беззбитковості:
+        break_even_machine_cost [фокус, преміум, повернення, бонус] - максимальна
+        вартість станку, break_even_return_rate [фокус, преміум, бонус, станок] -
+        мінімальний відсоток повернення (NaN - недосяжно в межах 0-100%).
+        None, якщо зілля не знайдено.
+    """
+    if potion_id not in RECIPES:
+        return None
+
+    recipe = RECIPES[potion_id]
+    ingredient_cost_base, _ = calculator.calculate_ingredient_cost(potion_id, use_buy_price, craft_intermediates)
+    nutrition_cost = calculator._get_item_value(potion_id) * NUTRITION_RATIO
+    effective_yield = recipe.get('yield', 1) * (1.0 + calculator.brecilien_craft_bonus)
+    sell_price, _ = find_item_price(potion_id, calculator.prices, calculator.sell_city, "sell_price_min")
+
+    focus = np.asarray(focus_options, dtype=bool)
+    premium = np.asarray(premium_options, dtype=bool)
+    rr = np.asarray(return_rates, dtype=float)
+    extra = np.asarray(extra_bonus_pcts, dtype=float)
+    machine = np.asarray(machine_costs, dtype=float)
+    points = len(focus) * len(premium) * len(rr) * len(extra) * len(machine)
+    if points > MAX_SWEEP_POINTS:
+        raise ValueError(f"сітка занадто велика: {points} точок (не більше {MAX_SWEEP_POINTS})")
+
+    # Виміри: [F, P, R, E, M]
+    focus_mult = np.where(focus, 0.8, 1.0)[:, None, None, None, None]
+    extra_mult = np.maximum(0.0, 1.0 - extra / 100.0)[None, None, None, :, None]
+    ingredient_cost = (ingredient_cost_base * (1 - rr))[None, None, :, None, None]
+    machine_cost = (nutrition_cost / 100.0 * machine)[None, None, None, None, :]
+
+    cost_per_potion = (ingredient_cost + machine_cost) * focus_mult * extra_mult / effective_yield
+    sales_tax = SALES_TAX_RATE * np.where(premium, 0.5, 1.0)
+    sell_price_after_tax = (sell_price * (1 - sales_tax - LISTING_FEE_RATE))[None, :, None, None, None]
+
+    profit = sell_price_after_tax - cost_per_potion
+    cost = np.broadcast_to(cost_per_potion, profit.shape)
+    roi = np.divide(profit * 100, cost, out=np.zeros(profit.shape), where=cost > 0)
+
+    # Межі беззбитковості: прибуток = 0 - лінійне рівняння відносно станку і повернення
+    cost_budget = sell_price_after_tax * effective_yield / (focus_mult * extra_mult)  # [F, P, 1, E, 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        break_even_machine = (cost_budget[..., 0] - ingredient_cost[..., 0]) * 100.0 / nutrition_cost
+        break_even_machine = np.where(break_even_machine >= 0, break_even_machine, np.nan)
+        break_even_rr = 1.0 - (cost_budget - machine_cost) / ingredient_cost_base
+        break_even_rr = np.where(break_even_rr <= 0, 0.0, break_even_rr)
+        break_even_rr = np.where(break_even_rr <= 1, break_even_rr, np.nan)[:, :, 0, :, :]
+
+    return {
+        'potion_id': potion_id,
+        'potion_name': recipe['name'],
+        'craft_city': calculator.craft_city,
+        'sell_city': calculator.sell_city,
+        'sell_price': sell_price,
+        'axes': {
+            'focus_bonus': focus,
+            'premium': premium,
+            'return_rate': rr,
+            'extra_bonus_pct': extra,
+            'machine_cost': machine,
+        },
+        'profit_per_potion': profit,
+        'roi_percent': roi,
+        'break_even_machine_cost': np.broadcast_to(
+            break_even_machine, (len(focus), len(premium), len(rr), len(extra))
+        ),
+        'break_even_return_rate': np.broadcast_to(
+            break_even_rr, (len(focus), len(premium), len(extra), len(machine))
+        ),
+    }
+
+def best_settings(result: Dict) -> Dict:
+    """Найприбутковіша точка сітки"""
+    profit = result['profit_per_potion']
+    index = np.unravel_index(np.argmax(profit), profit.shape)
+    best = {axis: result['axes'][axis][i].item() for axis, i in zip(SWEEP_AXES, index)}
+    best['profit_per_potion'] = float(profit[index])
+    best['roi_percent'] = float(result['roi_percent'][index])
+    return best
+
+def sweep_to_json(result: Dict, decimals: int = 2) -> Dict:
+    """Перетворює результат sweep_parameters у вкладені списки для JSON (NaN -> None)"""
+    def to_list(array, digits=decimals):
+        array = np.round(np.asarray(array, dtype=float), digits)
+        return np.where(np.isnan(array), None, array).tolist()
+
+    return {
+        'potion_id': result['potion_id'],
+        'potion_name': result['potion_name'],
+        'craft_city': result['craft_city'],
+        'sell_city': result['sell_city'],
+        'sell_price': result['sell_price'],
+        'dims': list(SWEEP_AXES),
+        'axes': {axis: values.tolist() for axis, values in result['axes'].items()},
+        'best': best_settings(result),
+        'profit_per_potion': to_list(result['profit_per_potion']),
+        'roi_percent': to_list(result['roi_percent']),
+        'break_even_machine_cost': to_list(result['break_even_machine_cost']),
+        # Відсоток повернення - частка 0.0 - 1.0, тож потрібно більше знаків
+        'break_even_return_rate': to_list(result['break_even_return_rate'], decimals + 2),
+    }
@@ -0,0 +1,101 @@
+import csv
+import json
+import multiprocessing
+import batch
+from calculator import PotionCalculator
+from cities import CITIES
+from price_table import PriceTable
+from recipes import RECIPES
+from volumes import MarketVolumes
+
+POTION_IDS = ["T6_POTION_HEAL", "T8_POTION_GATHER", "T5_POTION_STONESKIN"]
+
+def sample_prices() -> PriceTable:
+    """Ціни всіх матеріалів і зілль вибраних рецептів у всіх містах"""
+    materials = list(dict.fromkeys(i for potion_id in POTION_IDS for i in RECIPES[potion_id]['ingredients']))
+    prices = {}
+    for n, item_id in enumerate(materials + POTION_IDS):
+        prices[item_id] = {
+            city: {'sell_price_min': (100 * (n + 1) + 37 * j) * (40 if item_id in POTION_IDS else 1),
+                   'buy_price_max': 100 * (n + 1)}
+            for j, city in enumerate(CITIES)
+        }
+    return PriceTable.from_prices(prices)
+
+def failing_calculation(monkeypatch, failing_potion="T8_POTION_GATHER"):
+    """calculate_craft_cost падає з винятком для одного зілля (як неочікувана помилка в розрахунку)"""
+    original = PotionCalculator.calculate_craft_cost
+
+    def calculate(self, potion_id, *args, **kwargs):
+        if potion_id == failing_potion:
+            raise ZeroDivisionError("division by zero")
+        return original(self, potion_id, *args, **kwargs)
+
+    monkeypatch.setattr(PotionCalculator, "calculate_craft_cost", calculate)
+    monkeypatch.setattr(batch, "get_volumes", lambda: MarketVolumes([]))
+
+SCENARIOS = [
+    {'potion_id': "T6_POTION_HEAL", 'craft_city': "Lymhurst", 'sell_city': "Caerleon"},
+    {'potion_id': "T8_POTION_GATHER", 'craft_city': "Lymhurst"},
+    "not a scenario",
+    {'potion_id': "T5_POTION_STONESKIN", 'craft_city': "Atlantis"},
+    {'potion_id': "T5_POTION_STONESKIN", 'craft_city': "Martlock", 'quantity': 10},
+    {'potion_id': "T9_NOT_A_POTION", 'craft_city': "Martlock"},
+]
+
+def check_isolated(rows):
+    """Помилки не зупиняють пакет: кожен сценарій має свій рядок у вхідному порядку"""
+    assert [row['index'] for row in rows] == list(range(len(SCENARIOS)))
+    assert rows[0]['error'] == "" and rows[0]['profit_per_potion'] is not None
+    assert rows[1]['error'].startswith("Помилка розрахунку") and rows[1]['potion_id'] == "T8_POTION_GATHER"
+    assert rows[2]['error'].startswith("Невірний параметр")
+    assert "невідоме місто" in rows[3]['error']
+    assert rows[4]['error'] == "" and rows[4]['quantity'] == 10
+    assert "не знайдено" in rows[5]['error']
+    assert all(set(row) == set(batch.RESULT_COLUMNS) for row in rows)
+
+def test_failing_scenario_isolated_in_process(monkeypatch):
+    """Виняток у розрахунку одного сценарію стає рядком з error"""
+    failing_calculation(monkeypatch)
+    check_isolated(list(batch.run_batch(SCENARIOS, sample_prices(), processes=1, chunk_size=2)))
+
+def test_failing_scenario_isolated_in_pool(monkeypatch):
+    """Так само в пулі процесів: виняток у воркері не перериває Pool.imap"""
+    # Підмінений розрахунок потрапляє у воркери лише через fork
+    if multiprocessing.get_start_method() != "fork":
+        return
+    failing_calculation(monkeypatch)
+    check_isolated(list(batch.run_batch(SCENARIOS, sample_prices(), processes=2, chunk_size=2)))
+
+def test_grid_scenarios_cover_all_combinations():
+    """Сітка розгортається ліниво у всі комбінації осей"""
+    grid = list(batch.grid_scenarios(["T6_POTION_HEAL", "T5_POTION_STONESKIN"], ["Lymhurst", "Martlock"],
+                                     focus_options=[False, True]))
+    assert len(grid) == 8
+    assert len({json.dumps(scenario, sort_keys=True) for scenario in grid}) == 8
+
+def test_sort_results_with_limit_keeps_errors_last():
+    """З limit - найкращі рядки за ключем, а рядки з помилками лише заповнюють залишок"""
+    rows = [{'index': i, 'profit_per_potion': profit, 'error': ''} for i, profit in enumerate([5, 50, 20, 40])]
+    rows.insert(2, {'index': 9, 'profit_per_potion': None, 'error': 'помилка'})
+    assert [row['index'] for row in batch.sort_results(rows, limit=2)] == [1, 3]
+    assert [row['index'] for row in batch.sort_results(rows, limit=6)] == [1, 3, 2, 0, 9]
+    assert [row['index'] for row in batch.sort_results(iter(rows))] == [1, 3, 2, 0, 9]
+
+def test_write_results_formats(tmp_path, monkeypatch):
+    """CSV з заголовком RESULT_COLUMNS, NDJSON і JSON з тими самими рядками"""
+    monkeypatch.setattr(batch, "get_volumes", lambda: MarketVolumes([]))
+    rows = list(batch.run_batch(SCENARIOS[:2], sample_prices(), processes=1))
+    for name in ("out.csv", "out.ndjson", "out.json"):
+        batch.write_results(iter(rows), str(tmp_path / name))
+
+    with open(tmp_path / "out.csv", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        assert tuple(reader.fieldnames) == batch.RESULT_COLUMNS
+        assert [row['potion_id'] for row in reader] == ["T6_POTION_HEAL", "T8_POTION_GATHER"]
+    ndjson = [json.loads(line) for line in (tmp_path / "out.ndjson").read_text(encoding="utf-8").splitlines()]
+    assert ndjson == json.loads((tmp_path / "out.json").read_text(encoding="utf-8")) == rows
+
+if __name__ == '__main__':
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+import numpy as np
+from cities import CITIES
+from export import (EXPORT_COLUMNS, count_settings, iter_csv, iter_export_rows, iter_ndjson,
+                    parse_number_list, settings_grid)
+from opportunities import OpportunityMatrix
+from price_table import PriceTable
+from recipes import RECIPES
+
+POTION_IDS = ["T6_POTION_HEAL", "T5_POTION_STONESKIN"]
+RECIPE_SUBSET = {potion_id: RECIPES[potion_id] for potion_id in POTION_IDS}
+
+def sample_prices() -> PriceTable:
+    """Ціни всіх матеріалів і T6_POTION_HEAL; T5_POTION_STONESKIN не продається ніде"""
+    materials = list(dict.fromkeys(i for recipe in RECIPE_SUBSET.values() for i in recipe['ingredients']))
+    prices = {}
+    for n, item_id in enumerate(materials + ["T6_POTION_HEAL"]):
+        prices[item_id] = {
+            city: {'sell_price_min': (100 * (n + 1) + 37 * j) * (40 if item_id in POTION_IDS else 1)}
+            for j, city in enumerate(CITIES)
+        }
+    return PriceTable.from_prices(prices)
+
+def counting(items, pulled):
+    """Генератор, що запам'ятовує взяті з нього елементи"""
+    for item in items:
+        pulled.append(item)
+        yield item
+
+def test_rows_match_matrix():
+    """Рядок на кожну комбінацію з ціною продажу (зілля без ціни пропускається); значення - з compute"""
+    matrix = OpportunityMatrix(recipes=RECIPE_SUBSET, cities=CITIES)
+    prices = sample_prices()
+    settings = list(settings_grid(focus_options=[True], premium_options=[False], machine_costs=[200.0]))
+    rows = list(iter_export_rows(matrix, prices, settings))
+
+    assert len(rows) == len(CITIES) ** 2
+    assert {row['potion_id'] for row in rows} == {"T6_POTION_HEAL"}
+    assert all(tuple(row) == EXPORT_COLUMNS for row in rows)
+
+    result = matrix.compute(prices, machine_cost_per_100=200.0, focus_bonus=True)
+    for row in rows:
+        p = matrix.potion_ids.index(row['potion_id'])
+        c, s = matrix.cities.index(row['craft_city']), matrix.cities.index(row['sell_city'])
+        assert np.isclose(row['profit_per_potion'], result['profit_per_potion'][p, c, s])
+        assert row['focus_bonus'] is True and row['machine_cost'] == 200.0
+        assert row['return_rate'] == matrix.city_return_rates[c]
+
+def test_settings_computed_lazily():
+    """Наступна комбінація налаштувань рахується лише після віддачі рядків попередньої"""
+    matrix = OpportunityMatrix(recipes=RECIPE_SUBSET, cities=CITIES)
+    pulled = []
+    settings = counting(settings_grid(machine_costs=[0.0, 100.0, 200.0]), pulled)
+    rows = iter_export_rows(matrix, sample_prices(), settings)
+
+    next(rows)
+    assert len(pulled) == 1
+    assert sum(1 for _ in rows) > 0
+    assert len(pulled) == count_settings([False, True], [False, True], [0.0, 100.0, 200.0]) == 12
+
+def test_csv_streamed_in_chunks():
+    """CSV віддається шматками по chunk_rows рядків, не чекаючи кінця таблиці"""
+    rows = [dict.fromkeys(EXPORT_COLUMNS, i) for i in range(7)]
+    pulled = []
+    chunks = iter_csv(counting(rows, pulled), chunk_rows=3)
+
+    first = next(chunks)
+    assert len(pulled) == 2
+    assert first.splitlines()[0] == ",".join(EXPORT_COLUMNS)
+    rest = list(chunks)
+    assert len(rest) == 2
+
+    parsed = list(csv.DictReader(io.StringIO(first + "".join(rest))))
+    assert [row['potion_id'] for row in parsed] == [str(i) for i in range(7)]
+
+def test_ndjson_streamed_in_chunks():
+    """NDJSON - об'єкт на рядок, шматками по chunk_rows рядків"""
+    rows = [{'potion_id': f"P{i}", 'profit_per_potion': i * 1.5} for i in range(5)]
+    pulled = []
+    chunks = iter_ndjson(counting(rows, pulled), chunk_rows=2)
+
+    assert next(chunks).count("\n") == 2
+    assert len(pulled) == 2
+    lines = "".join(chunks).splitlines()
+    assert [json.loads(line) for line in lines] == rows[2:]
+
+def test_parse_number_list():
+    """Список через кому або з JSON; порожнє значення - значення за замовчуванням"""
+    assert parse_number_list("0, 150,300", (0.0,)) == [0.0, 150.0, 300.0]
+    assert parse_number_list([1, "2"], ()) == [1.0, 2.0]
+    assert parse_number_list("", (5.0,)) == [5.0]
+
+if __name__ == '__main__':
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,92 @@
+import threading
+from datetime import datetime, timedelta
+from history import PriceHistory
+from price_table import PriceTable
+
+T0 = datetime(2026, 1, 1, 12, 0)
+
+def table(prices: dict) -> PriceTable:
+    return PriceTable.from_prices({
+        item_id: {city: {'sell_price_min': price} for city, price in cities.items()}
+        for item_id, cities in prices.items()
+    })
+
+def row_count(history: PriceHistory, sql_table: str) -> int:
+    return history._conn.execute(f"SELECT COUNT(*) FROM {sql_table}").fetchone()[0]
+
+def test_only_changed_rows_written(tmp_path):
+    """Повторний знімок без змін нічого не пише, а зміна однієї ціни - один рядок"""
+    history = PriceHistory(str(tmp_path / "history.sqlite3"))
+    try:
+        first = {"T6_POTION_HEAL": {"Lymhurst": 1000, "Martlock": 1100}, "T5_TEASEL": {"Lymhurst": 300}}
+        assert history.append(table(first), T0) == 3
+        assert history.append(table(first), T0 + timedelta(hours=1)) == 0
+
+        changed = {"T6_POTION_HEAL": {"Lymhurst": 1000, "Martlock": 1200}, "T5_TEASEL": {"Lymhurst": 300}}
+        assert history.append(table(changed), T0 + timedelta(hours=2)) == 1
+        assert row_count(history, "prices") == 4
+        assert [ts for ts, rows in history._conn.execute("SELECT ts, changed_rows FROM snapshots ORDER BY ts")
+                if rows] == [int(T0.timestamp()), int((T0 + timedelta(hours=2)).timestamp())]
+
+        rows = history.query("T6_POTION_HEAL", "Martlock")
+        assert [(row['timestamp'], row['sell_price_min']) for row in rows] == [
+            (T0, 1100), (T0 + timedelta(hours=2), 1200)
+        ]
+        # Стан на початок проміжку - остання зміна до since
+        rows = history.query("T6_POTION_HEAL", "Martlock", since=T0 + timedelta(hours=1),
+                             until=T0 + timedelta(hours=3))
+        assert [row['sell_price_min'] for row in rows] == [1100, 1200]
+        assert history.query("T9_NOT_AN_ITEM", "Martlock") == []
+    finally:
+        history.close()
+
+def test_vanished_pairs_pruned_from_latest(tmp_path):
+    """Пара, якої немає в повному знімку, закривається нульовим рядком і зникає з latest"""
+    history = PriceHistory(str(tmp_path / "history.sqlite3"))
+    try:
+        history.append(table({"T6_POTION_HEAL": {"Lymhurst": 1000}, "T6_POTION_HEAL@1": {"Lymhurst": 2000}}), T0)
+        assert row_count(history, "latest") == 2
+
+        assert history.append(table({"T6_POTION_HEAL": {"Lymhurst": 1000}}), T0 + timedelta(hours=1)) == 1
+        assert row_count(history, "latest") == 1
+        assert [row['sell_price_min'] for row in history.query("T6_POTION_HEAL@1", "Lymhurst")] == [2000, 0]
+
+        # Відновлення на момент часу бачить пару до її зникнення, але не після
+        assert set(history.prices_at(T0 + timedelta(minutes=30))) == {"T6_POTION_HEAL", "T6_POTION_HEAL@1"}
+        assert set(history.prices_at(T0 + timedelta(hours=2))) == {"T6_POTION_HEAL"}
+
+        # Частковий знімок нічого не видаляє
+        history.append(table({"T5_TEASEL": {"Lymhurst": 300}}), T0 + timedelta(hours=3), complete=False)
+        assert row_count(history, "latest") == 2
+
+        # Пара, що повернулась, знову пишеться
+        history.append(table({"T6_POTION_HEAL": {"Lymhurst": 1000}, "T6_POTION_HEAL@1": {"Lymhurst": 2100},
+                              "T5_TEASEL": {"Lymhurst": 300}}), T0 + timedelta(hours=4))
+        assert history.prices_at(T0 + timedelta(hours=5))["T6_POTION_HEAL@1"]["Lymhurst"]['sell_price_min'] == 2100
+    finally:
+        history.close()
+
+def test_reads_use_connection_per_thread(tmp_path):
+    """Кожен потік читає власним з'єднанням і бачить зафіксовані записи"""
+    history = PriceHistory(str(tmp_path / "history.sqlite3"))
+    try:
+        history.append(table({"T6_POTION_HEAL": {"Lymhurst": 1000}}), T0)
+        main_reader = history._reader()
+        assert history._reader() is main_reader
+
+        seen = []
+        def read():
+            seen.append((history._reader(), history.query("T6_POTION_HEAL", "Lymhurst")))
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join(5)
+
+        reader, rows = seen[0]
+        assert reader is not main_reader
+        assert [row['sell_price_min'] for row in rows] == [1000]
+    finally:
+        history.close()
+
+if __name__ == '__main__':
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -1,39 +1,52 @@
 import os
+from images import ImageManifest, BASE_DIR, catalog_ingredients
+from potion import POTION_IDS
 
 def test_image_paths():
-    """Тестова функція для перевірки шляхів до зображень"""
-    item_id = "T8_POTION_CLEANSE"
-    image_type = "potion"
-    
-    extensions = ['.png', '.jpg', '.jpeg', '.webp']
-    search_paths = [
-        f'static/images/{image_type}s/{item_id}',  # potions/
-        f'static/images/{image_type}/{item_id}',     # potion/
-        f'static/images/{item_id}',                  # Без підпапки
-        f'albion_icons/{item_id}',                   # Стара папка
-    ]
-    
-    print(f"Шукаємо зображення для: {item_id}")
-    print("=" * 50)
-    
-    found = False
-    for path in search_paths:
-        for ext in extensions:
-            full_path = f'{path}{ext}'
-            exists = os.path.exists(full_path)
-            print(f"{'✓' if exists else '✗'} {full_path}")
-            if exists:
-                found = True
-                print(f"  → Знайдено! Повний шлях: {os.path.abspath(full_path)}")
-    
-    if not found:
-        print("\n❌ Зображення не знайдено!")
-        print("\nПеревірте:")
-        print(f"1. Чи існує файл: static/images/potion/{item_id}.png")
-        print(f"2. Чи правильна назва файлу (має бути точно: {item_id}.png)")
-        print(f"3. Чи правильна папка (має бути: static/images/potion/)")
-    else:
-        print("\n✅ Зображення знайдено!")
+    """Перевіряє, що маніфест знаходить зображення і шляхи до них існують"""
+    manifest = ImageManifest()
+
+    path = manifest.get("T8_POTION_CLEANSE", "potion")
+    assert path == "images/potions/T8_POTION_CLEANSE.png"
+
+    for item_id in POTION_IDS:
+        path = manifest.get(item_id, "potion")
+        if path is not None:
+            full_path = os.path.join(BASE_DIR, path if path.startswith("albion_icons/") else f"static/{path}")
+            assert os.path.isfile(full_path), full_path
+
+def test_enchanted_potion_image():
+    """Зачаровані зілля мають окремі зображення (T3_POTION_MOB_RESET@1)"""
+    manifest = ImageManifest()
+    assert manifest.get("T3_POTION_MOB_RESET@1", "potion") == "images/potions/T3_POTION_MOB_RESET@1.png"
+
+def test_recipe_images_present():
+    """Усі зілля та інгредієнти з рецептів мають зображення"""
+    from recipes import RECIPES
+
+    manifest = ImageManifest()
+    assert manifest.missing(RECIPES.keys(), "potion") == []
+    ingredients = {i for recipe in RECIPES.values() for i in recipe['ingredients']}
+    assert manifest.missing(sorted(ingredients), "ingredient") == []
+
+def test_missing_item():
+    """Невідомий предмет не має зображення"""
+    manifest = ImageManifest()
+    assert manifest.get("T9_NOT_AN_ITEM", "ingredient") is None
+    assert "T9_NOT_AN_ITEM" in manifest.missing(catalog_ingredients() + ["T9_NOT_AN_ITEM"], "ingredient")
+
+def test_manifest_invalidated_by_mtime(tmp_path):
+    """Новий файл у папці з'являється в маніфесті після зміни mtime папки"""
+    potions_dir = tmp_path / "static" / "images" / "potions"
+    potions_dir.mkdir(parents=True)
+    manifest = ImageManifest(base_dir=str(tmp_path), check_interval=0)
+    assert manifest.get("T4_POTION_HEAL") is None
+
+    (potions_dir / "T4_POTION_HEAL.webp").write_bytes(b"")
+    (potions_dir / "T4_POTION_HEAL.png").write_bytes(b"")
+    os.utime(potions_dir, ns=(0, 1))
+    assert manifest.get("T4_POTION_HEAL") == "images/potions/T4_POTION_HEAL.png"
 
 if __name__ == '__main__':
-    test_image_paths()
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
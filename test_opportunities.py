@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from calculator import PotionCalculator
+from cities import CITIES
+from opportunities import OpportunityMatrix
+from price_table import PriceTable
+from recipes import RECIPES
+from volumes import MarketVolumes
+
+# Кілька рецептів з різним виходом; у першого матеріалу немає цін у Lymhurst і Brecilien,
+# тож перевіряються і запасні міста, і закупівля з перевезенням
+POTION_IDS = ["T6_POTION_HEAL", "T8_POTION_GATHER", "T5_POTION_STONESKIN"]
+RECIPE_SUBSET = {potion_id: RECIPES[potion_id] for potion_id in POTION_IDS}
+MISSING_CITIES = ("Lymhurst", "Brecilien")
+
+def fixture_prices() -> PriceTable:
+    """Детерміновані ціни всіх матеріалів і зілль вибраних рецептів у всіх містах"""
+    materials = list(dict.fromkeys(i for recipe in RECIPE_SUBSET.values() for i in recipe['ingredients']))
+    prices = {}
+    for n, item_id in enumerate(materials + POTION_IDS):
+        prices[item_id] = {}
+        for j, city in enumerate(CITIES):
+            if n == 0 and city in MISSING_CITIES:
+                continue
+            base = 100 * (n + 1) + 37 * j
+            prices[item_id][city] = {
+                'sell_price_min': base * (40 if item_id in POTION_IDS else 1),
+                'buy_price_max': base - 5,
+            }
+    return PriceTable.from_prices(prices)
+
+def assert_parity(prices: PriceTable, settings: dict, transport_cost=None):
+    """Матриця збігається з calculate_craft_cost для кожного зілля × міста крафту × міста продажу"""
+    matrix = OpportunityMatrix(recipes=RECIPE_SUBSET, cities=CITIES)
+    result = matrix.compute(prices, transport_cost=transport_cost, **settings)
+    # Без return_rate обидва шляхи беруть базовий відсоток міста крафту
+    scalar_settings = dict(settings)
+    if transport_cost is not None:
+        scalar_settings.update(source_anywhere=True, transport_cost=transport_cost)
+
+    for c, craft_city in enumerate(CITIES):
+        for s, sell_city in enumerate(CITIES):
+            calculator = PotionCalculator(prices=prices, craft_city=craft_city, sell_city=sell_city,
+                                          volumes=MarketVolumes([]))
+            for p, potion_id in enumerate(POTION_IDS):
+                expected = calculator.calculate_craft_cost(potion_id, **scalar_settings)
+                assert np.isclose(result['cost_per_potion'][p, c], expected['cost_per_potion']), \
+                    (potion_id, craft_city)
+                assert np.isclose(result['sell_price_after_tax'][p, s], expected['sell_price_after_tax']), \
+                    (potion_id, sell_city)
+                assert np.isclose(result['profit_per_potion'][p, c, s], expected['profit_per_potion']), \
+                    (potion_id, craft_city, sell_city)
+                assert np.isclose(result['roi_percent'][p, c, s], expected['roi_percent']), \
+                    (potion_id, craft_city, sell_city)
+
+def test_matrix_matches_calculator_defaults():
+    """Базовий відсоток повернення кожного міста і бонус виходу Бресіліону"""
+    assert_parity(fixture_prices(), {})
+
+def test_matrix_matches_calculator_settings():
+    """Преміум, фокус, станок, додатковий бонус і ціна покупки матеріалів"""
+    assert_parity(fixture_prices(), {
+        'machine_cost_per_100': 350.0,
+        'focus_bonus': True,
+        'extra_bonus_pct': 10.0,
+        'return_rate': 0.248,
+        'use_buy_price': True,
+        'premium': True,
+    })
+
+def test_matrix_matches_calculator_transport_cost():
+    """Закупівля в найдешевшому місті з перевезенням (source_anywhere)"""
+    prices = fixture_prices()
+    assert_parity(prices, {}, transport_cost=0.0)
+    assert_parity(prices, {'premium': True}, transport_cost=45.0)
+
+def test_ranked_rejects_bad_parameters():
+    """Невідомий ключ сортування і limit < 1 - помилка, а не тихе сортування за прибутком"""
+    matrix = OpportunityMatrix(recipes=RECIPE_SUBSET, cities=CITIES)
+    result = matrix.compute(fixture_prices())
+    assert len(matrix.ranked(result, sort_by="roi", limit=1)) == 1
+    with pytest.raises(ValueError):
+        matrix.ranked(result, sort_by="margin")
+    with pytest.raises(ValueError):
+        matrix.ranked(result, limit=0)
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__, "-q"]))
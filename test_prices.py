@@ -0,0 +1,100 @@
+import threading
+from datetime import datetime
+import get_prices
+import price_store
+from price_table import PriceTable
+
+def isolate_snapshot(monkeypatch):
+    """Знімок процесу і стан фонового оновлення не протікають між тестами"""
+    monkeypatch.setattr(get_prices, "_snapshot", None)
+    monkeypatch.setattr(get_prices, "_snapshot_version", 0)
+    monkeypatch.setattr(get_prices, "_refresh_thread", None)
+    monkeypatch.setattr(get_prices, "_last_background_attempt", 0.0)
+
+def sample_prices(heal_price: int) -> dict:
+    return {
+        "T6_POTION_HEAL": {"Lymhurst": {"sell_price_min": heal_price, "buy_price_max": heal_price - 100}},
+        "T5_TEASEL": {"Lymhurst": {"sell_price_min": 300, "buy_price_max": 250}},
+    }
+
+def test_snapshot_reused_until_file_changes(tmp_path, monkeypatch):
+    """Теплий воркер повертає той самий знімок без перечитування файлу"""
+    isolate_snapshot(monkeypatch)
+    cache_file = str(tmp_path / "prices_cache.bin")
+    assert get_prices.get_snapshot(cache_file) is None
+
+    saved = get_prices.save_prices_to_cache(sample_prices(1000), cache_file)
+    assert get_prices.get_snapshot(cache_file) is saved
+    assert get_prices.get_snapshot(cache_file) is saved
+    assert get_prices.find_item_price("T6_POTION_HEAL", saved.prices, "Lymhurst") == (1000.0, "Lymhurst")
+
+def test_snapshot_reloaded_after_other_process_writes(tmp_path, monkeypatch):
+    """Файл, записаний іншим воркером, підхоплюється за зміною сигнатури"""
+    isolate_snapshot(monkeypatch)
+    cache_file = str(tmp_path / "prices_cache.bin")
+    first = get_prices.save_prices_to_cache(sample_prices(1000), cache_file)
+
+    # Інший процес записує новий знімок тим самим шляхом (через os.replace)
+    price_store.write_snapshot(cache_file, PriceTable.from_prices(sample_prices(2000)), datetime(2026, 1, 2, 3, 4))
+
+    second = get_prices.get_snapshot(cache_file)
+    assert second is not first
+    assert second.version == first.version + 1
+    assert second.timestamp == datetime(2026, 1, 2, 3, 4)
+    assert get_prices.find_item_price("T6_POTION_HEAL", second.prices, "Lymhurst") == (2000.0, "Lymhurst")
+    assert get_prices.get_snapshot(cache_file) is second
+
+def test_broken_cache_keeps_previous_snapshot(tmp_path, monkeypatch):
+    """Пошкоджений файл не скидає знімок, який уже є в пам'яті"""
+    isolate_snapshot(monkeypatch)
+    cache_file = tmp_path / "prices_cache.bin"
+    saved = get_prices.save_prices_to_cache(sample_prices(1000), str(cache_file))
+    cache_file.write_bytes(b"not a snapshot")
+    assert get_prices.get_snapshot(str(cache_file)) is saved
+
+def test_background_refresh_throttled(monkeypatch):
+    """Після невдалої спроби фонове оновлення не запускається частіше за REFRESH_RETRY_SECONDS"""
+    isolate_snapshot(monkeypatch)
+    calls = []
+    finished = threading.Event()
+
+    def fake_refresh(locations):
+        calls.append(locations)
+        finished.set()
+
+    monkeypatch.setattr(get_prices, "_background_refresh", fake_refresh)
+    clock = [1000.0]
+    monkeypatch.setattr(get_prices.time, "monotonic", lambda: clock[0])
+
+    assert get_prices.refresh_in_background("Lymhurst")
+    assert finished.wait(5)
+    get_prices._refresh_thread.join(5)
+
+    # Потік уже завершився, але пауза між спробами ще триває
+    clock[0] += get_prices.REFRESH_RETRY_SECONDS - 1
+    assert not get_prices.refresh_in_background("Lymhurst")
+    assert len(calls) == 1
+
+    clock[0] += 2
+    finished.clear()
+    assert get_prices.refresh_in_background("Lymhurst")
+    assert finished.wait(5)
+    get_prices._refresh_thread.join(5)
+    assert len(calls) == 2
+
+def test_stale_snapshot_served_while_refreshing(tmp_path, monkeypatch):
+    """Застарілий знімок віддається одразу, а оновлення запускається у фоні"""
+    isolate_snapshot(monkeypatch)
+    saved = get_prices.save_prices_to_cache(sample_prices(1000), str(tmp_path / "prices_cache.bin"))
+    saved.next_refresh_at = 0.0
+    started = []
+    monkeypatch.setattr(get_prices, "get_snapshot", lambda cache_file=None: saved)
+    monkeypatch.setattr(get_prices, "refresh_in_background", lambda locations: started.append(locations))
+    monkeypatch.setattr(get_prices, "refresh_prices", lambda *args, **kwargs: None)
+
+    assert get_prices.get_prices() is saved.prices
+    assert started == [get_prices.DEFAULT_LOCATIONS]
+
+if __name__ == '__main__':
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,92 @@
+import numpy as np
+from calculator import PotionCalculator
+from price_table import PriceTable
+from sourcing import IngredientSourcing, get_sourcing
+from volumes import MarketVolumes
+
+CITIES = ["Lymhurst", "Martlock", "Thetford"]
+
+def sample_prices() -> PriceTable:
+    """Трава дешевша в Martlock, яйця продаються лише в Thetford, у Lymhurst своя ціна на траву"""
+    return PriceTable.from_prices({
+        "T5_TEASEL": {
+            "Lymhurst": {"sell_price_min": 200, "buy_price_max": 150},
+            "Martlock": {"sell_price_min": 120, "buy_price_max": 100},
+            "Thetford": {"sell_price_min": 180, "buy_price_max": 170},
+        },
+        "T5_EGG": {
+            "Thetford": {"sell_price_min": 500, "buy_price_max": 400},
+        },
+    })
+
+def test_cheapest_city_with_transport():
+    """Місто купівлі - мінімум ціни з перевезенням; своє місто перевезення не коштує"""
+    sourcing = IngredientSourcing(sample_prices(), ["T5_TEASEL", "T5_EGG"], CITIES, transport_cost=50)
+    assert sourcing.unit_price("T5_TEASEL", "Lymhurst") == (170.0, "Martlock", 50.0)
+    assert sourcing.unit_price("T5_TEASEL", "Martlock") == (120.0, "Martlock", 0.0)
+    # 120 + 50 = 170 < 180 у самому Thetford
+    assert sourcing.unit_price("T5_TEASEL", "Thetford") == (170.0, "Martlock", 50.0)
+    assert sourcing.unit_price("T5_EGG", "Lymhurst") == (550.0, "Thetford", 50.0)
+
+    expensive = IngredientSourcing(sample_prices(), ["T5_TEASEL"], CITIES, transport_cost=100)
+    assert expensive.unit_price("T5_TEASEL", "Lymhurst") == (200.0, "Lymhurst", 0.0)
+
+def test_buy_price_and_per_city_transport():
+    """Ціна покупки і окрема вартість перевезення для кожного міста купівлі"""
+    sourcing = IngredientSourcing(sample_prices(), ["T5_TEASEL"], CITIES, use_buy_price=True,
+                                  transport_cost=30, transport_costs={"Martlock": 80, "Thetford": 10})
+    assert sourcing.unit_price("T5_TEASEL", "Lymhurst") == (150.0, "Lymhurst", 0.0)
+    assert sourcing.unit_price("T5_TEASEL", "Martlock") == (100.0, "Martlock", 0.0)
+    # 150 + 30 з Lymhurst дорожче за власні 170
+    assert sourcing.unit_price("T5_TEASEL", "Thetford") == (170.0, "Thetford", 0.0)
+
+def test_unknown_craft_city_falls_back_to_cheapest_without_transport():
+    """Невідоме місто крафту не дає помилки: найдешевше місто без вартості перевезення"""
+    sourcing = IngredientSourcing(sample_prices(), ["T5_TEASEL", "T5_EGG"], CITIES, transport_cost=50)
+    assert sourcing.unit_price("T5_TEASEL", "Caerleon") == (120.0, "Martlock", 0.0)
+    assert sourcing.unit_price("T5_EGG", "Atlantis") == (500.0, "Thetford", 0.0)
+
+    catalog = {row['material_id']: row for row in sourcing.catalog("Caerleon")}
+    assert catalog["T5_TEASEL"]['buy_city'] == "Martlock"
+    assert catalog["T5_TEASEL"]['local_price'] == 0.0
+    assert catalog["T5_TEASEL"]['saving_per_unit'] == 0.0
+
+    shopping = sourcing.shopping_list({"T5_TEASEL": 2.5, "T5_EGG": 1}, "Caerleon")
+    assert shopping["Martlock"][0]['quantity'] == 3
+    assert shopping["Martlock"][0]['total_cost'] == 360.0
+    assert shopping["Thetford"][0]['transport_cost'] == 0.0
+
+    matrix = sourcing.cost_matrix(["T5_TEASEL", "T9_UNKNOWN"], ["Martlock", "Caerleon"])
+    assert np.array_equal(matrix, [[120.0, 0.0], [0.0, 0.0]])
+
+def test_missing_material_and_shopping_list():
+    """Матеріал без цін ніде не купується і не потрапляє в список покупок"""
+    sourcing = IngredientSourcing(sample_prices(), ["T5_TEASEL", "T7_MULLEIN"], CITIES, transport_cost=50)
+    assert sourcing.unit_price("T7_MULLEIN", "Lymhurst") == (0.0, None, 0.0)
+    assert sourcing.unit_price("T9_UNKNOWN", "Lymhurst") == (0.0, None, 0.0)
+
+    shopping = sourcing.shopping_list({"T5_TEASEL": 10, "T7_MULLEIN": 5}, "Lymhurst")
+    assert list(shopping) == ["Martlock"]
+    assert shopping["Martlock"][0]['total_cost'] == 1700.0
+
+def test_get_sourcing_cached_per_snapshot():
+    """Той самий знімок і налаштування - той самий розрахунок; новий знімок скидає кеш"""
+    prices = sample_prices()
+    first = get_sourcing(prices, transport_cost=50)
+    assert get_sourcing(prices, transport_cost=50.0) is first
+    assert get_sourcing(prices, use_buy_price=True, transport_cost=50) is not first
+    assert get_sourcing(sample_prices(), transport_cost=50) is not first
+
+def test_calculator_unknown_craft_city_source_anywhere():
+    """calculate_craft_cost із source_anywhere і невідомим містом крафту рахує без KeyError"""
+    calculator = PotionCalculator(prices=sample_prices(), craft_city="Atlantis", sell_city="Lymhurst",
+                                  volumes=MarketVolumes([]))
+    result = calculator.calculate_craft_cost("T5_POTION_STONESKIN", source_anywhere=True, transport_cost=50)
+    assert 'error' not in result
+    details = result['ingredient_details']["T5_TEASEL"]
+    assert details['price_city'] == "Martlock"
+    assert details['transport_cost'] == 0.0
+
+if __name__ == '__main__':
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
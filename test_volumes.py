@@ -0,0 +1,154 @@
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+import volumes
+from volumes import MarketVolumes, parse_history_rows
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+NOW = datetime(2026, 3, 10, tzinfo=timezone.utc).timestamp()
+
+def history_row(item_id, city, counts, quality=1, price=1000):
+    """Рядок відповіді ендпоінта історії з денними точками, починаючи від NOW назад"""
+    points = [
+        {'timestamp': datetime.fromtimestamp(NOW - day * 86400, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S'),
+         'item_count': count, 'avg_price': price}
+        for day, count in enumerate(counts)
+    ]
+    return {'item_id': item_id, 'location': city, 'quality': quality, 'data': points}
+
+def isolate_volumes(monkeypatch, tmp_path, items=("T6_POTION_HEAL", "T4_POTION_HEAL")):
+    """Кеш обсягів, файли і каталог - у тимчасовій папці"""
+    monkeypatch.setattr(volumes, "_volumes", None)
+    monkeypatch.setattr(volumes, "_volumes_signature", None)
+    monkeypatch.setattr(volumes, "VOLUME_LOCK_FILE", str(tmp_path / "volumes_cache.lock"))
+    monkeypatch.setattr(volumes, "volume_items", lambda: list(items))
+    return str(tmp_path / "volumes_cache.npz")
+
+def test_parse_history_window():
+    """Точки поза вікном не рахуються, а кількість ділиться на всю довжину вікна"""
+    data = [
+        history_row("T6_POTION_HEAL", "Lymhurst", [70, 0, 0, 0, 0, 0, 0, 500]),
+        history_row("T6_POTION_HEAL", "Lymhurst", [14], quality=3, price=2000),
+        history_row("T6_POTION_HEAL", "Atlantis", [100]),
+    ]
+    parsed = parse_history_rows(data, window_days=7, now=NOW + 1)
+    assert parsed["T6_POTION_HEAL"]["Lymhurst"] == (10.0, 1000.0)
+    assert parsed["T6_POTION_HEAL#3"]["Lymhurst"] == (2.0, 2000.0)
+    assert set(parsed) == {"T6_POTION_HEAL", "T6_POTION_HEAL#3"}
+
+def test_items_due_ttl():
+    """Предмет застаріває через ttl_hours після завантаження; незавантажений - завжди до оновлення"""
+    table = MarketVolumes(["T6_POTION_HEAL"], fetched_at=np.array([NOW]))
+    items = ["T6_POTION_HEAL", "T4_POTION_HEAL"]
+    assert table.items_due(items, now=NOW + 3600, ttl_hours=24) == ["T4_POTION_HEAL"]
+    assert table.items_due(items, now=NOW + 24 * 3600, ttl_hours=24) == items
+
+def test_merged_replaces_refreshed_items_only():
+    """Оновлений предмет замінюється разом з якостями, решта зберігає обсяги і час завантаження"""
+    old = MarketVolumes([]).merged(
+        parse_history_rows([
+            history_row("T6_POTION_HEAL", "Lymhurst", [7]),
+            history_row("T6_POTION_HEAL", "Lymhurst", [7], quality=2),
+            history_row("T4_POTION_HEAL", "Martlock", [14]),
+        ], now=NOW + 1),
+        ["T6_POTION_HEAL", "T4_POTION_HEAL"], NOW,
+    )
+    assert old.daily_volume_for("T6_POTION_HEAL", "Lymhurst", quality=2) == 1.0
+
+    fetched = parse_history_rows([history_row("T6_POTION_HEAL", "Lymhurst", [21])], now=NOW + 1)
+    new = old.merged(fetched, ["T6_POTION_HEAL"], NOW + 100)
+
+    assert new.daily_volume_for("T6_POTION_HEAL", "Lymhurst") == 3.0
+    # Якості, якої більше немає у відповіді, не лишається; предмет завантажено - обсяг 0
+    assert "T6_POTION_HEAL#2" not in new.item_index
+    assert new.daily_volume_for("T6_POTION_HEAL", "Lymhurst", quality=2) == 0.0
+    assert new.daily_volume_for("T4_POTION_HEAL", "Martlock") == 2.0
+    assert new.fetched_at[new.item_index["T4_POTION_HEAL"]] == NOW
+    assert new.fetched_at[new.item_index["T6_POTION_HEAL"]] == NOW + 100
+    assert new.daily_volume_for("T8_POTION_HEAL", "Lymhurst") is None
+
+def test_get_volumes_reloads_changed_file(tmp_path, monkeypatch):
+    """Таблиця процесу перевикористовується, поки файл не змінився"""
+    cache_file = isolate_volumes(monkeypatch, tmp_path)
+    assert len(volumes.get_volumes(cache_file)) == 0
+
+    MarketVolumes(["T6_POTION_HEAL"], fetched_at=np.array([NOW])).save(cache_file)
+    first = volumes.get_volumes(cache_file)
+    assert first.item_ids == ["T6_POTION_HEAL"]
+    assert volumes.get_volumes(cache_file) is first
+
+    MarketVolumes(["T6_POTION_HEAL", "T4_POTION_HEAL"], fetched_at=np.array([NOW, NOW])).save(cache_file)
+    assert volumes.get_volumes(cache_file).item_ids == ["T6_POTION_HEAL", "T4_POTION_HEAL"]
+
+def test_refresh_skips_fresh_items(tmp_path, monkeypatch):
+    """Запитуються лише предмети з минулим TTL; якщо таких немає - запиту немає зовсім"""
+    cache_file = isolate_volumes(monkeypatch, tmp_path)
+    MarketVolumes(["T6_POTION_HEAL"], fetched_at=np.array([time.time()])).save(cache_file)
+    requested = []
+
+    def fake_fetch(item_ids, *args, **kwargs):
+        requested.append(list(item_ids))
+        rows = [history_row(item_id, "Lymhurst", [7], price=500) for item_id in item_ids]
+        return kwargs['parse_rows'](rows, now=NOW + 1), []
+
+    monkeypatch.setattr(volumes, "fetch_all_prices", fake_fetch)
+    table = volumes.refresh_volumes(cache_file=cache_file)
+    assert requested == [["T4_POTION_HEAL"]]
+    assert table.daily_volume_for("T4_POTION_HEAL", "Lymhurst") == 1.0
+
+    volumes.refresh_volumes(cache_file=cache_file)
+    assert len(requested) == 1
+
+def test_concurrent_refresh_single_flight(tmp_path, monkeypatch):
+    """Поки один потік оновлює обсяги, інший не робить другого запиту і повертає поточну таблицю"""
+    cache_file = isolate_volumes(monkeypatch, tmp_path)
+    entered = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_fetch(item_ids, *args, **kwargs):
+        calls.append(list(item_ids))
+        entered.set()
+        assert release.wait(5)
+        return {}, list(item_ids)
+
+    monkeypatch.setattr(volumes, "fetch_all_prices", slow_fetch)
+    busy = volumes._VOLUME_REFRESHES["busy"]
+    busy_before = busy.value
+
+    worker = threading.Thread(target=volumes.refresh_volumes, kwargs={'cache_file': cache_file})
+    worker.start()
+    try:
+        assert entered.wait(5)
+        result = volumes.refresh_volumes(cache_file=cache_file)
+        assert len(result) == 0
+        assert busy.value == busy_before + 1
+    finally:
+        release.set()
+        worker.join(5)
+    assert len(calls) == 1
+
+def test_refresh_busy_in_other_process(tmp_path, monkeypatch):
+    """Блокування файлу іншим процесом (flock) теж пропускає оновлення"""
+    if fcntl is None:
+        return
+    cache_file = isolate_volumes(monkeypatch, tmp_path)
+    def unexpected_fetch(*args, **kwargs):
+        raise AssertionError("обсяги не повинні запитуватись під чужим блокуванням")
+
+    monkeypatch.setattr(volumes, "fetch_all_prices", unexpected_fetch)
+    with open(volumes.VOLUME_LOCK_FILE, "a") as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        try:
+            assert len(volumes.refresh_volumes(cache_file=cache_file)) == 0
+        finally:
+            fcntl.flock(held, fcntl.LOCK_UN)
+
+if __name__ == '__main__':
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
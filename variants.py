@@ -0,0 +1,56 @@
+from typing import Iterable, List, Tuple
+
+# Якості предметів Albion Online (1 = нормальна)
+QUALITIES = (1, 2, 3, 4, 5)
+QUALITY_NAMES = {
+    1: "Звичайна",
+    2: "Добра",
+    3: "Видатна",
+    4: "Відмінна",
+    5: "Шедевр",
+}
+# Рівні зачарування (T6_POTION_HEAL@1 ... @3)
+ENCHANTMENTS = (1, 2, 3)
+
+ENCHANTMENT_SEPARATOR = "@"
+# Ключ ціни предмета іншої якості: "T6_POTION_HEAL@1#3"; якість 1 - просто ID предмета
+QUALITY_SEPARATOR = "#"
+
+def price_key(item_id: str, quality: int = 1) -> str:
+    """Ключ рядка таблиці цін для предмета певної якості"""
+    quality = int(quality)
+    return item_id if quality == 1 else f"{item_id}{QUALITY_SEPARATOR}{quality}"
+
+def split_price_key(key: str) -> Tuple[str, int]:
+    """Зворотне до price_key: (ID предмета, якість)"""
+    item_id, separator, quality = key.rpartition(QUALITY_SEPARATOR)
+    if not separator or not quality.isdigit():
+        return key, 1
+    return item_id, int(quality)
+
+def enchanted_id(item_id: str, level: int) -> str:
+    """ID зачарованого варіанта предмета (рівень 0 - базовий предмет)"""
+    base, _ = split_enchantment(item_id)
+    return base if level <= 0 else f"{base}{ENCHANTMENT_SEPARATOR}{level}"
+
+def split_enchantment(item_id: str) -> Tuple[str, int]:
+    """(базовий ID, рівень зачарування) для ID на кшталт T3_POTION_MOB_RESET@1"""
+    base, separator, level = item_id.partition(ENCHANTMENT_SEPARATOR)
+    if not separator or not level.isdigit():
+        return item_id, 0
+    return base, int(level)
+
+def with_enchantments(item_ids: Iterable[str], levels: Iterable[int] = ENCHANTMENTS) -> List[str]:
+    """Додає до списку зачаровані варіанти предметів (без дублікатів, порядок зберігається)"""
+    levels = list(levels)
+    result = []
+    seen = set()
+    for item_id in item_ids:
+        variants = [item_id]
+        if split_enchantment(item_id)[1] == 0:
+            variants += [enchanted_id(item_id, level) for level in levels]
+        for variant in variants:
+            if variant not in seen:
+                seen.add(variant)
+                result.append(variant)
+    return result
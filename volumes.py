@@ -0,0 +1,282 @@
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from cities import CITIES, normalize_city
+from variants import price_key, split_price_key, split_enchantment
+import metrics
+from get_prices import (
+    ALBION_HISTORY_API_BASE,
+    DEFAULT_LOCATIONS,
+    DEFAULT_QUALITIES,
+    TokenBucket,
+    fetch_all_prices,
+    get_all_items_from_modules,
+    _cache_signature,
+    _refresh_lock,
+)
+
+# Обсяги торгів з ендпоінта історії Albion Data API.
+#
+# Для кожної пари предмет × місто зберігається середня кількість проданих
+# за день штук і середня ціна угоди за останні VOLUME_WINDOW_DAYS днів.
+# Обсяги змінюються повільно, тому мають власний TTL (VOLUME_TTL_HOURS),
+# значно довший за TTL цін: при звичайному оновленні цін предмети з дійсними
+# обсягами не запитуються, а запит історії - це кілька батчів на добу.
+VOLUME_CACHE_FILE = "volumes_cache.npz"
+# Міжпроцесне блокування оновлення обсягів (окреме від блокування цін)
+VOLUME_LOCK_FILE = "volumes_cache.lock"
+VOLUME_TTL_HOURS = 24
+VOLUME_WINDOW_DAYS = 7
+# Денні точки історії (time-scale API: 1 - погодинно, 24 - по днях)
+HISTORY_TIME_SCALE = 24
+
+_VOLUME_REFRESHES = {
+    result: metrics.counter("albion_volume_refreshes_total", "Оновлення обсягів торгів з API за результатом",
+                            result=result)
+    for result in ("ok", "failed", "not_due", "busy")
+}
+_volume_refresh_mutex = threading.Lock()
+
+def _parse_timestamp(value: str) -> float:
+    """Час точки історії (API віддає UTC без часової зони) у секундах epoch"""
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+
+def parse_history_rows(data: list, window_days: float = VOLUME_WINDOW_DAYS,
+                       now: Optional[float] = None) -> Dict:
+    """
+    Перетворює відповідь ендпоінта історії у {ключ ціни: {місто: (штук за день, середня ціна)}}
+
+    Рахуються лише точки за останні window_days днів; кількість ділиться на
+    всю довжину вікна, тож дні без угод знижують середній обсяг.
+    Якості > 1 записуються під price_key(item_id, q), як і ціни.
+    """
+    cutoff = (now or time.time()) - window_days * 86400
+    volumes: Dict[str, Dict[str, Tuple[float, float]]] = {}
+    for row in data:
+        item_id = row.get('item_id', '')
+        city = normalize_city(row.get('location', ''))
+        if not item_id or city not in CITIES:
+            continue
+        count = 0
+        turnover = 0.0
+        for point in row.get('data') or []:
+            try:
+                if _parse_timestamp(point['timestamp']) < cutoff:
+                    continue
+            except (KeyError, ValueError):
+                continue
+            count += int(point.get('item_count') or 0)
+            turnover += int(point.get('item_count') or 0) * float(point.get('avg_price') or 0)
+        if not count:
+            continue
+        key = price_key(item_id, int(row.get('quality') or 1))
+        volumes.setdefault(key, {})[city] = (count / window_days, turnover / count)
+    return volumes
+
+class MarketVolumes:
+    """
+    Середні денні обсяги торгів у щільних масивах [предмет, місто]
+
+    Attributes:
+        item_ids: Ключі предметів (ID або ID#якість)
+        cities: Міста (стовпці)
+        daily_volume: Штук за день [I, C] (float32)
+        avg_price: Середня ціна угоди [I, C] (float32, 0 - угод не було)
+        fetched_at: Коли обсяги предмета завантажено з API [I] (секунди epoch)
+    """
+
+    def __init__(self, item_ids: Sequence[str], cities: Sequence[str] = CITIES,
+                 daily_volume: Optional[np.ndarray] = None, avg_price: Optional[np.ndarray] = None,
+                 fetched_at: Optional[np.ndarray] = None):
+        self.item_ids = list(item_ids)
+        self.cities = list(cities)
+        shape = (len(self.item_ids), len(self.cities))
+        self.daily_volume = daily_volume if daily_volume is not None else np.zeros(shape, dtype=np.float32)
+        self.avg_price = avg_price if avg_price is not None else np.zeros(shape, dtype=np.float32)
+        self.fetched_at = fetched_at if fetched_at is not None else np.zeros(len(self.item_ids))
+        self.item_index = dict(zip(self.item_ids, range(len(self.item_ids))))
+        self.city_index = {city: j for j, city in enumerate(self.cities)}
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    def daily_volume_for(self, item_id: str, city: str, quality: int = 1) -> Optional[float]:
+        """
+        Скільки штук предмета продається в місті за день
+
+        Returns:
+            Середній обсяг (0 - предмет у місті не торгується) або None, якщо обсяги предмета не завантажувались
+        """
+        i = self.item_index.get(price_key(item_id, quality))
+        if i is None:
+            # Якість без угод не потрапляє в таблицю - обсяг 0, якщо сам предмет завантажено
+            return 0.0 if quality != 1 and item_id in self.item_index else None
+        j = self.city_index.get(normalize_city(city))
+        return None if j is None else float(self.daily_volume[i, j])
+
+    def items_due(self, item_ids: Sequence[str], now: Optional[float] = None,
+                  ttl_hours: float = VOLUME_TTL_HOURS) -> List[str]:
+        """Предмети, обсяги яких застаріли або ще не завантажувались"""
+        now = now or time.time()
+        deadline = now - ttl_hours * 3600
+        return [
+            item_id for item_id in item_ids
+            if item_id not in self.item_index or self.fetched_at[self.item_index[item_id]] <= deadline
+        ]
+
+    def merged(self, fetched: Dict, refreshed_items: Sequence[str], now: float) -> "MarketVolumes":
+        """
+        Нова таблиця: обсяги оновлених предметів (з усіма якостями) замість старих
+
+        Args:
+            fetched: Результат parse_history_rows
+            refreshed_items: ID предметів, запит яких вдався
+            now: Час завантаження
+        """
+        refreshed = set(refreshed_items)
+        keep = [key for key in self.item_ids if split_price_key(key)[0] not in refreshed]
+        new_keys = list(refreshed_items) + [
+            key for key in fetched if key not in refreshed and split_price_key(key)[0] in refreshed
+        ]
+        item_ids = keep + new_keys
+        result = MarketVolumes(item_ids, self.cities)
+        if keep:
+            rows = np.array([self.item_index[key] for key in keep], dtype=np.intp)
+            result.daily_volume[:len(keep)] = self.daily_volume[rows]
+            result.avg_price[:len(keep)] = self.avg_price[rows]
+            result.fetched_at[:len(keep)] = self.fetched_at[rows]
+        for i, key in enumerate(new_keys, start=len(keep)):
+            result.fetched_at[i] = now
+            for city, (volume, price) in fetched.get(key, {}).items():
+                j = result.city_index.get(city)
+                if j is not None:
+                    result.daily_volume[i, j] = volume
+                    result.avg_price[i, j] = price
+        return result
+
+    def save(self, path: str = VOLUME_CACHE_FILE):
+        """Атомарно записує таблицю (тимчасовий файл у тій самій папці + os.replace)"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    item_ids=np.array(self.item_ids, dtype=str),
+                    cities=np.array(self.cities, dtype=str),
+                    daily_volume=self.daily_volume.astype(np.float32),
+                    avg_price=self.avg_price.astype(np.float32),
+                    fetched_at=self.fetched_at.astype(np.float64),
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str = VOLUME_CACHE_FILE) -> "MarketVolumes":
+        """Читає таблицю, збережену save()"""
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data['item_ids'].tolist(), data['cities'].tolist(),
+                daily_volume=data['daily_volume'], avg_price=data['avg_price'], fetched_at=data['fetched_at']
+            )
+
+_volumes: Optional[MarketVolumes] = None
+_volumes_signature: Optional[Tuple] = None
+_volumes_lock = threading.Lock()
+
+def get_volumes(cache_file: str = VOLUME_CACHE_FILE) -> MarketVolumes:
+    """
+    Обсяги торгів процесу; файл перечитується лише коли змінився (як знімок цін)
+
+    Returns:
+        MarketVolumes (порожня таблиця, якщо обсяги ще не завантажувались)
+    """
+    global _volumes, _volumes_signature
+    signature = _cache_signature(cache_file)
+    if _volumes is not None and signature == _volumes_signature:
+        return _volumes
+    with _volumes_lock:
+        if _volumes is not None and signature == _volumes_signature:
+            return _volumes
+        volumes = MarketVolumes([])
+        if signature is not None:
+            try:
+                volumes = MarketVolumes.load(cache_file)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Помилка при завантаженні обсягів торгів: {e}")
+        _volumes, _volumes_signature = volumes, signature
+        return volumes
+
+def volume_items() -> List[str]:
+    """Предмети, для яких потрібні обсяги: зілля, які калькулятор продає (разом із зачарованими)"""
+    from potion import POTION_IDS
+    return [item_id for item_id in get_all_items_from_modules() if split_enchantment(item_id)[0] in POTION_IDS]
+
+def volumes_due(cache_file: str = VOLUME_CACHE_FILE) -> List[str]:
+    """Зілля, обсяги яких треба завантажити (TTL минув або ще не завантажувались)"""
+    return get_volumes(cache_file).items_due(volume_items())
+
+def record_refresh_failure():
+    """Рахує невдале оновлення обсягів, що завершилось винятком"""
+    _VOLUME_REFRESHES["failed"].inc()
+
+def refresh_volumes(locations: str = DEFAULT_LOCATIONS, full: bool = False,
+                    limiter: Optional[TokenBucket] = None,
+                    cache_file: str = VOLUME_CACHE_FILE) -> MarketVolumes:
+    """
+    Завантажує обсяги торгів предметів, TTL обсягів яких минув
+
+    Викликається з get_prices.refresh_prices під тим самим міжпроцесним
+    блокуванням; запити йдуть тими самими батчами і через той самий
+    обмежувач частоти, що й ціни. Одночасно обсяги оновлює лише один процес
+    (власне блокування VOLUME_LOCK_FILE): інші одразу повертають поточну таблицю.
+
+    Args:
+        locations: Локації
+        full: Завантажити обсяги всіх зілль незалежно від TTL
+        limiter: Спільний з оновленням цін обмежувач частоти запитів
+        cache_file: Файл таблиці обсягів
+
+    Returns:
+        Актуальна таблиця обсягів (попередня, якщо нічого не вдалося завантажити)
+    """
+    with _refresh_lock(False, VOLUME_LOCK_FILE, _volume_refresh_mutex) as acquired:
+        if not acquired:
+            _VOLUME_REFRESHES["busy"].inc()
+            return get_volumes(cache_file)
+        return _refresh_volumes(locations, full, limiter, cache_file)
+
+def _refresh_volumes(locations: str, full: bool, limiter: Optional[TokenBucket], cache_file: str) -> MarketVolumes:
+    # Інший процес міг щойно записати свіжі обсяги - TTL перевіряється вже під блокуванням
+    previous = get_volumes(cache_file)
+    items = volume_items()
+    due_items = items if full else previous.items_due(items)
+    if not due_items:
+        _VOLUME_REFRESHES["not_due"].inc()
+        return previous
+
+    print(f"Оновлюємо обсяги торгів з API ({len(due_items)} з {len(items)} зілль)...")
+    fetched, failed_items = fetch_all_prices(
+        due_items, locations, DEFAULT_QUALITIES, limiter=limiter,
+        api_base=ALBION_HISTORY_API_BASE, parse_rows=parse_history_rows,
+        query=f"&time-scale={HISTORY_TIME_SCALE}"
+    )
+    failed = set(failed_items)
+    refreshed_items = [item_id for item_id in due_items if item_id not in failed]
+    if not refreshed_items:
+        _VOLUME_REFRESHES["failed"].inc()
+        print("Попередження: не вдалося отримати обсяги торгів з API.")
+        return previous
+
+    volumes = previous.merged(fetched, refreshed_items, time.time())
+    volumes.save(cache_file)
+    _VOLUME_REFRESHES["ok"].inc()
+    print(f"Оновлено обсяги торгів для {len(refreshed_items)} зілль.")
+    return get_volumes(cache_file)